@@ -0,0 +1,231 @@
+import itertools
+import json
+import logging
+import shlex
+import threading
+from concurrent.futures import Future, TimeoutError
+from dataclasses import dataclass
+from hashlib import md5
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from scalebox import Sandbox
+
+from .sandbox_packages import get_package_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORK_DIR = "/home/user/functions"
+
+# Prefix of the worker's response lines, so output printed by functions is not mistaken for a result
+RESULT_MARKER = "@@function-result@@ "
+
+# Runs inside the sandbox. Without arguments it serves JSON requests from stdin, one per line,
+# and imports each function module once. With `<module> <name> <json args>` it runs a single call.
+WORKER_SCRIPT = r'''
+import contextlib, importlib, io, json, os, sys, traceback
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+MARKER = "@@function-result@@ "
+
+
+def call(module, name, args):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = getattr(importlib.import_module(module), name)(**args)
+        if result is not None:
+            print(result)
+    return out.getvalue()
+
+
+def serve():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        try:
+            response = {"id": request["id"], "ok": True,
+                        "output": call(request["module"], request["name"], request["args"])}
+        except BaseException:
+            response = {"id": request["id"], "ok": False, "error": traceback.format_exc()}
+        sys.__stdout__.write(MARKER + json.dumps(response) + "\n")
+        sys.__stdout__.flush()
+
+
+if len(sys.argv) > 1:
+    try:
+        sys.stdout.write(call(sys.argv[1], sys.argv[2], json.loads(sys.argv[3])))
+    except BaseException:
+        sys.stderr.write(traceback.format_exc())
+        sys.exit(1)
+else:
+    serve()
+'''
+
+
+@dataclass
+class DefinedFunction:
+    name: str
+    module: str
+    packages: Optional[str]
+
+
+class FunctionRegistry:
+    """
+    Functions defined by the agent, uploaded once per sandbox as importable modules.
+
+    Calls go to one long-lived `python3` worker in the sandbox that keeps imported modules
+    loaded. Each call sends only the function name and JSON-serialized arguments over stdin.
+    If the SDK cannot run background commands with stdin, each call runs the uploaded module
+    in a fresh `python3` process instead. Nothing is written to the sandbox per call.
+    """
+
+    def __init__(self, sandbox: "Sandbox", work_dir: str = DEFAULT_WORK_DIR, timeout: int = 120):
+        self.sandbox = sandbox
+        self.work_dir = work_dir
+        self.timeout = timeout
+        self.functions: Dict[str, DefinedFunction] = {}
+        self.use_worker = True
+        self._uploaded = set()
+        # Reentrant: the SDK may deliver stdout callbacks on the thread that is starting the worker
+        self._lock = threading.RLock()
+        self._worker = None
+        self._buffer = ""
+        self._futures: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def worker_path(self) -> str:
+        return f"{self.work_dir}/_function_worker.py"
+
+    def define(self, name: str, code: str, packages: Optional[str] = None) -> DefinedFunction:
+        """Upload the function module unless the same code was uploaded before."""
+        module = f"fn_{name}_{md5(code.encode()).hexdigest()[:12]}"
+        with self._lock:
+            if "_function_worker" not in self._uploaded:
+                self.sandbox.files.write(self.worker_path, WORKER_SCRIPT)
+                self._uploaded.add("_function_worker")
+            if module not in self._uploaded:
+                self.sandbox.files.write(f"{self.work_dir}/{module}.py", code)
+                self._uploaded.add(module)
+            self.functions[name] = DefinedFunction(name, module, packages)
+        return self.functions[name]
+
+    def call(self, name: str, **args: Any) -> str:
+        """Run a defined function and return what it printed plus its return value."""
+        function = self.functions[name]
+        get_package_registry(self.sandbox).ensure(function.packages)
+        if self.use_worker:
+            try:
+                future = self._submit(function, args)
+            except (AttributeError, TypeError) as e:
+                logger.warning("Background worker not supported (%s), running each call in a new process", e)
+                self.use_worker = False
+            else:
+                return self._wait(future)
+        return self._run_once(function, args)
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop_worker()
+
+    def _submit(self, function: DefinedFunction, args: Dict[str, Any]) -> Future:
+        with self._lock:
+            if self._worker is None:
+                self._worker = self.sandbox.commands.run(
+                    f"python3 {shlex.quote(self.worker_path)}",
+                    background=True,
+                    stdin=True,
+                    cwd=self.work_dir,
+                    on_stdout=self._on_stdout,
+                    timeout=0,
+                )
+            request_id = next(self._ids)
+            future = Future()
+            self._futures[request_id] = future
+            request = {"id": request_id, "module": function.module, "name": function.name, "args": args}
+            try:
+                self.sandbox.commands.send_stdin(self._worker.pid, json.dumps(request) + "\n")
+            except BaseException:
+                # Do not leave the request pending or the worker running when stdin cannot be used
+                self._futures.pop(request_id, None)
+                self._stop_worker()
+                raise
+        return future
+
+    def _wait(self, future: Future) -> str:
+        try:
+            response = future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The worker may be stuck in the function; start a fresh one for the next call
+            with self._lock:
+                self._stop_worker()
+            raise Exception(f"Function execution timed out after {self.timeout}s")
+        if not response["ok"]:
+            raise Exception(response["error"])
+        return response["output"]
+
+    def _on_stdout(self, data: Any) -> None:
+        # Runs on the SDK's callback thread. Output may arrive in arbitrary chunks; responses are complete lines
+        resolved = []
+        with self._lock:
+            self._buffer += getattr(data, "line", data)
+            *lines, self._buffer = self._buffer.split("\n")
+            for line in lines:
+                if not line.startswith(RESULT_MARKER):
+                    continue
+                response = json.loads(line[len(RESULT_MARKER):])
+                future = self._futures.pop(response["id"], None)
+                if future is not None:
+                    resolved.append((future, response))
+        for future, response in resolved:
+            if not future.done():
+                future.set_result(response)
+
+    def _stop_worker(self) -> None:
+        if self._worker is not None:
+            try:
+                self._worker.kill()
+            except Exception as e:
+                logger.warning("Failed to stop function worker: %s", e)
+        self._worker = None
+        self._buffer = ""
+        futures = list(self._futures.values())
+        self._futures.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(Exception("Function worker stopped"))
+
+    def _run_once(self, function: DefinedFunction, args: Dict[str, Any]) -> str:
+        proc = self.sandbox.commands.run(
+            " ".join(shlex.quote(part) for part in (
+                "python3", self.worker_path, function.module, function.name, json.dumps(args)
+            )),
+            timeout=self.timeout,
+            cwd=self.work_dir,
+        )
+        if proc.exit_code > 0:
+            raise Exception(proc.stderr)
+        return proc.stdout
+
+
+_registries: Dict[str, FunctionRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_function_registry(sandbox: "Sandbox") -> FunctionRegistry:
+    """One registry per sandbox, keyed by sandbox id."""
+    key = getattr(sandbox, "sandbox_id", None) or str(id(sandbox))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = FunctionRegistry(sandbox)
+        return _registries[key]
+
+
+def drop_function_registry(sandbox: "Sandbox") -> None:
+    """Stop the worker of a sandbox that is being killed and forget its functions."""
+    key = getattr(sandbox, "sandbox_id", None) or str(id(sandbox))
+    with _registries_lock:
+        registry = _registries.pop(key, None)
+    if registry is not None:
+        registry.close()
@@ -1,125 +1,81 @@
+import asyncio
 import json
 import logging
+import os
 
-from hashlib import md5
-from typing import Optional
+from functools import lru_cache
 
-# Import scalebox
-from scalebox import Sandbox
+# scalebox and autogen are imported on first use, so importing this module
+# (for `--help` or tests) makes no network calls and skips the heavy imports
 
-# Import autogen
-from autogen import AssistantAgent, UserProxyAgent, config_list_from_json
+# Defined-function registry per sandbox
+from .function_registry import get_function_registry
+
+# One sandbox per conversation, with an optional warm pool and idle TTL
+from .sandbox_sessions import SandboxSessionManager
 
 # load .env
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Get your Sandbox session
-sandbox = Sandbox(template="base")
+# Sandboxes are created per conversation on first use. SANDBOX_TEMPLATE may point to a template
+# with packages preinstalled; SANDBOX_POOL_SIZE sandboxes are created ahead of time
+sessions = SandboxSessionManager(
+    template=os.getenv("SANDBOX_TEMPLATE", "base"),
+    pool_size=int(os.getenv("SANDBOX_POOL_SIZE", "0")),
+    idle_ttl=float(os.getenv("SANDBOX_IDLE_TTL", "600")),
+)
 
 logger = logging.getLogger(__name__)
 
 
-def execute_code(
-    code: str,
-    sandbox: Sandbox,
-    timeout: Optional[int] = None,
-    work_dir: Optional[str] = "/home/user",  # default to scalebox default cwd
-    packages: Optional[str] = None,
-):
-    if packages is not None and packages != "":
-        sandbox.commands.run(f"pip install -qq {packages}")
-
-    code_hash = md5(code.encode()).hexdigest()
-    filename = f"{work_dir}/{code_hash}.py"
-    sandbox.files.write(filename, code)
-
-    proc = sandbox.commands.run(
-        f"python3 {filename}",
-        timeout=timeout,
-        cwd=work_dir,
-    )
-
-    if proc.exit_code > 0:
-        raise Exception(proc.stderr)
-    return proc.stdout
+@lru_cache(maxsize=None)
+def get_config_list():
+    from autogen import config_list_from_json
 
-config_list = config_list_from_json(
-    "OAI_CONFIG_LIST",
-    filter_dict={
-        # Function calling with GPT 3.5 - cheaper/faster but less accurate
-        "model": ["gpt-3.5-turbo"],
+    return config_list_from_json(
+        "OAI_CONFIG_LIST",
+        filter_dict={
+            # Function calling with GPT 3.5 - cheaper/faster but less accurate
+            "model": ["gpt-3.5-turbo"],
 
-        # "model": ["gpt-4-1106-preview"],
-    },
-)
+            # "model": ["gpt-4-1106-preview"],
+        },
+    )
 
-llm_config = {
-    "functions": [
-        {
-            "name": "define_function",
-            "description": "Define a function to add to the context of the conversation. Necessary Python packages must be declared. Once defined, the assistant may decide to use this function, respond with a normal message.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {
-                        "type": "string",
-                        "description": "The name of the function to define.",
-                    },
-                    "description": {
-                        "type": "string",
-                        "description": "A short description of the function.",
-                    },
-                    "arguments": {
-                        "type": "string",
-                        "description": "JSON schema of arguments encoded as a string. For example: { \"url\": { \"type\": \"string\", \"description\": \"The URL\", }}",
-                    },
-                    "packages": {
-                        "type": "string",
-                        "description": "A list of space separated package names imported by the function, and that need to be installed with pip prior to invoking the function, for example `requests`. This solves ModuleNotFoundError.",
-                    },
-                    "code": {
-                        "type": "string",
-                        "description": "The implementation in Python. Do not include the function declaration.",
-                    },
-                },
-                "required": ["name", "description", "arguments", "packages", "code"],
+DEFINE_FUNCTION = {
+    "name": "define_function",
+    "description": "Define a function to add to the context of the conversation. Necessary Python packages must be declared. Once defined, the assistant may decide to use this function, respond with a normal message.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "name": {
+                "type": "string",
+                "description": "The name of the function to define.",
+            },
+            "description": {
+                "type": "string",
+                "description": "A short description of the function.",
+            },
+            "arguments": {
+                "type": "string",
+                "description": "JSON schema of arguments encoded as a string. For example: { \"url\": { \"type\": \"string\", \"description\": \"The URL\", }}",
+            },
+            "packages": {
+                "type": "string",
+                "description": "A list of space separated package names imported by the function, and that need to be installed with pip prior to invoking the function, for example `requests`. This solves ModuleNotFoundError.",
+            },
+            "code": {
+                "type": "string",
+                "description": "The implementation in Python. Do not include the function declaration.",
             },
         },
-    ],
-    "config_list": config_list,
+        "required": ["name", "description", "arguments", "packages", "code"],
+    },
 }
 
 
-def define_function(name, description, arguments, packages, code):
-    json_args = json.loads(arguments)
-    function_config = {
-        "name": name,
-        "description": description,
-        "parameters": {"type": "object", "properties": json_args},
-        "required": list(json_args.keys()),
-    }
-    llm_config["functions"] = llm_config["functions"] + [function_config]
-    user_proxy.register_function(function_map={name: lambda **args: execute_func(name, packages, code, **args)})
-    assistant.update_function_signature(function_config, is_remove=False)
-    return f"A function has been added to the context of this conversation.\nDescription: {description}"
-
-
-def execute_func(name, packages, code, **args):
-    str = f"""
-print("Result of {name} function execution:")
-{code}
-args={args}
-result={name}(**args)
-if result is not None: print(result)
-"""
-    print(f"execute_code:\n{str}")
-    result = execute_code(str, sandbox=sandbox, timeout=120, packages=packages)
-    print(f"Result: {result}")
-    return result
-
-
 def _is_termination_msg(message):
     """Check if a message is a termination message."""
     if isinstance(message, dict):
@@ -129,56 +85,120 @@ def _is_termination_msg(message):
         return message.rstrip().endswith("TERMINATE")
 
 
-assistant = AssistantAgent(
-    name="chatbot",
-    system_message="""You are an assistant.
-        The user will ask a question.
-        You may use the provided functions before providing a final answer.
-        Only use the functions you were provided.
-        When the answer has been provided, reply TERMINATE.""",
-    llm_config=llm_config,
-)
-
-user_proxy = UserProxyAgent(
-    "user_proxy",
-    code_execution_config=False,
-    is_termination_msg=_is_termination_msg,
-    default_auto_reply="Reply TERMINATE when the initial request has been fulfilled.",
-    human_input_mode="NEVER",
-)
-
+class Conversation:
+    """Agents of one conversation. Functions it defines run in the conversation's own sandbox."""
+
+    def __init__(self, session_id: str = "default"):
+        from autogen import AssistantAgent, UserProxyAgent
+
+        self.session_id = session_id
+        self.functions = {}
+        self.llm_config = {
+            "functions": [DEFINE_FUNCTION],
+            "config_list": get_config_list(),
+        }
+
+        self.assistant = AssistantAgent(
+            name="chatbot",
+            system_message="""You are an assistant.
+                The user will ask a question.
+                You may use the provided functions before providing a final answer.
+                Only use the functions you were provided.
+                When the answer has been provided, reply TERMINATE.""",
+            llm_config=self.llm_config,
+        )
+
+        self.user_proxy = UserProxyAgent(
+            "user_proxy",
+            code_execution_config=False,
+            is_termination_msg=_is_termination_msg,
+            default_auto_reply="Reply TERMINATE when the initial request has been fulfilled.",
+            human_input_mode="NEVER",
+        )
+
+        self.user_proxy.register_function(
+            function_map={
+                "define_function": self.define_function
+            }
+        )
+
+    async def define_function(self, name, description, arguments, packages, code):
+        json_args = json.loads(arguments)
+        function_config = {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": json_args},
+            "required": list(json_args.keys()),
+        }
+        self.llm_config["functions"] = self.llm_config["functions"] + [function_config]
+        # Upload the function once; calls only send the arguments to the sandbox worker
+        self.functions[name] = (code, packages)
+        await sessions.run(self.session_id, lambda sandbox: get_function_registry(sandbox).define(name, code, packages))
+
+        async def call(**args):
+            return await self.execute_func(name, **args)
+
+        self.user_proxy.register_function(function_map={name: call})
+        self.assistant.update_function_signature(function_config, is_remove=False)
+        return f"A function has been added to the context of this conversation.\nDescription: {description}"
+
+    async def execute_func(self, name, **args):
+        print(f"execute_func: {name}({args})")
+        code, packages = self.functions[name]
+
+        def run(sandbox):
+            # The sandbox may have been reclaimed while idle; defining again is a no-op otherwise
+            registry = get_function_registry(sandbox)
+            registry.define(name, code, packages)
+            return registry.call(name, **args)
+
+        output = await sessions.run(self.session_id, run)
+        result = f"Result of {name} function execution:\n{output}"
+        print(f"Result: {result}")
+        return result
+
+    async def send(self, message):
+        await self.user_proxy.a_initiate_chat(self.assistant, message=message)
+
+    async def close(self):
+        await sessions.release(self.session_id)
+
+
+async def _main():
+    try:
+        await sessions.start()
+        conversation = Conversation("cli")
+        while True:
+            message = await asyncio.to_thread(input, "What task would you like executed?\n\n> ")
+            print("\n")
+            if message in ["exit", "TERMINATE"]:
+                print("Exiting...")
+                break
+
+            await conversation.send(message)
+    finally:
+        await sessions.close()
+
+
+async def _demo():
+    try:
+        await sessions.start()
+        conversation = Conversation("demo")
+        await conversation.send("What functions do you know about?")
+
+        await conversation.send("Define a function that gets a URL, then prints the response body.\nReply TERMINATE when the function is defined.")
+
+        await conversation.send("List functions do you know about.")
+
+        await conversation.send("Print the response body of https://echo.free.beeceptor.com/ \nUse the functions you know about.")
+    finally:
+        # Close the sandboxes once done
+        await sessions.close()
 
-user_proxy.register_function(
-    function_map={
-        "define_function": define_function
-    }
-)
 
 def main():
-    while True:
-        message = input("What task would you like executed?\n\n> ")
-        print("\n")
-        if message in ["exit", "TERMINATE"]:
-            print("Exiting...")
-            sandbox.kill()
-            break
+    asyncio.run(_main())
 
-        user_proxy.initiate_chat(
-            assistant, message=message)
 
 def demo():
-    user_proxy.initiate_chat(
-        assistant, message="What functions do you know about?")
-
-    user_proxy.initiate_chat(
-        assistant, message="Define a function that gets a URL, then prints the response body.\nReply TERMINATE when the function is defined.")
-
-    user_proxy.initiate_chat(
-        assistant, message="List functions do you know about.")
-
-    user_proxy.initiate_chat(
-        assistant, message="Print the response body of https://echo.free.beeceptor.com/ \nUse the functions you know about.")
-
-
-    # Close the sandbox once done
-    sandbox.kill()
\ No newline at end of file
+    asyncio.run(_demo())
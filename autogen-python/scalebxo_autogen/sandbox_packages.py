@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import re
+import shlex
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+if TYPE_CHECKING:
+    from scalebox import Sandbox
+
+logger = logging.getLogger(__name__)
+
+# Packages installed in earlier sessions, replayed into new sandboxes in one pip call
+DEFAULT_SNAPSHOT_PATH = os.path.join(".cache", "sandbox_packages.txt")
+
+
+def normalize_name(name: str) -> str:
+    """PEP 503 normalized distribution name."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def split_packages(packages: Optional[str]) -> List[str]:
+    """Split the space separated `packages` argument of define_function."""
+    return [p for p in (packages or "").replace(",", " ").split() if p]
+
+
+def requirement_name(spec: str) -> str:
+    """Distribution name of a requirement spec such as `requests>=2` or `pandas[excel]`."""
+    return normalize_name(re.split(r"[\s\[<>=!~;@]", spec, maxsplit=1)[0])
+
+
+class PackageRegistry:
+    """
+    Tracks which pip packages are installed in one sandbox.
+
+    Installed distributions are listed once, the first time they are needed. After that,
+    `ensure` only runs pip for packages that are still missing. Concurrent callers share
+    one `pip install` for everything pending at that moment. Resolved packages are
+    appended to a snapshot file so later sandboxes can install them up front.
+    """
+
+    def __init__(self, sandbox: "Sandbox", snapshot_path: Optional[str] = DEFAULT_SNAPSHOT_PATH):
+        self.sandbox = sandbox
+        self.snapshot_path = snapshot_path
+        self.installed: Optional[Set[str]] = None
+        self.pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._install_lock = threading.Lock()
+        self.stats = {"requested": 0, "skipped": 0, "installed": 0, "pip_runs": 0}
+
+    def satisfied(self, spec: str) -> bool:
+        # Pinned specs are only trusted once this registry installed them verbatim
+        if self.installed is None:
+            return False
+        if spec in self.installed:
+            return True
+        # A bare name (any spelling, e.g. `Pillow` or `requests_oauthlib`) matches the installed distribution
+        return normalize_name(spec) == requirement_name(spec) and normalize_name(spec) in self.installed
+
+    def ensure(self, packages: Optional[str]) -> None:
+        """Install the packages that are not installed yet; raise if pip fails."""
+        specs = split_packages(packages)
+        if not specs:
+            return
+        with self._lock:
+            self.pending.update(specs)
+        # Whoever holds the install lock installs everything pending, including
+        # packages queued by callers that are still waiting for the lock
+        with self._install_lock:
+            if self.installed is None:
+                self.installed = self._list_installed()
+            with self._lock:
+                self.stats["requested"] += len(specs)
+                self.stats["skipped"] += sum(1 for s in specs if self.satisfied(s))
+                batch = sorted(s for s in self.pending | set(specs) if not self.satisfied(s))
+                self.pending.clear()
+            if batch:
+                self._install(batch)
+
+    def restore(self) -> None:
+        """
+        Install everything recorded in the snapshot file with a single pip call.
+
+        A failure is logged rather than raised: a stale or conflicting spec in the snapshot
+        should not stop new sandboxes from being created. Missing packages are installed
+        later by `ensure` when a function needs them.
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path) as f:
+            specs = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        if specs:
+            logger.info("Restoring %d packages from %s", len(specs), self.snapshot_path)
+            try:
+                self.ensure(" ".join(specs))
+            except Exception as e:
+                logger.warning("Restoring packages from %s failed: %s", self.snapshot_path, e)
+
+    def _list_installed(self) -> Set[str]:
+        proc = self.sandbox.commands.run("pip list --format=json --disable-pip-version-check")
+        try:
+            return {normalize_name(p["name"]) for p in json.loads(proc.stdout)}
+        except (ValueError, KeyError, TypeError):
+            return set()
+
+    def _install(self, specs: List[str]) -> None:
+        self.stats["pip_runs"] += 1
+        proc = self.sandbox.commands.run(
+            "pip install -qq --disable-pip-version-check " + " ".join(shlex.quote(s) for s in specs),
+            timeout=600,
+        )
+        if proc.exit_code > 0:
+            raise Exception(proc.stderr)
+        for spec in specs:
+            self.installed.add(spec)
+            self.installed.add(requirement_name(spec))
+        self.stats["installed"] += len(specs)
+        self._record(specs)
+
+    def _record(self, specs: Iterable[str]) -> None:
+        if not self.snapshot_path:
+            return
+        known = set()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                known = {line.strip() for line in f}
+        new = [s for s in specs if s not in known]
+        if new:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            with open(self.snapshot_path, "a") as f:
+                f.writelines(s + "\n" for s in new)
+
+
+_registries: Dict[str, PackageRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_package_registry(sandbox: "Sandbox") -> PackageRegistry:
+    """One registry per sandbox, keyed by sandbox id."""
+    key = getattr(sandbox, "sandbox_id", None) or str(id(sandbox))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = PackageRegistry(sandbox)
+        return _registries[key]
+
+
+def drop_package_registry(sandbox: "Sandbox") -> None:
+    """Forget the registry of a sandbox that is being killed."""
+    key = getattr(sandbox, "sandbox_id", None) or str(id(sandbox))
+    with _registries_lock:
+        _registries.pop(key, None)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from scalebox import Sandbox
+
+from .function_registry import drop_function_registry
+from .sandbox_packages import drop_package_registry, get_package_registry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SandboxSession:
+    session_id: str
+    sandbox: "Sandbox"
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    busy: int = 0
+
+
+class SandboxSessionManager:
+    """
+    Gives each conversation its own sandbox and runs executions on the asyncio loop.
+
+    Sandbox calls are blocking, so they run in worker threads via `asyncio.to_thread`;
+    executions of different conversations proceed in parallel. New sessions take a
+    sandbox from a pool of pre-created ones when available, and the pool is refilled
+    in the background. Sessions idle for longer than `idle_ttl` seconds are killed.
+    Sandboxes are never handed from one conversation to another.
+    """
+
+    def __init__(
+        self,
+        template: str = "base",
+        pool_size: int = 0,
+        idle_ttl: float = 600.0,
+        create: Optional[Callable[[str], "Sandbox"]] = None,
+    ):
+        self.template = template
+        self.pool_size = pool_size
+        self.idle_ttl = idle_ttl
+        self.sessions: Dict[str, SandboxSession] = {}
+        self.pool: List["Sandbox"] = []
+        self._create = create or _create_sandbox
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._refill: Optional[asyncio.Task] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self) -> None:
+        """Fill the pool and start reclaiming idle sessions."""
+        self._closed = False
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_loop())
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self._fill_pool())
+        # Shielded so that cancelling start() leaves the refill for close() to wait on
+        await asyncio.shield(self._refill)
+
+    async def sandbox(self, session_id: str) -> "Sandbox":
+        """The sandbox of a session, created (or taken from the pool) on first use."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+            async with lock:
+                session = self.sessions.get(session_id)
+                if session is None:
+                    sandbox = await self._take_sandbox()
+                    if self._closed:
+                        await asyncio.to_thread(self._kill, sandbox)
+                        raise RuntimeError("Sandbox session manager is closed")
+                    session = SandboxSession(session_id, sandbox)
+                    self.sessions[session_id] = session
+                    logger.info("Session %s uses sandbox %s", session_id, _sandbox_id(session.sandbox))
+        session.last_used = time.monotonic()
+        return session.sandbox
+
+    async def run(self, session_id: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run the blocking `func(sandbox, *args, **kwargs)` for a session in a worker thread."""
+        sandbox = await self.sandbox(session_id)
+        session = self.sessions[session_id]
+        session.busy += 1
+        try:
+            return await asyncio.to_thread(func, sandbox, *args, **kwargs)
+        finally:
+            session.busy -= 1
+            session.last_used = time.monotonic()
+
+    async def release(self, session_id: str) -> None:
+        """Kill the sandbox of a session."""
+        session = self.sessions.pop(session_id, None)
+        self._session_locks.pop(session_id, None)
+        if session is not None:
+            await asyncio.to_thread(self._kill, session.sandbox)
+
+    async def reap_idle(self) -> int:
+        """Kill sessions idle for longer than the TTL; returns how many were reclaimed."""
+        now = time.monotonic()
+        idle = [
+            s.session_id for s in self.sessions.values()
+            if s.busy == 0 and now - s.last_used > self.idle_ttl
+        ]
+        for session_id in idle:
+            logger.info("Reclaiming idle session %s", session_id)
+            await self.release(session_id)
+        return len(idle)
+
+    async def close(self) -> None:
+        """Stop background tasks and kill every sandbox, including the pool."""
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+        # A refill in progress cannot be cancelled without losing the sandboxes its threads are
+        # creating; wait for it instead, it kills what it created once it sees the manager closed
+        if self._refill is not None:
+            await asyncio.gather(self._refill, return_exceptions=True)
+        self._reaper = self._refill = None
+        sandboxes = [s.sandbox for s in self.sessions.values()] + self.pool
+        self.sessions.clear()
+        self.pool = []
+        await asyncio.gather(*(asyncio.to_thread(self._kill, s) for s in sandboxes))
+
+    async def _take_sandbox(self) -> "Sandbox":
+        if self.pool:
+            sandbox = self.pool.pop()
+        else:
+            sandbox = await asyncio.to_thread(self._new_sandbox)
+        if self.pool_size and not self._closed and (self._refill is None or self._refill.done()):
+            self._refill = asyncio.create_task(self._fill_pool())
+        return sandbox
+
+    async def _fill_pool(self) -> None:
+        missing = self.pool_size - len(self.pool)
+        if missing <= 0:
+            return
+        # One failed creation must not drop the sandboxes the other threads created
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._new_sandbox) for _ in range(missing)), return_exceptions=True
+        )
+        created = [r for r in results if not isinstance(r, BaseException)]
+        for error in results:
+            if isinstance(error, BaseException):
+                logger.warning("Failed to create a pooled sandbox: %s", error)
+        if self._closed:
+            await asyncio.gather(*(asyncio.to_thread(self._kill, s) for s in created))
+        else:
+            self.pool.extend(created)
+
+    def _new_sandbox(self) -> "Sandbox":
+        sandbox = self._create(self.template)
+        try:
+            # Packages resolved in earlier sessions are installed before the sandbox is handed out
+            get_package_registry(sandbox).restore()
+        except BaseException:
+            self._kill(sandbox)
+            raise
+        return sandbox
+
+    @staticmethod
+    def _kill(sandbox: "Sandbox") -> None:
+        drop_function_registry(sandbox)
+        drop_package_registry(sandbox)
+        try:
+            sandbox.kill()
+        except Exception as e:
+            logger.warning("Failed to kill sandbox %s: %s", _sandbox_id(sandbox), e)
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_ttl / 4))
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                logger.warning("Reclaiming idle sessions failed: %s", e)
+
+
+def _create_sandbox(template: str) -> "Sandbox":
+    from scalebox import Sandbox
+
+    return Sandbox(template=template)
+
+
+def _sandbox_id(sandbox: "Sandbox") -> str:
+    return getattr(sandbox, "sandbox_id", None) or str(id(sandbox))
@@ -1,9 +1,23 @@
 from dotenv import load_dotenv
-import boto3
-import json
+import argparse
+import csv
+import io
 import logging
 import os
+import re
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from scalebox import Sandbox
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.artifacts import ArtifactSink
+from common.bedrock_cache import BedrockResponseCache, get_response_cache, install_response_cache
+from common.columnar import UPLOAD_FORMATS, upload_table
+from common.csv_generation import DEFAULT_MODEL_ID, get_csv_generation_service
+from common.dataset_inspection import format_column_profile, format_size, inspect_dataset
 
 load_dotenv()
 
@@ -12,88 +26,34 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
-def generate_csv_data_with_bedrock(prompt: str, model_id: str = "deepseek.v3-v1:0") -> str:
+def generate_csv_data_with_bedrock(prompt: str, model_id: str = DEFAULT_MODEL_ID, use_cache: bool = True) -> str:
     """
     使用 AWS Bedrock 调用 DeepSeek 模型生成 CSV 数据
     
+    通过共享的 CSV 生成服务调用模型：并发的相同请求只调用一次模型，
+    同一模型的并发调用数受服务上限约束（见 common/csv_generation.py）
+    
     Args:
         prompt: 生成数据的提示词，应明确指定输出 CSV 格式
         model_id: Bedrock 模型 ID
+        use_cache: 启用了 Bedrock 响应缓存时是否使用缓存（重试时应为 False，避免拿到同一份无效结果）
         
     Returns:
         生成的 CSV 格式数据
     """
     try:
-        # 获取 AWS 配置
-        region = os.getenv('AWS_REGION', 'eu-north-1')  # 默认使用 eu-north-1
-        bearer_token = os.getenv('AWS_BEDROCK_TOKEN')
-        
-        # 创建 Bedrock Runtime 客户端
-        # 如果有 Bearer Token，将其设置为环境变量供 boto3 使用
-        if bearer_token:
-            os.environ['AWS_SESSION_TOKEN'] = bearer_token
-            logger.info("使用 Bearer Token 认证")
-        
-        client = boto3.client(
-            'bedrock-runtime',
-            region_name=region
-        )
-        
-        logger.info(f"连接到 AWS Region: {region}")
-        
-        # 构建严格的 CSV 输出要求的 prompt
-        csv_prompt = f"""你是一个数据生成助手。请严格按照以下要求生成数据：
-
-1. 输出格式：必须是纯CSV格式（逗号分隔值）
-2. 第一行：必须是列名（表头）
-3. 数据要求：真实、合理、多样化
-4. 不要包含任何解释性文字，只输出CSV内容
-5. 不要使用markdown代码块标记（如```csv）
-
-任务：{prompt}
-
-请直接输出CSV数据："""
-        
-        logger.info(f"调用 Bedrock 模型: {model_id}")
-        
-        # 调用 Bedrock API（DeepSeek 模型格式）
-        request_body = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": csv_prompt
-                }
-            ],
-            "max_tokens": 4096,
-            "temperature": 0.7,
-            "top_p": 0.9
-        }
-        
-        response = client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(request_body),
-            contentType='application/json',
-            accept='application/json'
-        )
-        
-        # 解析响应
-        response_body = json.loads(response['body'].read())
-        logger.info("成功收到 Bedrock 响应")
-        
-        # 提取生成的文本
-        csv_content = response_body['choices'][0]['message']['content']
-        
-        # 清理可能存在的 markdown 标记
-        csv_content = csv_content.replace('```csv', '').replace('```', '').strip()
-        
-        return csv_content
-        
+        return get_csv_generation_service().generate(prompt, model_id, use_cache)
     except Exception as e:
         logger.error(f"调用 Bedrock 失败: {str(e)}")
         raise
 
 
-def save_csv_to_sandbox(sandbox: Sandbox, csv_content: str, filename: str = "generated_data.csv") -> str:
+def save_csv_to_sandbox(
+    sandbox: Sandbox,
+    csv_content: str,
+    filename: str = "generated_data.csv",
+    upload_format: str = "csv",
+) -> str:
     """
     将 CSV 数据保存到 Sandbox 文件系统
     
@@ -101,32 +61,257 @@ def save_csv_to_sandbox(sandbox: Sandbox, csv_content: str, filename: str = "gen
         sandbox: Sandbox 实例
         csv_content: CSV 格式的内容
         filename: 保存的文件名
+        upload_format: csv / parquet / arrow；后两者在主机上转换为列式格式后上传，
+                       扩展名随格式替换（需要安装 pyarrow）
         
     Returns:
         保存的文件路径
     """
     try:
-        # 在 Sandbox 中创建文件
-        file_path = f"/tmp/{filename}"
-        
-        # 使用 Sandbox 的 files.write 接口写入数据
-        sandbox.files.write(file_path, csv_content)
+        if upload_format != "csv":
+            # 转换为 Parquet / Arrow IPC 后上传二进制数据
+            file_path, _ = upload_table(
+                sandbox, csv_content, f"/tmp/{os.path.splitext(filename)[0]}", upload_format
+            )
+            return file_path
         
-        logger.info(f"CSV 数据已保存到 Sandbox: {file_path}")
-        
-        # 验证文件是否创建成功
-        file_info = sandbox.files.read(file_path)
-        logger.info(f"文件大小: {len(file_info)} 字节")
-        
-        return file_path
+        # 写入 Sandbox 的 /tmp 目录；大小和校验和在写入时计算，不再读回整个文件
+        artifact = ArtifactSink("sandbox", sandbox=sandbox).write(filename, csv_content)
+        return artifact.sandbox_path
         
     except Exception as e:
         logger.error(f"保存文件到 Sandbox 失败: {str(e)}")
         raise
 
 
-def main():
-    """主函数：演示使用 AI 生成 CSV 数据并存储到 Sandbox"""
+def parse_csv_chunk(chunk_text: str, header: List[str], seen_ids: set, id_index: int = 0) -> Tuple[List[List[str]], int]:
+    """
+    校验一个 CSV 分块：跳过重复的表头、列数不一致的行和已出现过的 ID
+
+    Args:
+        chunk_text: 模型返回的 CSV 文本
+        header: 固定的表头
+        seen_ids: 已写入的 ID 集合，会被原地更新
+        id_index: ID 列在表头中的位置
+
+    Returns:
+        (有效行列表, 被丢弃的行数)
+    """
+    rows = []
+    dropped = 0
+    for row in csv.reader(io.StringIO(chunk_text)):
+        row = [cell.strip() for cell in row]
+        if not any(row) or row == header:
+            continue
+        if len(row) != len(header):
+            dropped += 1
+            continue
+        row_id = row[id_index]
+        if row_id in seen_ids:
+            dropped += 1
+            continue
+        seen_ids.add(row_id)
+        rows.append(row)
+    return rows, dropped
+
+
+def append_csv_to_sandbox(sandbox: Sandbox, rows: List[List[str]], file_path: str) -> None:
+    """
+    将一批 CSV 行追加到 Sandbox 中的文件
+
+    先写入临时分块文件，再在 Sandbox 内追加到目标文件，主机只保留当前分块
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    part_path = f"{file_path}.part"
+    sandbox.files.write(part_path, buffer.getvalue())
+    result = sandbox.commands.run(
+        f"cat {shlex.quote(part_path)} >> {shlex.quote(file_path)} && rm -f {shlex.quote(part_path)}"
+    )
+    if result.exit_code != 0:
+        raise Exception(f"追加数据失败: {result.stderr}")
+
+
+def strip_row_count(prompt: str) -> str:
+    """
+    去掉任务描述中的总条数（如"生成100条用户数据"中的"100条"）
+
+    分块模式中每个分块另行指定行号范围，保留总条数会让模型收到互相矛盾的数量
+    """
+    return re.sub(r"(生成)\s*\d+\s*条", r"\1", prompt)
+
+
+def generate_large_csv_in_chunks(
+    sandbox: Sandbox,
+    prompt: str,
+    total_rows: int,
+    filename: str = "generated_data.csv",
+    chunk_rows: int = 100,
+    max_failed_chunks: int = 3,
+    model_id: str = DEFAULT_MODEL_ID,
+) -> Dict:
+    """
+    分块生成大规模 CSV 数据，并边生成边追加写入 Sandbox
+
+    第一个分块确定表头，之后每次按行号范围请求数据并要求使用同一表头；
+    每个分块校验列数、按第一列去重后立即追加到 Sandbox 文件，主机内存只保留
+    当前分块和已见 ID 集合。
+
+    Args:
+        sandbox: Sandbox 实例
+        prompt: 数据描述（字段、取值要求等），其中的总条数会被去掉
+        total_rows: 目标数据行数（不含表头）
+        filename: 保存的文件名
+        chunk_rows: 每次请求的行数，受模型单次输出 token 上限约束
+        max_failed_chunks: 连续没有产出有效行的分块数上限
+        model_id: Bedrock 模型 ID
+
+    Returns:
+        包含 file_path、rows、chunks、dropped_rows 的字典
+    """
+    file_path = f"/tmp/{filename}"
+    header: List[str] = []
+    header_line = ""
+    seen_ids: set = set()
+    written = 0
+    chunks = 0
+    dropped_total = 0
+    failed = 0
+    prompt = strip_row_count(prompt)
+
+    while written < total_rows:
+        start = written + 1
+        end = min(written + chunk_rows, total_rows)
+
+        if header:
+            chunk_prompt = (
+                f"{prompt}\n\n本次只生成第 {start} 到第 {end} 条记录（共 {end - start + 1} 条）。"
+                f"表头必须严格为：{header_line}。"
+                f"第一列是唯一 ID，按记录序号从 {start} 开始编号，不要与其他批次重复。"
+            )
+        else:
+            chunk_prompt = (
+                f"{prompt}\n\n本次只生成第 {start} 到第 {end} 条记录（共 {end - start + 1} 条）。"
+                f"第一列必须是唯一 ID，按记录序号从 {start} 开始编号。"
+            )
+
+        # 重试同一分块时绕过响应缓存，否则会再次拿到同一份无效输出
+        chunk_text = generate_csv_data_with_bedrock(chunk_prompt, model_id, use_cache=failed == 0)
+        chunks += 1
+
+        if not header:
+            first_row = next(csv.reader(io.StringIO(chunk_text)), [])
+            if not first_row:
+                failed += 1
+                if failed >= max_failed_chunks:
+                    raise Exception("无法从模型输出中解析表头")
+                continue
+            header = [col.strip() for col in first_row]
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerow(header)
+            header_line = buffer.getvalue().rstrip("\n")
+            sandbox.files.write(file_path, header_line + "\n")
+            logger.info(f"固定表头: {header}")
+
+        rows, dropped = parse_csv_chunk(chunk_text, header, seen_ids)
+        rows = rows[:total_rows - written]
+        dropped_total += dropped
+
+        if not rows:
+            failed += 1
+            logger.warning(f"分块 {start}-{end} 没有有效数据（连续失败 {failed} 次）")
+            if failed >= max_failed_chunks:
+                raise Exception(f"连续 {failed} 个分块没有有效数据，已写入 {written} 行")
+            continue
+
+        failed = 0
+        append_csv_to_sandbox(sandbox, rows, file_path)
+        written += len(rows)
+        logger.info(f"✓ 分块 {chunks}: 追加 {len(rows)} 行，丢弃 {dropped} 行，进度 {written}/{total_rows}")
+
+    return {
+        "file_path": file_path,
+        "rows": written,
+        "chunks": chunks,
+        "dropped_rows": dropped_total,
+    }
+
+
+def generate_task(sandbox: Sandbox, task: Dict, upload_format: str = "csv") -> Dict:
+    """
+    生成并保存单个数据集，记录各阶段耗时；失败时返回错误信息而不是抛出异常
+
+    Args:
+        sandbox: Sandbox 实例
+        task: 数据生成任务，包含 name、prompt、filename
+        upload_format: 上传格式，见 save_csv_to_sandbox
+
+    Returns:
+        任务结果，包含 name、file_path、chars、generate_seconds、save_seconds、error
+    """
+    result = {
+        "name": task["name"],
+        "file_path": None,
+        "chars": 0,
+        "generate_seconds": 0.0,
+        "save_seconds": 0.0,
+        "error": None,
+    }
+    try:
+        start = time.perf_counter()
+        csv_content = generate_csv_data_with_bedrock(task["prompt"])
+        result["generate_seconds"] = time.perf_counter() - start
+        result["chars"] = len(csv_content)
+
+        start = time.perf_counter()
+        result["file_path"] = save_csv_to_sandbox(sandbox, csv_content, task["filename"], upload_format)
+        result["save_seconds"] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = str(e)
+        logger.error(f"任务 {task['name']} 失败: {e}")
+    return result
+
+
+def generate_datasets_concurrently(
+    sandbox: Sandbox,
+    tasks: List[Dict],
+    max_workers: int = 8,
+    upload_format: str = "csv",
+) -> List[Dict]:
+    """
+    并发生成多个数据集：各任务的模型调用和文件写入互相重叠，总耗时接近最慢的单个任务
+
+    Args:
+        sandbox: Sandbox 实例
+        tasks: 数据生成任务列表
+        max_workers: 最大并发任务数（同时进行的 Bedrock 调用数）
+        upload_format: 上传格式，见 save_csv_to_sandbox
+
+    Returns:
+        与 tasks 顺序一致的任务结果列表，单个任务失败不影响其他任务
+    """
+    logger.info(f"并发生成 {len(tasks)} 个数据集（并发上限 {max_workers}）...")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        return list(executor.map(lambda task: generate_task(sandbox, task, upload_format), tasks))
+
+
+def main(
+    generate_all: bool = False,
+    max_workers: int = 8,
+    total_rows: int = 0,
+    chunk_rows: int = 100,
+    upload_format: str = "csv",
+):
+    """
+    主函数：演示使用 AI 生成 CSV 数据并存储到 Sandbox
+
+    Args:
+        generate_all: 为 True 时并发生成 data_tasks 中的全部数据集
+        max_workers: 并发模式下的最大并发任务数
+        total_rows: 大于 0 时按该行数分块生成所选数据集，并流式追加到 Sandbox
+        chunk_rows: 分块模式下每次请求的行数
+        upload_format: 上传格式 csv / parquet / arrow（分块模式始终以 CSV 追加）
+    """
     
     logger.info("="*60)
     logger.info("CSV 数据生成演示")
@@ -161,39 +346,61 @@ def main():
             }
         ]
         
+        if generate_all:
+            run_all_tasks(sandbox, data_tasks, max_workers, upload_format)
+            return
+        
         # 选择要生成的数据（可以修改索引选择不同的任务）
         selected_task = data_tasks[0]
         logger.info(f"✓ 已选择任务: {selected_task['name']}")
         logger.info(f"  提示词: {selected_task['prompt']}")
         
-        # 步骤 3: 调用 Bedrock AI 生成 CSV 数据
-        logger.info("\n[步骤 3/6] 调用 AWS Bedrock DeepSeek 生成数据...")
-        csv_content = generate_csv_data_with_bedrock(selected_task['prompt'])
-        logger.info(f"✓ 数据生成成功，共 {len(csv_content)} 字符")
-        
-        # 显示数据预览
-        preview_lines = csv_content.split('\n')[:6]
-        logger.info(f"\n数据预览（前6行）:")
-        for line in preview_lines:
-            logger.info(f"  {line}")
-        
-        # 步骤 4: 保存到 Sandbox
-        logger.info(f"\n[步骤 4/6] 保存数据到 Sandbox...")
-        file_path = save_csv_to_sandbox(sandbox, csv_content, selected_task['filename'])
-        logger.info(f"✓ 文件已保存: {file_path}")
+        if total_rows > 0:
+            # 步骤 3-4: 分块生成并流式追加到 Sandbox
+            logger.info(f"\n[步骤 3-4/6] 分块生成 {total_rows} 行数据并追加到 Sandbox...")
+            chunked = generate_large_csv_in_chunks(
+                sandbox, selected_task['prompt'], total_rows, selected_task['filename'], chunk_rows
+            )
+            file_path = chunked['file_path']
+            logger.info(
+                f"✓ 文件已保存: {file_path}（{chunked['rows']} 行，{chunked['chunks']} 个分块，"
+                f"丢弃 {chunked['dropped_rows']} 行）"
+            )
+        else:
+            # 步骤 3: 调用 Bedrock AI 生成 CSV 数据
+            logger.info("\n[步骤 3/6] 调用 AWS Bedrock DeepSeek 生成数据...")
+            csv_content = generate_csv_data_with_bedrock(selected_task['prompt'])
+            logger.info(f"✓ 数据生成成功，共 {len(csv_content)} 字符")
+            
+            # 显示数据预览
+            preview_lines = csv_content.split('\n')[:6]
+            logger.info(f"\n数据预览（前6行）:")
+            for line in preview_lines:
+                logger.info(f"  {line}")
+            
+            # 步骤 4: 保存到 Sandbox
+            logger.info(f"\n[步骤 4/6] 保存数据到 Sandbox...")
+            file_path = save_csv_to_sandbox(sandbox, csv_content, selected_task['filename'], upload_format)
+            logger.info(f"✓ 文件已保存: {file_path}")
         
         # 步骤 5: 验证数据
         logger.info(f"\n[步骤 5/6] 验证保存的数据...")
         
-        # 统计行数
-        result = sandbox.commands.run(f"wc -l {file_path}")
-        line_count = result.stdout.strip().split()[0]
+        # 一次 Sandbox 往返获取行数、文件大小、表头和列画像
+        info = inspect_dataset(sandbox, file_path)
+        if info["lines"] is not None:
+            line_count = info["lines"]
+        elif info["rows"] is not None:
+            line_count = info["rows"] + 1
+        else:
+            # Sandbox 中没有 pyarrow 时无法读取列式文件，按上传前的 CSV 文本统计
+            line_count = len(csv_content.splitlines())
         logger.info(f"✓ 数据行数: {line_count} 行（包含表头）")
         
-        # 检查文件大小
-        result = sandbox.commands.run(f"du -h {file_path}")
-        file_size = result.stdout.strip().split()[0]
+        file_size = format_size(info["size_bytes"])
         logger.info(f"✓ 文件大小: {file_size}")
+        for column in info["columns"]:
+            logger.info(f"  {format_column_profile(column)}")
         
         # 步骤 6: 显示摘要
         logger.info("\n[步骤 6/6] 生成完成摘要")
@@ -228,5 +435,50 @@ def main():
         logger.info("\n演示完成！\n")
 
 
+def run_all_tasks(sandbox: Sandbox, data_tasks: List[Dict], max_workers: int, upload_format: str = "csv") -> None:
+    """并发模式：生成全部数据集并输出每个任务的耗时摘要"""
+    logger.info(f"\n[步骤 3/4] 并发生成 {len(data_tasks)} 个数据集...")
+    start = time.perf_counter()
+    results = generate_datasets_concurrently(sandbox, data_tasks, max_workers, upload_format)
+    wall_seconds = time.perf_counter() - start
+
+    logger.info("\n[步骤 4/4] 生成完成摘要")
+    logger.info("="*60)
+    for result in results:
+        if result["error"]:
+            logger.info(f"❌ {result['name']}: {result['error']}")
+        else:
+            logger.info(
+                f"✓ {result['name']}: {result['file_path']}, {result['chars']} 字符, "
+                f"生成 {result['generate_seconds']:.2f}s, 保存 {result['save_seconds']:.2f}s"
+            )
+    serial_seconds = sum(r["generate_seconds"] + r["save_seconds"] for r in results)
+    succeeded = sum(1 for r in results if not r["error"])
+    logger.info("="*60)
+    logger.info(f"成功: {succeeded}/{len(results)}")
+    logger.info(f"总耗时: {wall_seconds:.2f}s（串行执行约需 {serial_seconds:.2f}s）")
+    logger.info(f"Sandbox ID: {sandbox.sandbox_id}")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="使用 AWS Bedrock 生成 CSV 数据并保存到 Scalebox Sandbox")
+    parser.add_argument("--all", action="store_true", help="并发生成全部数据集，而不是只生成第一个")
+    parser.add_argument("--workers", type=int, default=8, help="并发模式下的最大并发任务数")
+    parser.add_argument("--rows", type=int, default=0, help="按指定行数分块生成所选数据集（例如 100000）")
+    parser.add_argument("--chunk-rows", type=int, default=100, help="分块模式下每次请求的行数")
+    parser.add_argument("--upload-format", default="csv", choices=list(UPLOAD_FORMATS),
+                        help="上传到 Sandbox 的格式（parquet / arrow 需要安装 pyarrow）")
+    parser.add_argument("--bedrock-cache", action="store_true",
+                        help="缓存 Bedrock 响应，相同 prompt 不再重复调用模型（配置见 BEDROCK_CACHE_* 环境变量）")
+    args = parser.parse_args()
+    if args.bedrock_cache:
+        install_response_cache(BedrockResponseCache.from_env())
+    main(
+        generate_all=args.all,
+        max_workers=args.workers,
+        total_rows=args.rows,
+        chunk_rows=args.chunk_rows,
+        upload_format=args.upload_format,
+    )
+    if get_response_cache() is not None:
+        logger.info(f"Bedrock 响应缓存: {get_response_cache().summary()}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+图表导出基准测试
+
+对比逐张图表导出（每张一次 `python3 -c` + 一次 RPC）与批量导出（一次往返）。
+模拟的 Sandbox 在本机真实执行命令，并为每次 commands.run 额外加上 RPC 延迟：
+
+    python bench_chart_export.py --charts 5 20 50 --rpc-ms 50
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+
+from chart_export import export_charts_base64, export_charts_base64_per_chart
+
+
+class LocalCommands:
+    """在本机执行命令的 sandbox.commands，每次调用计入一次 RPC 延迟"""
+
+    def __init__(self, rpc_latency: float):
+        self.rpc_latency = rpc_latency
+        self.calls = 0
+
+    def run(self, cmd: str, timeout: int = 60, **kwargs):
+        self.calls += 1
+        time.sleep(self.rpc_latency)
+        proc = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=timeout)
+        return SimpleNamespace(exit_code=proc.returncode, stdout=proc.stdout, stderr=proc.stderr)
+
+
+def make_charts(directory: str, count: int, size: int):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"chart_{i}.png")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def timed(func, sandbox, paths):
+    start = time.perf_counter()
+    result = func(sandbox, paths)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图表导出基准测试（本机模拟 Sandbox）")
+    parser.add_argument("--charts", type=int, nargs="+", default=[5, 20, 50], help="图表数量")
+    parser.add_argument("--size-kb", type=int, default=80, help="单张图表大小（KB）")
+    parser.add_argument("--rpc-ms", type=float, default=50, help="每次 commands.run 的模拟 RPC 延迟")
+    args = parser.parse_args()
+
+    print(f"单张图表 {args.size_kb} KB，RPC 延迟 {args.rpc_ms} ms\n")
+    print(f"{'图表数':>6} {'逐张导出':>12} {'RPC':>5} {'批量导出':>12} {'RPC':>5} {'加速':>7}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.charts:
+            paths = make_charts(directory, count, args.size_kb * 1024)
+
+            loop_sandbox = SimpleNamespace(commands=LocalCommands(args.rpc_ms / 1000))
+            loop_seconds, loop_result = timed(export_charts_base64_per_chart, loop_sandbox, paths)
+
+            batch_sandbox = SimpleNamespace(commands=LocalCommands(args.rpc_ms / 1000))
+            batch_seconds, batch_result = timed(export_charts_base64, batch_sandbox, paths)
+
+            assert loop_result == batch_result, "两种方式的导出结果不一致"
+            print(f"{count:>6} {loop_seconds * 1000:>10.1f}ms {loop_sandbox.commands.calls:>5} "
+                  f"{batch_seconds * 1000:>10.1f}ms {batch_sandbox.commands.calls:>5} "
+                  f"{loop_seconds / batch_seconds:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
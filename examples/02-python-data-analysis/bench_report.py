@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+HTML 报告生成基准测试
+
+在合成的大报告（默认 100 个科目、50 张图表）上对比三种输出方式的耗时和峰值内存：
+
+- 逐段 +=：改造前 generate_analysis_report 的写法，每次追加都可能复制整个字符串
+- join：片段只拼接一次（render_analysis_report）
+- 流式写出：片段直接写入文件（write_analysis_report），不在内存中保留整个文档
+
+    python bench_report.py --subjects 100 --charts 50 --chart-kb 200
+"""
+
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from analysis_script import compute_statistics
+from run import iter_analysis_report, render_analysis_report, write_analysis_report
+
+
+def make_analysis_results(students: int, subjects: int, charts: int, chart_kb: int, seed: int = 0):
+    """生成合成的统计结果和 base64 图表"""
+    rng = np.random.default_rng(seed)
+    data = {"学号": np.arange(1, students + 1), "姓名": [f"学生{i}" for i in range(students)]}
+    for j in range(subjects):
+        data[f"科目{j + 1}"] = rng.integers(30, 101, students)
+    results = {"basic_info": {"total_students": 0, "subjects": [], "statistics": {}}, "rankings": {}, "charts": []}
+    compute_statistics(pd.DataFrame(data), results)
+    results["charts"] = [f"/tmp/chart_{i}.png" for i in range(charts)]
+    images = [base64.b64encode(os.urandom(chart_kb * 1024)).decode() for _ in range(charts)]
+    ai_report = "\n\n".join(f"第 {i + 1} 段分析。" * 20 for i in range(30))
+    return results, images, ai_report
+
+
+def concat_report(results, images, ai_report, path):
+    html_report = ""
+    for fragment in iter_analysis_report(results, images, ai_report):
+        html_report += fragment
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html_report)
+
+
+def join_report(results, images, ai_report, path):
+    html_report = render_analysis_report(results, images, ai_report)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html_report)
+
+
+def stream_report(results, images, ai_report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        write_analysis_report(f, results, images, ai_report)
+
+
+METHODS = [
+    ("逐段 +=", concat_report),
+    ("join", join_report),
+    ("流式写出", stream_report),
+]
+
+
+def measure(func, args, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML 报告生成基准测试")
+    parser.add_argument("--students", type=int, default=40, help="学生人数")
+    parser.add_argument("--subjects", type=int, default=100, help="科目数量")
+    parser.add_argument("--charts", type=int, default=50, help="图表数量")
+    parser.add_argument("--chart-kb", type=int, default=200, help="每张图表的大小（KB，base64 编码前）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项取最快的一次")
+    args = parser.parse_args()
+
+    results, images, ai_report = make_analysis_results(args.students, args.subjects, args.charts, args.chart_kb)
+    payload = sum(len(image) for image in images)
+    print(f"{args.subjects} 个科目、{args.charts} 张图表，base64 图表共 {payload / 1e6:.1f} MB\n")
+    print(f"{'方式':<10} {'耗时':>9} {'峰值内存':>10}")
+
+    reference = None
+    with tempfile.TemporaryDirectory() as directory:
+        for name, func in METHODS:
+            path = os.path.join(directory, f"{func.__name__}.html")
+            seconds, peak = measure(func, (results, images, ai_report, path), args.repeat)
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            reference = reference or content
+            assert content == reference, f"{name} 输出不一致"
+            print(f"{name:<10} {seconds * 1000:>7.0f}ms {peak / 1e6:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
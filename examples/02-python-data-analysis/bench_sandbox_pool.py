@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+预热 Sandbox 池基准测试
+
+使用本地模拟的 Sandbox（按配置的延迟 sleep）对比
+"每次 Sandbox.create + pip install" 与 "从 SandboxPool 借出" 两种方式下
+每份报告到第一次分析完成的耗时（p50 / p99）。
+
+不需要 SBX_API_KEY，也不会创建真实 Sandbox：
+
+    python bench_sandbox_pool.py --requests 40 --workers 4
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from sandbox_pool import SandboxPool
+
+
+class FakeCommands:
+    """模拟 sandbox.commands，根据命令类型 sleep 对应的延迟"""
+
+    def __init__(self, latencies: dict):
+        self.latencies = latencies
+
+    def run(self, cmd: str, timeout: int = 60, **kwargs):
+        if cmd.startswith("pip install"):
+            time.sleep(self.latencies["install"])
+        elif "import pandas" in cmd:
+            time.sleep(self.latencies["health"])
+        else:
+            time.sleep(self.latencies["analysis"])
+        return SimpleNamespace(exit_code=0, stdout="{}", stderr="")
+
+
+class FakeSandbox:
+    """模拟 scalebox.Sandbox：创建时 sleep 冷启动延迟"""
+
+    _counter = 0
+
+    def __init__(self, latencies: dict):
+        time.sleep(latencies["create"])
+        FakeSandbox._counter += 1
+        self.sandbox_id = f"fake-{FakeSandbox._counter}"
+        self.commands = FakeCommands(latencies)
+
+    def kill(self):
+        pass
+
+
+def fake_install(sandbox) -> None:
+    """与 run.install_analysis_dependencies 相同的命令"""
+    sandbox.commands.run("pip install pandas matplotlib numpy -q", timeout=120)
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_cold(latencies: dict) -> float:
+    """不使用池：创建 + 安装依赖 + 分析"""
+    start = time.perf_counter()
+    sandbox = FakeSandbox(latencies)
+    fake_install(sandbox)
+    sandbox.commands.run("python /tmp/analysis_script.py /tmp/exam_scores.csv")
+    elapsed = time.perf_counter() - start
+    sandbox.kill()
+    return elapsed
+
+
+def run_pooled(pool: SandboxPool) -> float:
+    """使用池：借出 + 分析 + 归还"""
+    start = time.perf_counter()
+    with pool.lease() as sandbox:
+        sandbox.commands.run("python /tmp/analysis_script.py /tmp/exam_scores.csv")
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def report(label: str, samples) -> None:
+    print(f"{label:<10} p50={percentile(samples, 50) * 1000:8.1f} ms   "
+          f"p99={percentile(samples, 99) * 1000:8.1f} ms   "
+          f"mean={statistics.mean(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SandboxPool 基准测试（模拟 Sandbox）")
+    parser.add_argument("--requests", type=int, default=40, help="报告请求数量")
+    parser.add_argument("--workers", type=int, default=4, help="并发处理的请求数（同时也是池大小）")
+    parser.add_argument("--create-ms", type=float, default=300, help="模拟 Sandbox 冷启动耗时")
+    parser.add_argument("--install-ms", type=float, default=600, help="模拟 pip install 耗时")
+    parser.add_argument("--analysis-ms", type=float, default=30, help="模拟分析脚本耗时")
+    parser.add_argument("--max-uses", type=int, default=10, help="池中 Sandbox 最大复用次数")
+    args = parser.parse_args()
+
+    latencies = {
+        "create": args.create_ms / 1000,
+        "install": args.install_ms / 1000,
+        "analysis": args.analysis_ms / 1000,
+        "health": 0.005,
+    }
+
+    print(f"请求数: {args.requests}, 并发: {args.workers}, "
+          f"冷启动: {args.create_ms}ms, 安装: {args.install_ms}ms, 分析: {args.analysis_ms}ms\n")
+
+    with ThreadPoolExecutor(args.workers) as executor:
+        cold = list(executor.map(lambda _: run_cold(latencies), range(args.requests)))
+    report("无池", cold)
+
+    pool = SandboxPool(
+        lambda: FakeSandbox(latencies),
+        fake_install,
+        size=args.workers,
+        max_uses=args.max_uses,
+    ).start()
+    try:
+        with ThreadPoolExecutor(args.workers) as executor:
+            pooled = list(executor.map(lambda _: run_pooled(pool), range(args.requests)))
+    finally:
+        pool.close()
+    report("预热池", pooled)
+
+    print(f"\n池统计: {pool.stats}")
+    print(f"p50 加速: {percentile(cold, 50) / percentile(pooled, 50):.1f}x, "
+          f"p99 加速: {percentile(cold, 99) / percentile(pooled, 99):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+成绩统计引擎基准测试
+
+在合成数据上对比原来的逐列循环实现（legacy_statistics）与一次 agg + argpartition 的
+向量化实现（analysis_script.compute_statistics），并校验两者输出一致：
+
+    python bench_stats.py --rows 1000 100000 10000000 --subjects 6
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis_script import compute_statistics
+
+
+def legacy_statistics(df, results):
+    """改造前的实现：逐列循环、idxmax、nlargest 与 iterrows"""
+    # 识别科目列（排除学号、姓名等非成绩列）
+    exclude_cols = ['学号', '姓名', '学生ID', '班级', 'ID', 'Name', 'Student_ID']
+    subject_cols = [col for col in df.columns if col not in exclude_cols and df[col].dtype in ['int64', 'float64']]
+
+    results["basic_info"]["subjects"] = subject_cols
+    name_col = None
+
+    # 计算总分和平均分
+    if len(subject_cols) > 0:
+        df['总分'] = df[subject_cols].sum(axis=1)
+        df['平均分'] = df[subject_cols].mean(axis=1)
+    
+        # 各科目统计
+        for subject in subject_cols:
+            results["basic_info"]["statistics"][subject] = {
+                "平均分": round(float(df[subject].mean()), 2),
+                "最高分": float(df[subject].max()),
+                "最低分": float(df[subject].min()),
+                "标准差": round(float(df[subject].std()), 2),
+                "及格率": round(float((df[subject] >= 60).sum() / len(df) * 100), 2)
+            }
+    
+        # 总分和平均分统计
+        results["basic_info"]["statistics"]["总分"] = {
+            "平均分": round(float(df['总分'].mean()), 2),
+            "最高分": float(df['总分'].max()),
+            "最低分": float(df['总分'].min()),
+            "标准差": round(float(df['总分'].std()), 2)
+        }
+    
+        results["basic_info"]["statistics"]["平均分"] = {
+            "班级平均": round(float(df['平均分'].mean()), 2),
+            "最高平均": round(float(df['平均分'].max()), 2),
+            "最低平均": round(float(df['平均分'].min()), 2)
+        }
+    
+        # 排名信息
+        name_col = '姓名' if '姓名' in df.columns else ('Name' if 'Name' in df.columns else df.columns[1])
+    
+        # 各科第一名
+        for subject in subject_cols:
+            top_idx = df[subject].idxmax()
+            results["rankings"][f"{subject}_第一名"] = {
+                "姓名": str(df.loc[top_idx, name_col]),
+                "分数": float(df.loc[top_idx, subject])
+            }
+    
+        # 总分第一名
+        top_idx = df['总分'].idxmax()
+        results["rankings"]["总分第一名"] = {
+            "姓名": str(df.loc[top_idx, name_col]),
+            "总分": float(df.loc[top_idx, '总分']),
+            "各科成绩": {subj: float(df.loc[top_idx, subj]) for subj in subject_cols}
+        }
+    
+        # 平均分第一名
+        top_idx = df['平均分'].idxmax()
+        results["rankings"]["平均分第一名"] = {
+            "姓名": str(df.loc[top_idx, name_col]),
+            "平均分": round(float(df.loc[top_idx, '平均分']), 2)
+        }
+    
+        # 单科状元（所有科目都是第一的学生）
+        top_students = []
+        for subject in subject_cols:
+            max_score = df[subject].max()
+            top_students_subj = df[df[subject] == max_score][name_col].tolist()
+        
+        # 各科前三名
+        for subject in subject_cols:
+            top3 = df.nlargest(3, subject)[[name_col, subject]]
+            results["rankings"][f"{subject}_前三名"] = [
+                {"姓名": str(row[name_col]), "分数": float(row[subject])}
+                for _, row in top3.iterrows()
+            ]
+    
+        # 总分前三名
+        top3 = df.nlargest(3, '总分')[[name_col, '总分'] + subject_cols]
+        results["rankings"]["总分前三名"] = [
+            {
+                "姓名": str(row[name_col]),
+                "总分": float(row['总分']),
+                "各科": {subj: float(row[subj]) for subj in subject_cols}
+            }
+            for _, row in top3.iterrows()
+        ]
+    return subject_cols, name_col
+
+
+def make_dataset(rows: int, subjects: int, seed: int = 0) -> pd.DataFrame:
+    """生成 rows 名学生、subjects 门科目的成绩表（整数分数，包含大量同分）"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "学号": np.arange(1, rows + 1),
+        "姓名": pd.Series(np.arange(rows)).astype(str).radd("S").to_numpy(),
+    }
+    for j in range(subjects):
+        data[f"科目{j + 1}"] = rng.normal(72, 12, rows).clip(0, 100).round().astype("int64")
+    return pd.DataFrame(data)
+
+
+def empty_results(df: pd.DataFrame) -> dict:
+    return {"basic_info": {"total_students": len(df), "subjects": [], "statistics": {}}, "rankings": {}}
+
+
+def timed(func, df):
+    results = empty_results(df)
+    start = time.perf_counter()
+    func(df, results)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="成绩统计引擎基准测试")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 10_000_000], help="数据行数")
+    parser.add_argument("--subjects", type=int, default=6, help="科目数量")
+    args = parser.parse_args()
+
+    print(f"科目数 {args.subjects}\n")
+    print(f"{'行数':>10} {'原实现':>10} {'向量化':>10} {'加速':>7}  结果一致")
+    for rows in args.rows:
+        df = make_dataset(rows, args.subjects)
+        legacy_seconds, legacy_results = timed(legacy_statistics, df.copy())
+        engine_seconds, engine_results = timed(compute_statistics, df)
+        same = legacy_results == engine_results
+        print(f"{rows:>10} {legacy_seconds:>9.3f}s {engine_seconds:>9.3f}s "
+              f"{legacy_seconds / engine_seconds:>6.1f}x  {'是' if same else '否'}")
+        del df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+上传格式基准测试
+
+在合成的宽表数值数据上对比 CSV、Parquet 与 Arrow IPC 三种上传格式：
+主机转换耗时、上传字节数，以及 Sandbox 中分析脚本读取数据（read_table）的耗时：
+
+    python bench_upload_format.py --rows 100000 --columns 50
+
+需要安装 pyarrow。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis_script import read_table
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.columnar import encode_csv
+
+
+# (名称, 上传格式, 压缩编码)
+VARIANTS = [
+    ("csv", "csv", None),
+    ("parquet+zstd", "parquet", "zstd"),
+    ("arrow+zstd", "arrow", "zstd"),
+    ("arrow 未压缩", "arrow", None),
+]
+
+
+def make_csv(rows: int, columns: int, seed: int = 0) -> str:
+    """生成 rows 名学生、columns 门科目的成绩 CSV 文本"""
+    rng = np.random.default_rng(seed)
+    data = {"学号": np.arange(1, rows + 1), "姓名": [f"S{i}" for i in range(rows)]}
+    for j in range(columns):
+        data[f"科目{j + 1}"] = rng.normal(72, 12, rows).clip(0, 100).round(1)
+    return pd.DataFrame(data).to_csv(index=False)
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传格式基准测试")
+    parser.add_argument("--rows", type=int, default=100_000, help="数据行数")
+    parser.add_argument("--columns", type=int, default=50, help="数值列数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每项取最快的一次")
+    args = parser.parse_args()
+
+    csv_content = make_csv(args.rows, args.columns)
+    csv_bytes = len(csv_content.encode("utf-8"))
+    reference = None
+
+    print(f"{args.rows} 行 x {args.columns} 个数值列，CSV {csv_bytes / 1e6:.1f} MB\n")
+    print(f"{'格式':<14} {'主机转换':>9} {'上传大小':>10} {'压缩比':>7} {'读取耗时':>9} {'读取加速':>8}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_load_seconds = None
+        for name, upload_format, compression in VARIANTS:
+            encode_seconds = best_of(lambda: encode_csv(csv_content, upload_format, compression), args.repeat)
+            data = encode_csv(csv_content, upload_format, compression)
+            path = os.path.join(directory, f"data.{upload_format}")
+            with open(path, "wb") as f:
+                f.write(data)
+
+            load_seconds = best_of(lambda: read_table(path, upload_format), args.repeat)
+            df = read_table(path, upload_format)
+            if reference is None:
+                reference = df
+            assert np.allclose(df.iloc[:, 2:].to_numpy(), reference.iloc[:, 2:].to_numpy()), f"{name} 数据不一致"
+            csv_load_seconds = csv_load_seconds or load_seconds
+
+            print(f"{name:<14} {encode_seconds * 1000:>7.0f}ms {len(data) / 1e6:>8.2f}MB "
+                  f"{csv_bytes / len(data):>6.1f}x {load_seconds * 1000:>7.0f}ms "
+                  f"{csv_load_seconds / load_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
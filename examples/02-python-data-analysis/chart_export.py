@@ -0,0 +1,95 @@
+"""
+图表批量导出
+
+原来的做法是每张图表在 Sandbox 中单独启动一次 `python3 -c` 做 base64 转换，
+N 张图表就是 N 次进程启动和 N 次 RPC。这里用一次 Sandbox 命令读取全部图表，
+以一个 JSON 对象返回，无论图表数量多少都只有一次往返。
+"""
+
+import json
+import logging
+import shlex
+from typing import Any, List
+
+
+logger = logging.getLogger(__name__)
+
+
+# 在 Sandbox 中执行：读取命令行参数中的所有文件，输出 {路径: base64}
+_EXPORT_SCRIPT = """
+import base64, json, sys
+out = {}
+for path in sys.argv[1:]:
+    try:
+        with open(path, 'rb') as f:
+            out[path] = base64.b64encode(f.read()).decode()
+    except OSError:
+        out[path] = ''
+print(json.dumps(out))
+"""
+
+
+def export_charts_base64(sandbox: Any, chart_paths: List[str], timeout: int = 60) -> List[str]:
+    """
+    一次 Sandbox 往返导出全部图表的 base64 编码
+
+    Args:
+        sandbox: Sandbox 实例
+        chart_paths: Sandbox 中的图表路径列表
+        timeout: 命令超时时间（秒）
+
+    Returns:
+        与 chart_paths 顺序一致的 base64 字符串列表，失败的图表为空字符串
+    """
+    if not chart_paths:
+        return []
+
+    command = "python3 -c " + shlex.quote(_EXPORT_SCRIPT) + " " + " ".join(shlex.quote(p) for p in chart_paths)
+    try:
+        result = sandbox.commands.run(command, timeout=timeout)
+        if result.exit_code != 0:
+            logger.warning(f"批量导出图表失败: {result.stderr}")
+            return [""] * len(chart_paths)
+        encoded = json.loads(result.stdout)
+    except Exception as e:
+        logger.warning(f"批量导出图表失败: {e}")
+        return [""] * len(chart_paths)
+
+    chart_base64_list = [encoded.get(path, "") for path in chart_paths]
+    for path, data in zip(chart_paths, chart_base64_list):
+        if not data:
+            logger.warning(f"转换图表失败: {path}")
+    return chart_base64_list
+
+
+def export_charts_base64_per_chart(sandbox: Any, chart_paths: List[str]) -> List[str]:
+    """
+    逐张图表导出（每张图表一次进程启动和一次 RPC），保留用于基准对比
+
+    Args:
+        sandbox: Sandbox 实例
+        chart_paths: Sandbox 中的图表路径列表
+
+    Returns:
+        与 chart_paths 顺序一致的 base64 字符串列表，失败的图表为空字符串
+    """
+    chart_base64_list = []
+    for chart_path in chart_paths:
+        try:
+            # 在 Sandbox 中使用 Python 转换图片为 base64
+            convert_script = f"""
+import base64
+with open('{chart_path}', 'rb') as f:
+    data = f.read()
+    print(base64.b64encode(data).decode())
+"""
+            result = sandbox.commands.run(f"python3 -c \"{convert_script}\"")
+            if result.exit_code == 0:
+                chart_base64_list.append(result.stdout.strip())
+            else:
+                logger.warning(f"转换图表失败: {chart_path}")
+                chart_base64_list.append("")
+        except Exception as e:
+            logger.warning(f"读取图表失败: {chart_path}, {e}")
+            chart_base64_list.append("")
+    return chart_base64_list
@@ -0,0 +1,192 @@
+"""
+按依赖关系执行的流水线
+
+main() 原来逐步执行：先创建 Sandbox、安装依赖，之后才开始调用 Bedrock 生成测试数据，
+尽管两者互不依赖；图表导出也要等 AI 报告返回之后才开始。
+
+TaskGraph 把每个步骤登记为一个任务并声明它依赖的任务，任务的输入全部就绪后立即在
+线程池中开始执行，互不依赖的步骤自然重叠。执行结束后记录每个阶段的开始时间和耗时，
+并按依赖关系找出关键路径：缩短关键路径上的阶段才能缩短总耗时。
+"""
+
+import logging
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+
+def _pad(text: str, width: int) -> str:
+    """按显示宽度左对齐（中文字符占两列）"""
+    used = sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+    return text + " " * max(0, width - used)
+
+
+@dataclass
+class Task:
+    """流水线中的一个阶段"""
+    name: str
+    func: Callable[..., Any]
+    deps: Sequence[str]
+    label: str
+
+
+@dataclass
+class StageTiming:
+    """阶段耗时：start / end 为相对流水线开始的秒数"""
+    name: str
+    label: str
+    deps: Sequence[str]
+    start: float
+    end: float
+    ok: bool
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+class TaskGraph:
+    """
+    依赖图执行器
+
+    用法：
+        graph = TaskGraph()
+        graph.add("data", generate_data)
+        graph.add("sandbox", Sandbox.create)
+        graph.add("analysis", lambda data, sandbox: analyze(sandbox, data), deps=("data", "sandbox"))
+        results = graph.run()
+        graph.log_timings()
+    """
+
+    def __init__(self, max_workers: int = 8):
+        """
+        Args:
+            max_workers: 同时执行的任务数
+        """
+        self.max_workers = max_workers
+        self.tasks: Dict[str, Task] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, StageTiming] = {}
+        self.elapsed = 0.0
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        deps: Sequence[str] = (),
+        label: Optional[str] = None,
+    ) -> str:
+        """
+        登记一个任务
+
+        Args:
+            name: 任务名，也是它的结果在 results 中的键
+            func: 任务函数，依赖任务的结果按任务名作为关键字参数传入
+            deps: 依赖的任务名，必须已经登记
+            label: 计时输出中显示的名称，默认为 name
+
+        Returns:
+            任务名
+        """
+        if name in self.tasks:
+            raise ValueError(f"任务已存在: {name}")
+        missing = [dep for dep in deps if dep not in self.tasks]
+        if missing:
+            raise ValueError(f"任务 {name} 依赖未登记的任务: {', '.join(missing)}")
+        self.tasks[name] = Task(name, func, tuple(deps), label or name)
+        return name
+
+    def run(self) -> Dict[str, Any]:
+        """
+        执行全部任务
+
+        任务失败时不再启动新的任务，等待正在执行的任务结束后抛出第一个异常；
+        已完成任务的结果仍保留在 results 中（例如用于归还已创建的 Sandbox）
+
+        Returns:
+            任务名 -> 结果
+        """
+        origin = time.perf_counter()
+        pending = list(self.tasks)
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                # 依赖全部完成的任务立即开始（按登记顺序）
+                if error is None:
+                    for name in list(pending):
+                        task = self.tasks[name]
+                        if all(dep in self.results for dep in task.deps):
+                            pending.remove(name)
+                            kwargs = {dep: self.results[dep] for dep in task.deps}
+                            running[executor.submit(self._execute, task, kwargs, origin)] = name
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except BaseException as e:
+                        error = error or e
+
+        self.elapsed = time.perf_counter() - origin
+        if error is not None:
+            raise error
+        return self.results
+
+    def critical_path(self) -> List[StageTiming]:
+        """
+        关键路径：从最后结束的阶段开始，每次回溯到最晚结束的依赖
+
+        Returns:
+            按执行顺序排列的阶段
+        """
+        if not self.timings:
+            return []
+        current = max(self.timings.values(), key=lambda t: t.end)
+        path = [current]
+        while True:
+            deps = [self.timings[dep] for dep in current.deps if dep in self.timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda t: t.end)
+            path.append(current)
+        return list(reversed(path))
+
+    def log_timings(self) -> None:
+        """输出每个阶段的开始时间、耗时和关键路径"""
+        logger.info(f"\n⏱️  流水线阶段耗时（总耗时 {self.elapsed:.2f}s）:")
+        for timing in sorted(self.timings.values(), key=lambda t: t.start):
+            deps = f"，依赖 {', '.join(self.tasks[d].label for d in timing.deps)}" if timing.deps else ""
+            status = "" if timing.ok else "（失败）"
+            logger.info(
+                f"   {_pad(timing.label, 16)} {timing.start:>7.2f}s 开始  {timing.seconds:>7.2f}s{status}{deps}"
+            )
+        path = self.critical_path()
+        if path:
+            total = sum(t.seconds for t in path)
+            logger.info(
+                f"🧭 关键路径（{total:.2f}s）: " + " → ".join(f"{t.label} {t.seconds:.2f}s" for t in path)
+            )
+
+    # ==================== 内部实现 ====================
+
+    def _execute(self, task: Task, kwargs: Dict[str, Any], origin: float) -> Any:
+        start = time.perf_counter() - origin
+        ok = False
+        try:
+            result = task.func(**kwargs)
+            ok = True
+            return result
+        finally:
+            self.timings[task.name] = StageTiming(
+                task.name, task.label, task.deps, start, time.perf_counter() - origin, ok
+            )
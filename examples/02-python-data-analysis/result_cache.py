@@ -0,0 +1,220 @@
+"""
+分析结果缓存
+
+重试、重新渲染报告、对比不同的 AI prompt 时，经常会对同一份 CSV 重复分析。
+这里按内容寻址缓存 analyze_csv_in_sandbox 的结果：缓存键由数据字节、分析脚本版本和
+图表选项的哈希组成，缓存内容包括 JSON 统计结果和渲染好的图表字节。
+
+两级缓存：
+- 内存 LRU：进程内重复分析时直接返回
+- 磁盘：每个条目一个目录（results.json + 图表文件），总大小超过上限时按最近使用时间淘汰
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CACHE_DIR = "./.analysis_cache"
+DEFAULT_MEMORY_ENTRIES = 32
+DEFAULT_DISK_MAX_BYTES = 256 * 1024 * 1024
+
+_RESULTS_FILE = "results.json"
+
+
+def make_cache_key(data: bytes, script: bytes, options: Dict) -> str:
+    """
+    计算缓存键
+
+    Args:
+        data: 数据集字节
+        script: 分析脚本内容（脚本修改后旧缓存自动失效）
+        options: 影响结果的选项，例如图表格式和分辨率
+
+    Returns:
+        十六进制 SHA-256 摘要
+    """
+    digest = hashlib.sha256()
+    for part in (data, script, json.dumps(options, sort_keys=True).encode("utf-8")):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entry:
+    """缓存条目：不含 chart_images 的统计结果，以及与 results['charts'] 顺序一致的图表字节"""
+    results: Dict
+    charts: List[bytes]
+
+
+class AnalysisResultCache:
+    """
+    内存 LRU + 磁盘两级的分析结果缓存
+
+    用法：
+        cache = AnalysisResultCache("./.analysis_cache")
+        results = cache.get(key)
+        if results is None:
+            results = analyze_csv_in_sandbox(sandbox, csv_path, embed_charts=True)
+            cache.put(key, results)
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录，为 None 时只使用内存缓存
+            memory_entries: 内存中保留的条目数
+            disk_max_bytes: 磁盘缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回统计结果的副本，图表以 base64 放在 chart_images 中；未命中返回 None
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._materialize(entry)
+
+            entry = self._read_disk(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, entry)
+            return self._materialize(entry)
+
+    def put(self, key: str, results: Dict) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: make_cache_key 计算的缓存键
+            results: 分析结果，必须包含 chart_images（使用 embed_charts=True 分析）
+        """
+        if "chart_images" not in results:
+            raise ValueError("缓存分析结果需要内嵌图表（embed_charts=True）")
+        stored = {k: v for k, v in results.items() if k != "chart_images"}
+        entry = _Entry(copy.deepcopy(stored), [base64.b64decode(image) for image in results["chart_images"]])
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+
+    def clear(self) -> None:
+        """清空内存和磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self.cache_dir and os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    # ==================== 内部实现 ====================
+
+    @staticmethod
+    def _materialize(entry: _Entry) -> Dict:
+        results = copy.deepcopy(entry.results)
+        results["chart_images"] = [base64.b64encode(chart).decode() for chart in entry.charts]
+        return results
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _chart_name(self, index: int, results: Dict) -> str:
+        return f"chart_{index}.{results.get('chart_format', 'png')}"
+
+    def _read_disk(self, key: str) -> Optional[_Entry]:
+        if not self.cache_dir:
+            return None
+        entry_dir = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry_dir, _RESULTS_FILE), "r", encoding="utf-8") as f:
+                results = json.load(f)
+            charts = []
+            for i in range(len(results.get("charts", []))):
+                with open(os.path.join(entry_dir, self._chart_name(i, results)), "rb") as f:
+                    charts.append(f.read())
+        except (OSError, ValueError):
+            return None
+        # 更新修改时间，作为磁盘淘汰时的最近使用时间
+        os.utime(entry_dir)
+        return _Entry(results, charts)
+
+    def _write_disk(self, key: str, entry: _Entry) -> None:
+        if not self.cache_dir:
+            return
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry_dir):
+            os.utime(entry_dir)
+            return
+        staging = None
+        try:
+            # 先写入临时目录再重命名，其他进程不会读到写了一半的条目
+            staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+            with open(os.path.join(staging, _RESULTS_FILE), "w", encoding="utf-8") as f:
+                json.dump(entry.results, f, ensure_ascii=False)
+            for i, chart in enumerate(entry.charts):
+                with open(os.path.join(staging, self._chart_name(i, entry.results)), "wb") as f:
+                    f.write(chart)
+            os.replace(staging, entry_dir)
+        except OSError as e:
+            logger.warning(f"写入磁盘缓存失败: {e}")
+            if staging:
+                shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        """磁盘缓存超过上限时，按最近使用时间从旧到新删除条目"""
+        entries: List[Tuple[float, int, str]] = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".tmp-") or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.stats["evictions"] += 1
+            logger.info(f"淘汰磁盘缓存条目: {os.path.basename(path)}")
+
+    def __repr__(self) -> str:
+        return f"AnalysisResultCache(dir={self.cache_dir!r}, memory={len(self._memory)}, stats={self.stats})"
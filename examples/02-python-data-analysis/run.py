@@ -1,10 +1,35 @@
 from dotenv import load_dotenv
-import boto3
+import argparse
 import json
 import logging
 import os
+import queue
+import sys
+import threading
 from scalebox import Sandbox
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TextIO
+
+from chart_export import export_charts_base64
+from pipeline import TaskGraph
+from result_cache import DEFAULT_CACHE_DIR, AnalysisResultCache, make_cache_key
+from sandbox_pool import SandboxPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.bedrock_cache import (
+    BedrockResponseCache,
+    get_cached_bedrock_runtime_client,
+    get_response_cache,
+    install_response_cache,
+)
+from common.bedrock_runtime import (
+    get_bedrock_runtime_client,
+    iter_converse_stream,
+    iter_invoke_model_stream,
+)
+from common.artifacts import ARTIFACT_DESTINATIONS, ArtifactInfo, ArtifactSink
+from common.columnar import UPLOAD_FORMATS, upload_table
+from common.csv_generation import get_csv_generation_service
+from common.dataset_inspection import format_column_profile, format_preview, format_size, inspect_dataset
 
 
 load_dotenv()
@@ -14,6 +39,42 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
+# 在 Sandbox 中执行的分析脚本
+ANALYSIS_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_script.py")
+
+# 图表格式对应的 MIME 类型（用于 data URI）
+CHART_MIME_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "svg": "image/svg+xml",
+}
+
+# HTML 报告文件名（本地 ./output 目录和 Sandbox 的 /tmp 目录）
+REPORT_FILENAME = "analysis_report.html"
+
+# AI 分析报告的采样参数
+ANALYSIS_MAX_TOKENS = 2048
+ANALYSIS_TEMPERATURE = 0.7
+ANALYSIS_TOP_P = 0.9
+
+
+def build_analysis_prompt(data_summary: str) -> str:
+    """构建 AI 分析报告的提示词"""
+    return f"""你是一位专业的数据分析师。请基于以下班级期末考试成绩统计数据，生成一份详细的分析报告。
+
+数据统计摘要：
+{data_summary}
+
+请从以下角度进行分析：
+1. **整体表现分析**：班级整体成绩水平、各科目表现
+2. **优秀学生分析**：各项第一名的特点和共同点
+3. **学科分析**：各科目的难易程度、分数分布特征
+4. **改进建议**：针对班级和个人的提升建议
+5. **趋势预测**：基于数据的可能趋势
+
+请用专业、客观的语气，生成一份结构清晰的分析报告（约500-800字）。"""
+
+
 def call_bedrock_for_analysis(data_summary: str, model_id: str = "deepseek.v3-v1:0") -> str:
     """
     调用 Bedrock 模型生成数据分析报告
@@ -26,32 +87,11 @@ def call_bedrock_for_analysis(data_summary: str, model_id: str = "deepseek.v3-v1
         AI 生成的分析报告
     """
     try:
-        # 获取 AWS 配置
-        region = os.getenv('AWS_REGION', 'eu-north-1')
-        bedrock_token = os.getenv('AWS_BEDROCK_TOKEN')
-        
-        # 配置认证
-        if bedrock_token:
-            os.environ['AWS_SESSION_TOKEN'] = bedrock_token
-            logger.info("使用 BedRock Token 认证")
-        
-        client = boto3.client('bedrock-runtime', region_name=region)
-        logger.info(f"连接到 AWS Region: {region}")
+        # 获取共享的 Bedrock Runtime 客户端（进程内复用连接池和凭证，启用时经过响应缓存）
+        client = get_cached_bedrock_runtime_client()
         
         # 构建分析提示词
-        prompt = f"""你是一位专业的数据分析师。请基于以下班级期末考试成绩统计数据，生成一份详细的分析报告。
-
-数据统计摘要：
-{data_summary}
-
-请从以下角度进行分析：
-1. **整体表现分析**：班级整体成绩水平、各科目表现
-2. **优秀学生分析**：各项第一名的特点和共同点
-3. **学科分析**：各科目的难易程度、分数分布特征
-4. **改进建议**：针对班级和个人的提升建议
-5. **趋势预测**：基于数据的可能趋势
-
-请用专业、客观的语气，生成一份结构清晰的分析报告（约500-800字）。"""
+        prompt = build_analysis_prompt(data_summary)
         
         logger.info(f"调用 Bedrock 模型生成分析报告: {model_id}")
         
@@ -62,9 +102,9 @@ def call_bedrock_for_analysis(data_summary: str, model_id: str = "deepseek.v3-v1
                     "content": prompt
                 }
             ],
-            "max_tokens": 2048,
-            "temperature": 0.7,
-            "top_p": 0.9
+            "max_tokens": ANALYSIS_MAX_TOKENS,
+            "temperature": ANALYSIS_TEMPERATURE,
+            "top_p": ANALYSIS_TOP_P
         }
         
         response = client.invoke_model(
@@ -85,18 +125,63 @@ def call_bedrock_for_analysis(data_summary: str, model_id: str = "deepseek.v3-v1
         raise
 
 
-def install_analysis_dependencies(sandbox: Sandbox) -> None:
+def stream_bedrock_analysis(
+    data_summary: str,
+    model_id: str = "deepseek.v3-v1:0",
+    use_converse: bool = False,
+) -> Iterator[str]:
+    """
+    流式调用 Bedrock 模型生成数据分析报告，边生成边产出文本片段
+    
+    Args:
+        data_summary: 数据统计摘要
+        model_id: Bedrock 模型 ID
+        use_converse: 为 True 时使用 Converse Stream API，否则使用 invoke_model_with_response_stream
+        
+    Yields:
+        AI 报告的文本片段
+    """
+    client = get_bedrock_runtime_client()
+    prompt = build_analysis_prompt(data_summary)
+    logger.info(f"流式调用 Bedrock 模型生成分析报告: {model_id}")
+    
+    if use_converse:
+        tokens = iter_converse_stream(
+            client,
+            model_id,
+            [{"role": "user", "content": [{"text": prompt}]}],
+            {"maxTokens": ANALYSIS_MAX_TOKENS, "temperature": ANALYSIS_TEMPERATURE, "topP": ANALYSIS_TOP_P},
+        )
+    else:
+        tokens = iter_invoke_model_stream(client, model_id, {
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": ANALYSIS_MAX_TOKENS,
+            "temperature": ANALYSIS_TEMPERATURE,
+            "top_p": ANALYSIS_TOP_P,
+        })
+    
+    try:
+        yield from tokens
+        logger.info("✅ Bedrock AI 分析报告流式生成完成")
+    except Exception as e:
+        logger.error(f"流式调用 Bedrock 失败: {str(e)}")
+        raise
+
+
+def install_analysis_dependencies(sandbox: Sandbox, with_pyarrow: bool = False) -> None:
     """
     在 Sandbox 中安装数据分析所需的依赖库
     
     Args:
         sandbox: Sandbox 实例
+        with_pyarrow: 同时安装 pyarrow，读取 Parquet / Arrow 上传格式时需要
     """
     logger.info("安装分析依赖库...")
     
     # 安装 pandas, matplotlib, numpy
+    packages = "pandas matplotlib numpy pyarrow" if with_pyarrow else "pandas matplotlib numpy"
     result = sandbox.commands.run(
-        "pip install pandas matplotlib numpy -q",
+        f"pip install {packages} -q",
         timeout=120
     )
     
@@ -106,229 +191,66 @@ def install_analysis_dependencies(sandbox: Sandbox) -> None:
         logger.warning(f"依赖库安装可能有问题: {result.stderr}")
 
 
-def analyze_csv_in_sandbox(sandbox: Sandbox, csv_path: str) -> Dict:
+def create_analysis_pool(
+    size: int = 2,
+    max_age: float = 240.0,
+    max_uses: int = 20,
+    with_pyarrow: bool = False,
+) -> SandboxPool:
+    """
+    创建并预热一个已安装分析依赖的 Sandbox 池
+
+    Args:
+        size: 池中保持的预热 Sandbox 数量
+        max_age: Sandbox 最大存活时间（秒）
+        max_uses: 单个 Sandbox 最大复用次数
+        with_pyarrow: 预装 pyarrow，配合 main(upload_format="parquet" / "arrow") 使用
+
+    Returns:
+        已启动的 SandboxPool，可传给 main(pool=...) 重复使用
+    """
+    pool = SandboxPool(
+        Sandbox.create,
+        lambda sandbox: install_analysis_dependencies(sandbox, with_pyarrow),
+        size=size,
+        max_age=max_age,
+        max_uses=max_uses,
+    )
+    return pool.start()
+
+
+def analyze_csv_in_sandbox(
+    sandbox: Sandbox,
+    csv_path: str,
+    embed_charts: bool = False,
+    chart_format: str = "png",
+    dpi: int = 100,
+    parallel_charts: bool = False,
+    chunksize: int = 0,
+    data_format: str = "auto",
+) -> Dict:
     """
     在 Sandbox 中分析 CSV 数据并生成统计结果和图表
     
     Args:
         sandbox: Sandbox 实例
-        csv_path: CSV 文件在 Sandbox 中的路径
+        csv_path: 数据文件在 Sandbox 中的路径（CSV，或 upload_table 上传的 Parquet / Arrow）
+        embed_charts: 为 True 时图表在内存中渲染并以 base64 随结果返回（chart_images），
+                      生成报告时无需再从 Sandbox 读取图表文件
+        chart_format: 图表格式，png / webp / svg
+        dpi: 图表分辨率（svg 为矢量格式，dpi 只影响其中的位图元素）
+        parallel_charts: 在 Sandbox 的进程池中并发渲染图表（多核 Sandbox 上更快）
+        chunksize: 大于 0 时按块读取 CSV（每块行数），用于超过 Sandbox 内存的文件
+        data_format: 数据格式 csv / parquet / arrow，auto 表示按扩展名判断
         
     Returns:
-        包含统计结果和图表路径的字典
+        包含统计结果、图表路径和每张图表渲染耗时（chart_timings）的字典
     """
     logger.info(f"开始分析 CSV 文件: {csv_path}")
     
-    # 创建分析脚本
-    analysis_script = """
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-import json
-import sys
-
-# 设置中文字体（使用 matplotlib 内置字体）
-matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans']
-matplotlib.rcParams['axes.unicode_minus'] = False
-
-# 读取 CSV 文件
-csv_file = sys.argv[1]
-df = pd.read_csv(csv_file, encoding='utf-8')
-
-# 基本统计信息
-results = {
-    "basic_info": {
-        "total_students": len(df),
-        "subjects": [],
-        "statistics": {}
-    },
-    "rankings": {},
-    "charts": []
-}
-
-# 识别科目列（排除学号、姓名等非成绩列）
-exclude_cols = ['学号', '姓名', '学生ID', '班级', 'ID', 'Name', 'Student_ID']
-subject_cols = [col for col in df.columns if col not in exclude_cols and df[col].dtype in ['int64', 'float64']]
-
-results["basic_info"]["subjects"] = subject_cols
-
-# 计算总分和平均分
-if len(subject_cols) > 0:
-    df['总分'] = df[subject_cols].sum(axis=1)
-    df['平均分'] = df[subject_cols].mean(axis=1)
-    
-    # 各科目统计
-    for subject in subject_cols:
-        results["basic_info"]["statistics"][subject] = {
-            "平均分": round(float(df[subject].mean()), 2),
-            "最高分": float(df[subject].max()),
-            "最低分": float(df[subject].min()),
-            "标准差": round(float(df[subject].std()), 2),
-            "及格率": round(float((df[subject] >= 60).sum() / len(df) * 100), 2)
-        }
-    
-    # 总分和平均分统计
-    results["basic_info"]["statistics"]["总分"] = {
-        "平均分": round(float(df['总分'].mean()), 2),
-        "最高分": float(df['总分'].max()),
-        "最低分": float(df['总分'].min()),
-        "标准差": round(float(df['总分'].std()), 2)
-    }
-    
-    results["basic_info"]["statistics"]["平均分"] = {
-        "班级平均": round(float(df['平均分'].mean()), 2),
-        "最高平均": round(float(df['平均分'].max()), 2),
-        "最低平均": round(float(df['平均分'].min()), 2)
-    }
-    
-    # 排名信息
-    name_col = '姓名' if '姓名' in df.columns else ('Name' if 'Name' in df.columns else df.columns[1])
-    
-    # 各科第一名
-    for subject in subject_cols:
-        top_idx = df[subject].idxmax()
-        results["rankings"][f"{subject}_第一名"] = {
-            "姓名": str(df.loc[top_idx, name_col]),
-            "分数": float(df.loc[top_idx, subject])
-        }
-    
-    # 总分第一名
-    top_idx = df['总分'].idxmax()
-    results["rankings"]["总分第一名"] = {
-        "姓名": str(df.loc[top_idx, name_col]),
-        "总分": float(df.loc[top_idx, '总分']),
-        "各科成绩": {subj: float(df.loc[top_idx, subj]) for subj in subject_cols}
-    }
-    
-    # 平均分第一名
-    top_idx = df['平均分'].idxmax()
-    results["rankings"]["平均分第一名"] = {
-        "姓名": str(df.loc[top_idx, name_col]),
-        "平均分": round(float(df.loc[top_idx, '平均分']), 2)
-    }
-    
-    # 单科状元（所有科目都是第一的学生）
-    top_students = []
-    for subject in subject_cols:
-        max_score = df[subject].max()
-        top_students_subj = df[df[subject] == max_score][name_col].tolist()
-        
-    # 各科前三名
-    for subject in subject_cols:
-        top3 = df.nlargest(3, subject)[[name_col, subject]]
-        results["rankings"][f"{subject}_前三名"] = [
-            {"姓名": str(row[name_col]), "分数": float(row[subject])}
-            for _, row in top3.iterrows()
-        ]
-    
-    # 总分前三名
-    top3 = df.nlargest(3, '总分')[[name_col, '总分'] + subject_cols]
-    results["rankings"]["总分前三名"] = [
-        {
-            "姓名": str(row[name_col]),
-            "总分": float(row['总分']),
-            "各科": {subj: float(row[subj]) for subj in subject_cols}
-        }
-        for _, row in top3.iterrows()
-    ]
-    
-    # 生成图表
-    # 1. 各科平均分对比图
-    plt.figure(figsize=(12, 6))
-    avg_scores = [df[subj].mean() for subj in subject_cols]
-    plt.bar(subject_cols, avg_scores, color='skyblue', edgecolor='navy', alpha=0.7)
-    plt.axhline(y=60, color='r', linestyle='--', label='Passing Line (60)')
-    plt.xlabel('Subjects', fontsize=12)
-    plt.ylabel('Average Score', fontsize=12)
-    plt.title('Average Scores by Subject', fontsize=14, fontweight='bold')
-    plt.ylim(0, 100)
-    plt.legend()
-    plt.grid(axis='y', alpha=0.3)
-    chart1 = '/tmp/chart_avg_scores.png'
-    plt.savefig(chart1, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart1)
-    
-    # 2. 总分分布直方图
-    plt.figure(figsize=(10, 6))
-    plt.hist(df['总分'], bins=20, color='lightgreen', edgecolor='darkgreen', alpha=0.7)
-    plt.xlabel('Total Score', fontsize=12)
-    plt.ylabel('Number of Students', fontsize=12)
-    plt.title('Distribution of Total Scores', fontsize=14, fontweight='bold')
-    plt.grid(axis='y', alpha=0.3)
-    chart2 = '/tmp/chart_total_distribution.png'
-    plt.savefig(chart2, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart2)
-    
-    # 3. 各科成绩箱线图
-    plt.figure(figsize=(12, 6))
-    df[subject_cols].boxplot()
-    plt.ylabel('Score', fontsize=12)
-    plt.title('Score Distribution by Subject (Box Plot)', fontsize=14, fontweight='bold')
-    plt.xticks(rotation=45)
-    plt.grid(axis='y', alpha=0.3)
-    chart3 = '/tmp/chart_boxplot.png'
-    plt.savefig(chart3, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart3)
-    
-    # 4. 前十名学生雷达图（如果有多个科目）
-    if len(subject_cols) >= 3:
-        from math import pi
-        
-        top10 = df.nlargest(10, '总分')
-        fig, ax = plt.subplots(figsize=(10, 10), subplot_kw=dict(projection='polar'))
-        
-        angles = [n / float(len(subject_cols)) * 2 * pi for n in range(len(subject_cols))]
-        angles += angles[:1]
-        
-        ax.set_theta_offset(pi / 2)
-        ax.set_theta_direction(-1)
-        ax.set_xticks(angles[:-1])
-        ax.set_xticklabels(subject_cols)
-        
-        # 绘制前3名的雷达图
-        for i in range(min(3, len(top10))):
-            values = top10.iloc[i][subject_cols].values.tolist()
-            values += values[:1]
-            ax.plot(angles, values, 'o-', linewidth=2, label=f"{top10.iloc[i][name_col]}")
-            ax.fill(angles, values, alpha=0.15)
-        
-        ax.set_ylim(0, 100)
-        plt.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
-        plt.title('Top 3 Students - Subject Performance', fontsize=14, fontweight='bold', pad=20)
-        chart4 = '/tmp/chart_radar_top3.png'
-        plt.savefig(chart4, dpi=100, bbox_inches='tight')
-        plt.close()
-        results["charts"].append(chart4)
-    
-    # 5. 及格率对比图
-    plt.figure(figsize=(12, 6))
-    pass_rates = [(df[subj] >= 60).sum() / len(df) * 100 for subj in subject_cols]
-    bars = plt.bar(subject_cols, pass_rates, color='coral', edgecolor='darkred', alpha=0.7)
-    plt.axhline(y=80, color='g', linestyle='--', label='Target (80%)')
-    plt.xlabel('Subjects', fontsize=12)
-    plt.ylabel('Pass Rate (%)', fontsize=12)
-    plt.title('Pass Rate by Subject (>=60)', fontsize=14, fontweight='bold')
-    plt.ylim(0, 100)
-    plt.legend()
-    plt.grid(axis='y', alpha=0.3)
-    
-    # 在柱子上显示数值
-    for bar, rate in zip(bars, pass_rates):
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
-                f'{rate:.1f}%', ha='center', va='bottom')
-    
-    chart5 = '/tmp/chart_pass_rates.png'
-    plt.savefig(chart5, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart5)
-
-# 输出结果为 JSON
-print(json.dumps(results, ensure_ascii=False, indent=2))
-"""
+    # 读取分析脚本（与本文件同目录的 analysis_script.py）
+    with open(ANALYSIS_SCRIPT_PATH, 'r', encoding='utf-8') as f:
+        analysis_script = f.read()
     
     # 将分析脚本写入 Sandbox
     script_path = "/tmp/analysis_script.py"
@@ -337,10 +259,14 @@ print(json.dumps(results, ensure_ascii=False, indent=2))
     
     # 执行分析脚本
     logger.info("执行数据分析...")
-    result = sandbox.commands.run(
-        f"python {script_path} {csv_path}",
-        timeout=60
-    )
+    command = f"python {script_path} {csv_path} --chart-format {chart_format} --dpi {dpi} --format {data_format}"
+    if embed_charts:
+        command += " --embed-charts"
+    if parallel_charts:
+        command += " --parallel-charts"
+    if chunksize > 0:
+        command += f" --chunksize {chunksize}"
+    result = sandbox.commands.run(command, timeout=60)
     
     if result.exit_code != 0:
         logger.error(f"分析脚本执行失败: {result.stderr}")
@@ -350,6 +276,8 @@ print(json.dumps(results, ensure_ascii=False, indent=2))
     try:
         analysis_results = json.loads(result.stdout)
         logger.info("✅ 数据分析完成")
+        for timing in analysis_results.get("chart_timings", []):
+            logger.info(f"   图表 {timing['chart']}: {timing['seconds']:.2f}s")
         return analysis_results
     except json.JSONDecodeError as e:
         logger.error(f"解析分析结果失败: {e}")
@@ -357,43 +285,83 @@ print(json.dumps(results, ensure_ascii=False, indent=2))
         raise
 
 
-def generate_analysis_report(sandbox: Sandbox, analysis_results: Dict, ai_report: str) -> str:
+# AI 分析章节的开头和报告结尾（AI 段落插入两者之间）
+REPORT_AI_SECTION_HEAD = """
+            </div>
+            
+            <!-- 五、AI 智能分析 -->
+            <div class="section">
+                <h2 class="section-title">五、AI 智能分析 🤖</h2>
+                <div class="ai-report">
+                    """
+
+REPORT_TAIL = """
+                </div>
+            </div>
+        </div>
+        
+        <div class="footer">
+            <p>📊 报告生成时间: 自动生成</p>
+            <p>🔧 分析工具: AWS Bedrock DeepSeek + Scalebox + Python</p>
+            <p style="margin-top: 10px; color: #adb5bd;">
+                © 2024 智能数据分析系统 | 
+                <a href="https://docs.scalebox.dev" style="color: #667eea; text-decoration: none;">Scalebox</a> | 
+                <a href="https://aws.amazon.com/bedrock/" style="color: #667eea; text-decoration: none;">AWS Bedrock</a>
+            </p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+def encode_charts_base64(sandbox: Sandbox, chart_paths: List[str]) -> List[str]:
     """
-    生成完整的 HTML 格式分析报告文件
+    读取 Sandbox 中的图表并转换为 base64（用于嵌入 HTML）
+    
+    所有图表通过一次 Sandbox 命令批量导出，见 chart_export.export_charts_base64
+    
+    Args:
+        sandbox: Sandbox 实例
+        chart_paths: Sandbox 中的图表路径列表
+        
+    Returns:
+        与 chart_paths 顺序一致的 base64 字符串列表，失败的图表为空字符串
+    """
+    return export_charts_base64(sandbox, chart_paths)
+
+
+def get_chart_images(sandbox: Sandbox, analysis_results: Dict) -> List[str]:
+    """
+    获取报告所需的 base64 图表：分析结果中已内嵌时直接使用，否则从 Sandbox 批量导出
     
     Args:
         sandbox: Sandbox 实例
         analysis_results: 统计分析结果
-        ai_report: AI 生成的分析报告
         
     Returns:
-        报告文件路径
+        与 analysis_results['charts'] 顺序一致的 base64 字符串列表
     """
-    logger.info("生成 HTML 分析报告文件...")
+    if 'chart_images' in analysis_results:
+        return analysis_results['chart_images']
+    return encode_charts_base64(sandbox, analysis_results['charts'])
+
+
+def iter_report_body(analysis_results: Dict, chart_base64_list: List[str]) -> Iterator[str]:
+    """
+    逐段产出 HTML 报告中 AI 分析之前的部分（页头、统计、排名、图表）
     
-    # 读取图表并转换为 base64（用于嵌入 HTML）
-    chart_base64_list = []
-    for chart_path in analysis_results['charts']:
-        try:
-            # 在 Sandbox 中使用 Python 转换图片为 base64
-            convert_script = f"""
-import base64
-with open('{chart_path}', 'rb') as f:
-    data = f.read()
-    print(base64.b64encode(data).decode())
-"""
-            result = sandbox.commands.run(f"python3 -c \"{convert_script}\"")
-            if result.exit_code == 0:
-                chart_base64_list.append(result.stdout.strip())
-            else:
-                logger.warning(f"转换图表失败: {chart_path}")
-                chart_base64_list.append("")
-        except Exception as e:
-            logger.warning(f"读取图表失败: {chart_path}, {e}")
-            chart_base64_list.append("")
+    调用方把片段直接写入文件或 socket，或者最后 join 一次；图表的 base64 数据作为
+    单独的片段产出，不会被复制进更大的字符串
     
-    # 构建 HTML 报告
-    html_report = f"""<!DOCTYPE html>
+    Args:
+        analysis_results: 统计分析结果
+        chart_base64_list: 与图表顺序一致的 base64 图片
+        
+    Yields:
+        HTML 片段
+    """
+    yield f"""<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -657,7 +625,7 @@ with open('{chart_path}', 'rb') as f:
     
     # 各科统计表格
     for subject, stats in analysis_results['basic_info']['statistics'].items():
-        html_report += f"""
+        yield f"""
                 <h3 style="color: #495057; margin: 20px 0 10px 0;">📚 {subject}</h3>
                 <table>
                     <thead>
@@ -669,19 +637,19 @@ with open('{chart_path}', 'rb') as f:
                     <tbody>
 """
         for key, value in stats.items():
-            html_report += f"""
+            yield f"""
                         <tr>
                             <td>{key}</td>
                             <td><strong>{value}</strong></td>
                         </tr>
 """
-        html_report += """
+        yield """
                     </tbody>
                 </table>
 """
     
     # 排名信息
-    html_report += """
+    yield """
             </div>
             
             <!-- 三、优秀学生榜 -->
@@ -698,7 +666,7 @@ with open('{chart_path}', 'rb') as f:
             subject = key.replace('_第一名', '')
             if isinstance(value, dict):
                 if '总分' in value:
-                    html_report += f"""
+                    yield f"""
                     <div class="stat-card">
                         <h3>{subject}</h3>
                         <div class="stat-value">{value['姓名']}</div>
@@ -706,7 +674,7 @@ with open('{chart_path}', 'rb') as f:
                     </div>
 """
                 elif '平均分' in value:
-                    html_report += f"""
+                    yield f"""
                     <div class="stat-card">
                         <h3>{subject}</h3>
                         <div class="stat-value">{value['姓名']}</div>
@@ -714,7 +682,7 @@ with open('{chart_path}', 'rb') as f:
                     </div>
 """
                 else:
-                    html_report += f"""
+                    yield f"""
                     <div class="stat-card">
                         <h3>{subject}</h3>
                         <div class="stat-value">{value['姓名']}</div>
@@ -722,7 +690,7 @@ with open('{chart_path}', 'rb') as f:
                     </div>
 """
     
-    html_report += """
+    yield """
                 </div>
                 
                 <h3 style="color: #495057; margin: 30px 0 20px 0;">🏅 总分前三名</h3>
@@ -733,7 +701,7 @@ with open('{chart_path}', 'rb') as f:
     for i, student in enumerate(analysis_results['rankings'].get('总分前三名', []), 0):
         medal = medals[i] if i < 3 else '🏅'
         subjects_str = ' | '.join([f"{k}: {v}" for k, v in student['各科'].items()])
-        html_report += f"""
+        yield f"""
                 <div class="ranking-card">
                     <h3><span class="medal">{medal}</span> {student['姓名']} - 总分: {student['总分']} 分</h3>
                     <p style="color: #6c757d;">{subjects_str}</p>
@@ -741,14 +709,14 @@ with open('{chart_path}', 'rb') as f:
 """
     
     # 各科前三名详情
-    html_report += """
+    yield """
                 <h3 style="color: #495057; margin: 30px 0 20px 0;">📋 各科前三名详情</h3>
 """
     
     for subject in analysis_results['basic_info']['subjects']:
         key = f"{subject}_前三名"
         if key in analysis_results['rankings']:
-            html_report += f"""
+            yield f"""
                 <h4 style="color: #667eea; margin: 15px 0 10px 0;">{subject}</h4>
                 <table style="max-width: 600px;">
                     <thead>
@@ -761,20 +729,20 @@ with open('{chart_path}', 'rb') as f:
                     <tbody>
 """
             for i, student in enumerate(analysis_results['rankings'][key], 1):
-                html_report += f"""
+                yield f"""
                         <tr>
                             <td>{medals[i-1] if i <= 3 else i}</td>
                             <td>{student['姓名']}</td>
                             <td><strong>{student['分数']}</strong></td>
                         </tr>
 """
-            html_report += """
+            yield """
                     </tbody>
                 </table>
 """
     
     # 数据可视化图表
-    html_report += """
+    yield """
             </div>
             
             <!-- 四、数据可视化图表 -->
@@ -790,67 +758,204 @@ with open('{chart_path}', 'rb') as f:
         "及格率对比图"
     ]
     
+    chart_mime = CHART_MIME_TYPES.get(analysis_results.get('chart_format', 'png'), 'image/png')
     for i, (chart_path, chart_base64) in enumerate(zip(analysis_results['charts'], chart_base64_list)):
         chart_name = chart_titles[i] if i < len(chart_titles) else chart_path.split('/')[-1]
         if chart_base64:
-            html_report += f"""
+            yield f"""
                 <div class="chart-container">
                     <div class="chart-title">{i+1}. {chart_name}</div>
-                    <img src="data:image/png;base64,{chart_base64}" alt="{chart_name}">
+                    <img src="data:{chart_mime};base64,"""
+            yield chart_base64
+            yield f"""" alt="{chart_name}">
                 </div>
 """
         else:
-            html_report += f"""
+            yield f"""
                 <div class="chart-container">
                     <div class="chart-title">{i+1}. {chart_name}</div>
                     <p style="color: #6c757d;">图表加载失败: {chart_path}</p>
                 </div>
 """
+
+
+def render_ai_paragraph(paragraph: str, first: bool) -> str:
+    """将一段 AI 报告文本渲染为 HTML 段落，段落之间用 <br><br> 分隔"""
+    html = f'<p>{paragraph.strip()}</p>'
+    return html if first else '<br><br>' + html
+
+
+def iter_ai_html(ai_report: str) -> Iterator[str]:
+    """将完整的 AI 报告文本逐段转换为 HTML 段落"""
+    paragraphs = [p for p in ai_report.split('\n\n') if p.strip()]
+    for i, paragraph in enumerate(paragraphs):
+        yield render_ai_paragraph(paragraph, i == 0)
+
+
+def iter_analysis_report(analysis_results: Dict, chart_base64_list: List[str], ai_report: str) -> Iterator[str]:
+    """
+    逐段产出完整的 HTML 报告
     
-    # AI 分析报告
-    # 将 AI 报告文本转换为段落
-    ai_paragraphs = ai_report.split('\n\n')
-    ai_html = '<br><br>'.join([f'<p>{p.strip()}</p>' for p in ai_paragraphs if p.strip()])
+    Args:
+        analysis_results: 统计分析结果
+        chart_base64_list: 与图表顺序一致的 base64 图片
+        ai_report: AI 生成的分析报告
+        
+    Yields:
+        HTML 片段
+    """
+    yield from iter_report_body(analysis_results, chart_base64_list)
+    yield REPORT_AI_SECTION_HEAD
+    yield from iter_ai_html(ai_report)
+    yield REPORT_TAIL
+
+
+def write_analysis_report(
+    out: TextIO,
+    analysis_results: Dict,
+    chart_base64_list: List[str],
+    ai_report: str,
+) -> int:
+    """
+    将完整的 HTML 报告逐段写入文本流，内存中不保留整个文档
     
-    html_report += f"""
-            </div>
-            
-            <!-- 五、AI 智能分析 -->
-            <div class="section">
-                <h2 class="section-title">五、AI 智能分析 🤖</h2>
-                <div class="ai-report">
-                    {ai_html}
-                </div>
-            </div>
-        </div>
+    Args:
+        out: 可写文本流（本地文件、socket.makefile 等）
+        analysis_results: 统计分析结果
+        chart_base64_list: 与图表顺序一致的 base64 图片
+        ai_report: AI 生成的分析报告
         
-        <div class="footer">
-            <p>📊 报告生成时间: 自动生成</p>
-            <p>🔧 分析工具: AWS Bedrock DeepSeek + Scalebox + Python</p>
-            <p style="margin-top: 10px; color: #adb5bd;">
-                © 2024 智能数据分析系统 | 
-                <a href="https://docs.scalebox.dev" style="color: #667eea; text-decoration: none;">Scalebox</a> | 
-                <a href="https://aws.amazon.com/bedrock/" style="color: #667eea; text-decoration: none;">AWS Bedrock</a>
-            </p>
-        </div>
-    </div>
-</body>
-</html>
-"""
+    Returns:
+        写入的字符数
+    """
+    written = 0
+    for fragment in iter_analysis_report(analysis_results, chart_base64_list, ai_report):
+        out.write(fragment)
+        written += len(fragment)
+    out.flush()
+    return written
+
+
+def render_analysis_report(analysis_results: Dict, chart_base64_list: List[str], ai_report: str) -> str:
+    """
+    渲染完整的 HTML 报告（片段只拼接一次）
     
-    # 保存 HTML 报告
-    report_path = "/tmp/analysis_report.html"
-    sandbox.files.write(report_path, html_report)
-    logger.info(f"✅ HTML 分析报告已保存: {report_path}")
+    Args:
+        analysis_results: 统计分析结果
+        chart_base64_list: 与图表顺序一致的 base64 图片
+        ai_report: AI 生成的分析报告
+        
+    Returns:
+        HTML 文本
+    """
+    return ''.join(iter_analysis_report(analysis_results, chart_base64_list, ai_report))
+
+
+def generate_analysis_report(
+    sandbox: Optional[Sandbox],
+    analysis_results: Dict,
+    ai_report: str,
+    sink: Optional[ArtifactSink] = None,
+    chart_base64_list: Optional[List[str]] = None,
+) -> ArtifactInfo:
+    """
+    生成完整的 HTML 格式分析报告文件
     
-    # 同时保存一个可以直接打开的本地副本（如果可能）
-    try:
-        report_content = sandbox.files.read(report_path)
-        logger.info(f"HTML 报告大小: {len(report_content)} 字节")
-    except Exception as e:
-        logger.warning(f"无法读取报告内容: {e}")
+    报告逐段写入 sink，大小和 SHA-256 在写入时计算，不再从 Sandbox 读回
+    
+    Args:
+        sandbox: Sandbox 实例（图表已内嵌在分析结果中时可以为 None）
+        analysis_results: 统计分析结果
+        ai_report: AI 生成的分析报告
+        sink: 报告的输出位置，默认只写入 Sandbox 的 /tmp 目录
+        chart_base64_list: 已准备好的 base64 图表（例如与 AI 报告并行导出），为 None 时在这里获取
+        
+    Returns:
+        报告的产物元数据（路径、大小、校验和）
+    """
+    logger.info("生成 HTML 分析报告文件...")
+    
+    sink = sink or ArtifactSink("sandbox", sandbox=sandbox)
+    if chart_base64_list is None:
+        chart_base64_list = get_chart_images(sandbox, analysis_results)
     
-    return report_path
+    with sink.open(REPORT_FILENAME) as out:
+        write_analysis_report(out, analysis_results, chart_base64_list, ai_report)
+    return out.info
+
+
+_STREAM_END = object()
+
+
+def write_analysis_report_streaming(
+    out: TextIO,
+    sandbox: Sandbox,
+    analysis_results: Dict,
+    ai_tokens: Iterable[str],
+) -> str:
+    """
+    流式生成 HTML 报告：模型生成 AI 报告的同时转换图表并输出前四章，
+    之后 AI 段落每完成一段就写出一段
+    
+    Args:
+        out: 可写文本流（本地文件、socket.makefile 等），每段写入后 flush
+        sandbox: Sandbox 实例
+        analysis_results: 统计分析结果
+        ai_tokens: AI 报告文本片段的迭代器，例如 stream_bedrock_analysis(...)
+        
+    Returns:
+        完整的 AI 报告文本
+    """
+    logger.info("流式生成 HTML 分析报告...")
+    
+    # 在后台线程中消费模型输出，使模型生成与图表转换并行
+    token_queue: queue.Queue = queue.Queue()
+    
+    def produce():
+        try:
+            for token in ai_tokens:
+                token_queue.put(token)
+        except Exception as e:
+            token_queue.put(e)
+        finally:
+            token_queue.put(_STREAM_END)
+    
+    threading.Thread(target=produce, daemon=True).start()
+    
+    chart_base64_list = get_chart_images(sandbox, analysis_results)
+    for fragment in iter_report_body(analysis_results, chart_base64_list):
+        out.write(fragment)
+    out.write(REPORT_AI_SECTION_HEAD)
+    out.flush()
+    logger.info("✅ 报告前四章已输出，等待 AI 分析...")
+    
+    parts = []
+    pending = ""
+    first = True
+    while True:
+        item = token_queue.get()
+        if item is _STREAM_END:
+            break
+        if isinstance(item, Exception):
+            raise item
+        parts.append(item)
+        pending += item
+        
+        # 每完成一个段落就输出
+        while '\n\n' in pending:
+            paragraph, pending = pending.split('\n\n', 1)
+            if paragraph.strip():
+                out.write(render_ai_paragraph(paragraph, first))
+                out.flush()
+                first = False
+    
+    if pending.strip():
+        out.write(render_ai_paragraph(pending, first))
+    out.write(REPORT_TAIL)
+    out.flush()
+    logger.info("✅ HTML 分析报告流式输出完成")
+    
+    return ''.join(parts)
 
 
 def download_charts_from_sandbox(sandbox: Sandbox, chart_paths: List[str], local_dir: str = "./output") -> List[str]:
@@ -893,27 +998,19 @@ def download_charts_from_sandbox(sandbox: Sandbox, chart_paths: List[str], local
     return local_paths
 
 
-def main():
-    """主函数：完整的 CSV 数据分析流程"""
-    
-    logger.info("=" * 60)
-    logger.info("开始 CSV 数据分析流程")
-    logger.info("=" * 60)
-    
-    # 1. 创建 Sandbox 实例
-    logger.info("\n[步骤 1/8] 创建 Sandbox 实例...")
-    sandbox = Sandbox.create()
-    logger.info(f"✅ Sandbox 创建成功，ID: {sandbox.sandbox_id}")
-    
-    try:
-        # 2. 安装依赖
-        logger.info("\n[步骤 2/8] 安装分析依赖库...")
-        install_analysis_dependencies(sandbox)
-        
-        # 3. 生成测试数据（班级期末考试成绩）
-        logger.info("\n[步骤 3/8] 生成测试数据...")
-        
-        test_data_prompt = """生成一个40人班级的期末考试成绩数据，包含以下字段：
+def generate_exam_scores_csv(model_id: str = "deepseek.v3-v1:0") -> str:
+    """
+    调用 Bedrock 生成测试数据（班级期末考试成绩）
+
+    只依赖 Bedrock，不需要 Sandbox，因此可以在创建 Sandbox 之前完成
+
+    Args:
+        model_id: Bedrock 模型 ID
+
+    Returns:
+        CSV 文本
+    """
+    test_data_prompt = """生成一个40人班级的期末考试成绩数据，包含以下字段：
 学号,姓名,语文,数学,英语,物理,化学,生物
 
 要求：
@@ -922,102 +1019,232 @@ def main():
 3. 各科成绩：30-100分之间的整数，分布合理
 4. 确保有优秀学生（90分以上）、中等学生（60-89分）、待提高学生（60分以下）
 5. 数据真实合理，符合实际成绩分布规律"""
-        
-        # 生成 CSV 数据（复用同样的 Bedrock 调用逻辑）
-        logger.info("调用 Bedrock 生成测试数据...")
-        region = os.getenv('AWS_REGION', 'eu-north-1')
-        bedrock_token = os.getenv('AWS_BEDROCK_TOKEN')
-        
-        if bedrock_token:
-            os.environ['AWS_SESSION_TOKEN'] = bedrock_token
-        
-        bedrock_client = boto3.client('bedrock-runtime', region_name=region)
-        
-        # 构建 CSV 生成的 prompt
-        csv_prompt = f"""你是一个数据生成助手。请严格按照以下要求生成数据：
+    
+    # 与 01 示例共用 CSV 生成服务（prompt 模板、请求参数和代码块标记清理）
+    logger.info("调用 Bedrock 生成测试数据...")
+    return get_csv_generation_service().generate(test_data_prompt, model_id)
 
-1. 输出格式：必须是纯CSV格式（逗号分隔值）
-2. 第一行：必须是列名（表头）
-3. 数据要求：真实、合理、多样化
-4. 不要包含任何解释性文字，只输出CSV内容
-5. 不要使用markdown代码块标记（如```csv）
 
-任务：{test_data_prompt}
+def build_data_summary(analysis_results: Dict) -> str:
+    """
+    生成发送给 AI 的数据摘要：各科统计和各科第一名
 
-请直接输出CSV数据："""
-        
-        request_body = {
-            "messages": [{"role": "user", "content": csv_prompt}],
-            "max_tokens": 4096,
-            "temperature": 0.7,
-            "top_p": 0.9
-        }
-        
-        response = bedrock_client.invoke_model(
-            modelId="deepseek.v3-v1:0",
-            body=json.dumps(request_body),
-            contentType='application/json',
-            accept='application/json'
-        )
-        
-        response_body = json.loads(response['body'].read())
-        csv_content = response_body['choices'][0]['message']['content']
-        csv_content = csv_content.replace('```csv', '').replace('```', '').strip()
-        csv_path = "/tmp/exam_scores.csv"
-        sandbox.files.write(csv_path, csv_content)
-        logger.info(f"✅ 测试数据已生成: {csv_path}")
-        
-        # 显示数据预览
-        preview = sandbox.commands.run(f"head -n 6 {csv_path}")
-        logger.info(f"\n数据预览:\n{preview.stdout}")
-        
-        # 4. 执行数据分析
-        logger.info("\n[步骤 4/8] 执行数据分析和图表生成...")
-        analysis_results = analyze_csv_in_sandbox(sandbox, csv_path)
-        
-        # 5. 生成数据摘要用于 AI 分析
-        logger.info("\n[步骤 5/8] 准备数据摘要...")
-        summary = f"""
+    Args:
+        analysis_results: 统计分析结果
+
+    Returns:
+        摘要文本
+    """
+    summary = f"""
 班级人数: {analysis_results['basic_info']['total_students']}人
 考试科目: {', '.join(analysis_results['basic_info']['subjects'])}
 
 各科统计:
 """
-        for subject, stats in analysis_results['basic_info']['statistics'].items():
-            summary += f"\n{subject}:\n"
-            for key, value in stats.items():
-                summary += f"  - {key}: {value}\n"
-        
-        summary += "\n优秀学生:\n"
-        for key, value in analysis_results['rankings'].items():
-            if '第一名' in key:
-                summary += f"  - {key}: {value}\n"
-        
-        # 6. 调用 Bedrock 生成 AI 分析报告
-        logger.info("\n[步骤 6/8] 调用 AI 生成分析报告...")
-        ai_report = call_bedrock_for_analysis(summary)
-        
-        # 7. 生成完整 HTML 报告
-        logger.info("\n[步骤 7/8] 生成完整 HTML 分析报告...")
-        report_path = generate_analysis_report(sandbox, analysis_results, ai_report)
-        
-        # 8. 下载 HTML 报告到本地
-        logger.info("\n[步骤 8/8] 下载 HTML 报告到本地...")
-        report_content = sandbox.files.read(report_path)
-        
-        # 创建本地输出目录
-        local_output_dir = "./output"
-        os.makedirs(local_output_dir, exist_ok=True)
-        
-        # 保存 HTML 文件到本地
-        local_report_path = os.path.join(local_output_dir, "analysis_report.html")
-        with open(local_report_path, 'w', encoding='utf-8') as f:
-            f.write(report_content)
-        
-        logger.info(f"✅ HTML 报告已保存到本地: {local_report_path}")
-        
-        # 获取绝对路径
-        abs_report_path = os.path.abspath(local_report_path)
+    for subject, stats in analysis_results['basic_info']['statistics'].items():
+        summary += f"\n{subject}:\n"
+        for key, value in stats.items():
+            summary += f"  - {key}: {value}\n"
+    
+    summary += "\n优秀学生:\n"
+    for key, value in analysis_results['rankings'].items():
+        if '第一名' in key:
+            summary += f"  - {key}: {value}\n"
+    return summary
+
+
+def analysis_cache_key(csv_content: str, chart_format: str, dpi: int, chunksize: int) -> str:
+    """
+    分析结果的缓存键：数据内容、分析脚本版本，以及影响输出的图表选项
+
+    上传格式和是否并发渲染不影响结果，不计入缓存键
+    """
+    with open(ANALYSIS_SCRIPT_PATH, 'rb') as f:
+        script = f.read()
+    options = {"chart_format": chart_format, "dpi": dpi, "chunked": chunksize > 0}
+    return make_cache_key(csv_content.encode('utf-8'), script, options)
+
+
+def main(
+    pool: Optional[SandboxPool] = None,
+    pool_timeout: float = 300.0,
+    stream_report: bool = False,
+    embed_charts: bool = False,
+    chart_format: str = "png",
+    dpi: int = 100,
+    parallel_charts: bool = False,
+    chunksize: int = 0,
+    upload_format: str = "csv",
+    cache: Optional[AnalysisResultCache] = None,
+    csv_content: Optional[str] = None,
+    report_destination: str = "both",
+):
+    """
+    主函数：完整的 CSV 数据分析流程
+
+    Args:
+        pool: 可选的预热 Sandbox 池（见 create_analysis_pool），
+              传入时直接借出已安装依赖的 Sandbox，跳过安装依赖步骤
+        pool_timeout: 从预热池借出 Sandbox 的最长等待时间（秒）
+        stream_report: 流式调用 AI 报告，并与图表转换、HTML 输出重叠进行
+        embed_charts: 图表在分析脚本中渲染到内存并随结果返回，报告阶段不再读取图表文件
+        chart_format: 图表格式，png / webp / svg
+        dpi: 图表分辨率
+        parallel_charts: 在 Sandbox 中并发渲染图表
+        chunksize: 大于 0 时在 Sandbox 中分块读取 CSV
+        upload_format: 测试数据的上传格式 csv / parquet / arrow；列式格式在主机上转换，
+                       Sandbox 中免去 CSV 解析（使用 pool 时需以 with_pyarrow=True 创建）
+        cache: 可选的分析结果缓存（见 result_cache.AnalysisResultCache），
+               命中时完全跳过 Sandbox 的创建、安装依赖、上传和分析
+        csv_content: 要分析的 CSV 文本，为 None 时调用 Bedrock 生成测试数据
+        report_destination: HTML 报告的输出位置 local / sandbox / both
+    """
+    
+    logger.info("=" * 60)
+    logger.info("开始 CSV 数据分析流程")
+    logger.info("=" * 60)
+    
+    # 各步骤按依赖关系执行：输入就绪即开始，互不依赖的步骤同时进行
+    # （例如创建 Sandbox、安装依赖与 Bedrock 生成测试数据重叠，图表导出与 AI 报告重叠）
+    graph = TaskGraph()
+    
+    # 1. 准备测试数据（只依赖 Bedrock）
+    def prepare_data():
+        logger.info("\n[步骤 1/9] 生成测试数据...")
+        if csv_content is not None:
+            logger.info("✅ 使用传入的 CSV 数据")
+            return csv_content
+        data = generate_exam_scores_csv()
+        logger.info("✅ 测试数据已生成")
+        return data
+    
+    # 查询分析结果缓存（需要数据内容），返回 (缓存键, 缓存的分析结果)
+    def lookup_cache(data):
+        if cache is None:
+            return None, None
+        cache_key = analysis_cache_key(data, chart_format, dpi, chunksize)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"✅ 命中分析结果缓存 {cache_key[:12]}，跳过 Sandbox 创建和数据分析")
+        return cache_key, cached
+    
+    # 2. 创建 Sandbox：不启用缓存时与生成测试数据同时开始；启用缓存时等查询结果，命中则不创建
+    def provision(lookup=(None, None)):
+        if lookup[1] is not None:
+            return None
+        logger.info("\n[步骤 2/9] 创建 Sandbox 实例...")
+        if pool is not None:
+            sandbox = pool.checkout(timeout=pool_timeout)
+            logger.info(f"✅ 从预热池借出 Sandbox，ID: {sandbox.sandbox_id}")
+        else:
+            sandbox = Sandbox.create()
+            logger.info(f"✅ Sandbox 创建成功，ID: {sandbox.sandbox_id}")
+        return sandbox
+    
+    # 3. 安装依赖
+    def install_deps(sandbox):
+        if sandbox is None:
+            return
+        logger.info("\n[步骤 3/9] 安装分析依赖库...")
+        if pool is not None:
+            logger.info("✅ 预热 Sandbox 已安装依赖，跳过")
+        else:
+            install_analysis_dependencies(sandbox, with_pyarrow=upload_format != "csv")
+    
+    # 4. 上传数据（只需要 Sandbox，可以与安装依赖同时进行）
+    def upload_data(sandbox, data):
+        if sandbox is None:
+            return None
+        logger.info("\n[步骤 4/9] 上传数据...")
+        csv_path, _ = upload_table(sandbox, data, "/tmp/exam_scores", upload_format)
+        logger.info(f"✅ 测试数据已上传: {csv_path}")
+        return csv_path
+    
+    # 一次 Sandbox 往返获取数据预览、行数和列画像（与数据分析同时进行）
+    def inspect_data(sandbox, data, upload, install):
+        if sandbox is None:
+            return
+        dataset = inspect_dataset(sandbox, upload)
+        if dataset["rows"] is not None:
+            logger.info(f"\n数据预览（共 {dataset['rows']} 行，{format_size(dataset['size_bytes'])}）:\n"
+                        f"{format_preview(dataset)}")
+            for column in dataset["columns"]:
+                logger.info(f"  {format_column_profile(column)}")
+        else:
+            # 列式文件且 Sandbox 中没有 pyarrow 时，使用上传前的 CSV 文本
+            logger.info(f"\n数据预览:\n" + "\n".join(data.splitlines()[:6]))
+    
+    # 5. 执行数据分析（缓存命中时直接使用缓存的结果）
+    def run_analysis(lookup, sandbox, upload, install):
+        cache_key, cached = lookup
+        if cached is not None:
+            return cached
+        logger.info("\n[步骤 5/9] 执行数据分析和图表生成...")
+        # 缓存需要图表字节，启用缓存时图表总是随结果内嵌返回
+        results = analyze_csv_in_sandbox(
+            sandbox, upload, embed_charts=embed_charts or cache is not None,
+            chart_format=chart_format, dpi=dpi, parallel_charts=parallel_charts,
+            chunksize=chunksize, data_format=upload_format,
+        )
+        if cache is not None:
+            cache.put(cache_key, results)
+        return results
+    
+    # 6. 生成数据摘要用于 AI 分析
+    def summarize(analysis):
+        logger.info("\n[步骤 6/9] 准备数据摘要...")
+        return build_data_summary(analysis)
+    
+    # 报告只写一次：直接写到本地 output 目录和 / 或 Sandbox；缓存命中时没有 Sandbox，只写本地
+    def report_sink(sandbox) -> ArtifactSink:
+        destination = report_destination if sandbox is not None else "local"
+        return ArtifactSink(destination, local_dir="./output", sandbox=sandbox)
+    
+    graph.add("data", prepare_data, label="生成测试数据")
+    graph.add("lookup", lookup_cache, deps=("data",), label="查询分析缓存")
+    graph.add("sandbox", provision, deps=("lookup",) if cache is not None else (), label="创建 Sandbox")
+    graph.add("install", install_deps, deps=("sandbox",), label="安装依赖")
+    graph.add("upload", upload_data, deps=("sandbox", "data"), label="上传数据")
+    graph.add("inspect", inspect_data, deps=("sandbox", "data", "upload", "install"), label="检查数据集")
+    graph.add("analysis", run_analysis, deps=("lookup", "sandbox", "upload", "install"), label="数据分析")
+    graph.add("summary", summarize, deps=("analysis",), label="数据摘要")
+    
+    if stream_report:
+        # 7-9. 流式调用 AI，同时转换图表并逐段写出 HTML 报告
+        def write_report(sandbox, analysis, summary):
+            sink = report_sink(sandbox)
+            logger.info(f"\n[步骤 7-9/9] 流式生成 AI 分析报告并同步输出 HTML（{sink.destination}）...")
+            with sink.open(REPORT_FILENAME) as out:
+                write_analysis_report_streaming(out, sandbox, analysis, stream_bedrock_analysis(summary))
+            return out.info
+        
+        graph.add("report", write_report, deps=("sandbox", "analysis", "summary"), label="流式 AI 报告")
+    else:
+        # 7. 调用 Bedrock 生成 AI 分析报告
+        def generate_ai_report(summary):
+            logger.info("\n[步骤 7/9] 调用 AI 生成分析报告...")
+            return call_bedrock_for_analysis(summary)
+        
+        # 8. 导出图表（与 AI 报告同时进行）
+        def prepare_charts(sandbox, analysis):
+            logger.info("\n[步骤 8/9] 准备报告图表...")
+            return get_chart_images(sandbox, analysis)
+        
+        # 9. 生成完整 HTML 报告并写入输出位置
+        def write_report(sandbox, analysis, ai_report, charts):
+            sink = report_sink(sandbox)
+            logger.info(f"\n[步骤 9/9] 生成完整 HTML 分析报告（{sink.destination}）...")
+            return generate_analysis_report(sandbox, analysis, ai_report, sink, chart_base64_list=charts)
+        
+        graph.add("ai_report", generate_ai_report, deps=("summary",), label="AI 分析报告")
+        graph.add("charts", prepare_charts, deps=("sandbox", "analysis"), label="导出图表")
+        graph.add("report", write_report, deps=("sandbox", "analysis", "ai_report", "charts"), label="写出 HTML 报告")
+    
+    succeeded = False
+    try:
+        results = graph.run()
+        analysis_results = results["analysis"]
+        report = results["report"]
         
         # 输出结果摘要
         logger.info(f"\n{'='*60}")
@@ -1026,29 +1253,38 @@ def main():
         logger.info(f"📊 统计维度: {len(analysis_results['basic_info']['statistics'])} 个")
         logger.info(f"🏆 排名类别: {len([k for k in analysis_results['rankings'].keys() if '第一名' in k])} 个")
         logger.info(f"📈 生成图表: {len(analysis_results['charts'])} 张（已嵌入 HTML）")
-        logger.info(f"📄 HTML 报告大小: {len(report_content):,} 字节")
+        logger.info(f"📄 HTML 报告大小: {report.size:,} 字节（sha256 {report.sha256[:12]}）")
         
         logger.info(f"\n🌐 HTML 报告位置:")
-        logger.info(f"   本地路径: {abs_report_path}")
-        logger.info(f"   Sandbox 路径: {report_path}")
-        
-        logger.info(f"\n💡 如何查看报告:")
-        logger.info(f"   方式 1: 在浏览器中打开文件")
-        logger.info(f"           open {abs_report_path}")
-        logger.info(f"   方式 2: 双击文件 {local_report_path}")
-        logger.info(f"   方式 3: 拖拽到浏览器窗口")
-        
-        # 尝试自动打开浏览器（macOS）
-        try:
-            import subprocess
-            subprocess.run(['open', abs_report_path], check=False)
-            logger.info(f"\n🎉 已自动在浏览器中打开报告！")
-        except Exception as e:
-            logger.info(f"\n💡 请手动打开报告文件")
+        if report.local_path:
+            logger.info(f"   本地路径: {os.path.abspath(report.local_path)}")
+        if report.sandbox_path:
+            logger.info(f"   Sandbox 路径: {report.sandbox_path}")
+        
+        if report.local_path:
+            abs_report_path = os.path.abspath(report.local_path)
+            logger.info(f"\n💡 如何查看报告:")
+            logger.info(f"   方式 1: 在浏览器中打开文件")
+            logger.info(f"           open {abs_report_path}")
+            logger.info(f"   方式 2: 双击文件 {report.local_path}")
+            logger.info(f"   方式 3: 拖拽到浏览器窗口")
+            
+            # 尝试自动打开浏览器（macOS）
+            try:
+                import subprocess
+                subprocess.run(['open', abs_report_path], check=False)
+                logger.info(f"\n🎉 已自动在浏览器中打开报告！")
+            except Exception as e:
+                logger.info(f"\n💡 请手动打开报告文件")
         
         logger.info(f"\n{'='*60}")
         logger.info("🎉 CSV 数据分析流程全部完成！")
+        if cache is not None:
+            logger.info(f"分析结果缓存: {cache.stats}")
+        if get_response_cache() is not None:
+            logger.info(f"Bedrock 响应缓存: {get_response_cache().summary()}")
         logger.info(f"{'='*60}\n")
+        succeeded = True
         
     except Exception as e:
         logger.error(f"\n❌ 执行失败: {str(e)}")
@@ -1057,12 +1293,57 @@ def main():
         raise
     
     finally:
-        # 保留 Sandbox 以便查看结果
-        logger.info("\n⚠️  保持 Sandbox 运行以便查看结果")
-        logger.info(f"Sandbox ID: {sandbox.sandbox_id}")
-        logger.info("使用完毕后请手动关闭: sandbox.kill()")
-        # sandbox.kill()
+        graph.log_timings()
+        sandbox = graph.results.get("sandbox")
+        if sandbox is None:
+            if "sandbox" in graph.results:
+                logger.info("\n♻️  分析结果来自缓存，本次没有使用 Sandbox")
+        elif pool is not None:
+            # 归还到预热池，失败的 Sandbox 由池销毁并补充
+            pool.checkin(sandbox, healthy=succeeded)
+            logger.info(f"\n♻️  Sandbox 已归还预热池: {sandbox.sandbox_id}")
+        else:
+            # 保留 Sandbox 以便查看结果
+            logger.info("\n⚠️  保持 Sandbox 运行以便查看结果")
+            logger.info(f"Sandbox ID: {sandbox.sandbox_id}")
+            logger.info("使用完毕后请手动关闭: sandbox.kill()")
+            # sandbox.kill()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="使用 Scalebox + AWS Bedrock 分析 CSV 数据并生成 HTML 报告")
+    parser.add_argument("--stream", action="store_true", help="流式生成 AI 报告，并与图表转换、HTML 输出重叠进行")
+    parser.add_argument("--embed-charts", action="store_true", help="图表渲染到内存并随分析结果返回")
+    parser.add_argument("--chart-format", default="png", choices=sorted(CHART_MIME_TYPES), help="图表格式")
+    parser.add_argument("--dpi", type=int, default=100, help="图表分辨率")
+    parser.add_argument("--parallel-charts", action="store_true", help="在 Sandbox 中并发渲染图表")
+    parser.add_argument("--chunksize", type=int, default=0, help="分块读取 CSV 的行数（0 表示一次性读取）")
+    parser.add_argument("--upload-format", default="csv", choices=list(UPLOAD_FORMATS),
+                        help="测试数据上传到 Sandbox 的格式（parquet / arrow 需要安装 pyarrow）")
+    parser.add_argument("--csv", help="分析本地 CSV 文件，而不是调用 Bedrock 生成测试数据")
+    parser.add_argument("--cache", action="store_true", help="启用分析结果缓存，命中时跳过 Sandbox")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="分析结果磁盘缓存目录")
+    parser.add_argument("--cache-max-mb", type=int, default=256, help="磁盘缓存大小上限（MB）")
+    parser.add_argument("--bedrock-cache", action="store_true",
+                        help="缓存 Bedrock 响应（测试数据生成和非流式 AI 报告），配置见 BEDROCK_CACHE_* 环境变量")
+    parser.add_argument("--report-dest", default="both", choices=ARTIFACT_DESTINATIONS,
+                        help="HTML 报告的输出位置：本地 ./output、Sandbox /tmp 或两者")
+    args = parser.parse_args()
+    if args.bedrock_cache:
+        install_response_cache(BedrockResponseCache.from_env())
+    csv_content = None
+    if args.csv:
+        with open(args.csv, 'r', encoding='utf-8') as f:
+            csv_content = f.read()
+    main(
+        stream_report=args.stream,
+        embed_charts=args.embed_charts,
+        chart_format=args.chart_format,
+        dpi=args.dpi,
+        parallel_charts=args.parallel_charts,
+        chunksize=args.chunksize,
+        upload_format=args.upload_format,
+        cache=AnalysisResultCache(args.cache_dir, disk_max_bytes=args.cache_max_mb * 1024 * 1024) if args.cache else None,
+        csv_content=csv_content,
+        report_destination=args.report_dest,
+    )
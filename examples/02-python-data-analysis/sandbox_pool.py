@@ -0,0 +1,317 @@
+"""
+预热 Sandbox 池
+
+维护 N 个已经安装好分析依赖的 Sandbox，通过 checkout / checkin 借出和归还，
+避免每次分析都承担冷启动和 pip install 的开销。
+
+借出前会做健康检查，超过最大存活时间或最大复用次数的 Sandbox 会被销毁并在后台补充。
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# 健康检查：确认 Sandbox 仍然存活且分析依赖可以导入
+HEALTH_CHECK_COMMAND = "python -c 'import pandas, matplotlib, numpy'"
+
+
+@dataclass
+class _PooledSandbox:
+    """池中的一个 Sandbox 及其使用记录"""
+    sandbox: Any
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+
+
+def default_health_check(sandbox: Any) -> bool:
+    """
+    默认健康检查：在 Sandbox 中导入分析依赖
+
+    Args:
+        sandbox: Sandbox 实例
+
+    Returns:
+        Sandbox 是否可用
+    """
+    try:
+        result = sandbox.commands.run(HEALTH_CHECK_COMMAND, timeout=30)
+        return result.exit_code == 0
+    except Exception as e:
+        logger.warning(f"Sandbox 健康检查失败: {e}")
+        return False
+
+
+class SandboxPool:
+    """
+    预热 Sandbox 池
+
+    用法：
+        pool = SandboxPool(Sandbox.create, install_analysis_dependencies, size=3)
+        with pool.lease() as sandbox:
+            analyze_csv_in_sandbox(sandbox, csv_path)
+        pool.close()
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        warmup: Optional[Callable[[Any], None]] = None,
+        size: int = 2,
+        max_age: float = 240.0,
+        max_uses: int = 20,
+        health_check: Optional[Callable[[Any], bool]] = default_health_check,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+    ):
+        """
+        Args:
+            factory: 创建 Sandbox 的函数，例如 Sandbox.create
+            warmup: 对新 Sandbox 执行的预热函数，例如 install_analysis_dependencies
+            size: 池中保持的预热 Sandbox 数量
+            max_age: Sandbox 最大存活时间（秒），应小于 Sandbox 自身的超时时间
+            max_uses: 单个 Sandbox 最大复用次数
+            health_check: 借出前的健康检查函数，为 None 时跳过检查
+            max_attempts: 创建或预热失败时的最大尝试次数
+            retry_delay: 首次重试前的等待时间（秒），之后每次翻倍
+        """
+        if size < 1:
+            raise ValueError("size 必须大于 0")
+
+        self.factory = factory
+        self.warmup = warmup
+        self.size = size
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.health_check = health_check
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+
+        self._idle: List[_PooledSandbox] = []
+        self._leased: Dict[int, _PooledSandbox] = {}
+        self._pending = 0
+        self._checking = 0
+        self._closed = False
+        self._last_error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+        self.stats = {"created": 0, "reused": 0, "retired": 0, "unhealthy": 0, "failed": 0}
+
+    # ---------- 生命周期 ----------
+
+    def start(self, wait: bool = True) -> "SandboxPool":
+        """
+        启动池并预热 Sandbox
+
+        Args:
+            wait: 是否等待所有 Sandbox 预热完成
+
+        Returns:
+            池本身，便于链式调用
+        """
+        logger.info(f"预热 Sandbox 池，目标数量: {self.size}")
+        self._refill()
+        if wait:
+            with self._cond:
+                while self._pending > 0 and not self._closed:
+                    self._cond.wait()
+        return self
+
+    def close(self) -> None:
+        """关闭池并销毁所有空闲的 Sandbox（已借出的在归还时销毁）"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+
+        for entry in idle:
+            self._destroy(entry)
+        logger.info("Sandbox 池已关闭")
+
+    def __enter__(self) -> "SandboxPool":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------- 借出 / 归还 ----------
+
+    def checkout(self, timeout: Optional[float] = None) -> Any:
+        """
+        从池中借出一个健康的预热 Sandbox
+
+        Args:
+            timeout: 等待空闲 Sandbox 的最长时间（秒），None 表示一直等待
+
+        Returns:
+            Sandbox 实例
+
+        Raises:
+            RuntimeError: 池已关闭，或池中没有 Sandbox 且所有补充都已失败
+            TimeoutError: 超过 timeout 仍没有空闲 Sandbox
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                while not self._idle:
+                    if self._closed:
+                        raise RuntimeError("Sandbox 池已关闭")
+                    # 没有借出、检查和预热中的 Sandbox 时，不会再有 Sandbox 进入空闲列表
+                    if not self._pending and not self._leased and not self._checking:
+                        raise RuntimeError(f"Sandbox 池中没有可用的 Sandbox，补充失败: {self._last_error}")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("等待空闲 Sandbox 超时")
+                    self._cond.wait(remaining)
+                entry = self._idle.pop()
+                self._checking += 1
+
+            if self._expired(entry):
+                self._retire(entry, checking=True)
+                continue
+
+            if self.health_check is not None and not self.health_check(entry.sandbox):
+                with self._cond:
+                    self.stats["unhealthy"] += 1
+                self._retire(entry, checking=True)
+                continue
+
+            with self._cond:
+                self._checking -= 1
+                entry.uses += 1
+                if entry.uses > 1:
+                    self.stats["reused"] += 1
+                self._leased[id(entry.sandbox)] = entry
+            return entry.sandbox
+
+    def checkin(self, sandbox: Any, healthy: bool = True) -> None:
+        """
+        归还 Sandbox
+
+        Args:
+            sandbox: 通过 checkout 借出的 Sandbox
+            healthy: 使用过程中是否正常，False 时直接销毁
+        """
+        with self._cond:
+            entry = self._leased.pop(id(sandbox), None)
+            if entry is None:
+                raise ValueError("该 Sandbox 不是从此池借出的")
+            keep = healthy and not self._closed and not self._expired(entry)
+            if keep:
+                self._idle.append(entry)
+                self._cond.notify()
+
+        if not keep:
+            self._retire(entry)
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        以上下文管理器的方式借出 Sandbox，出现异常时不再放回池中
+
+        Args:
+            timeout: 等待空闲 Sandbox 的最长时间（秒）
+        """
+        sandbox = self.checkout(timeout)
+        healthy = False
+        try:
+            yield sandbox
+            healthy = True
+        finally:
+            self.checkin(sandbox, healthy=healthy)
+
+    # ---------- 内部实现 ----------
+
+    def _expired(self, entry: _PooledSandbox) -> bool:
+        return (time.monotonic() - entry.created_at > self.max_age
+                or entry.uses >= self.max_uses)
+
+    def _retire(self, entry: _PooledSandbox, checking: bool = False) -> None:
+        """
+        销毁一个 Sandbox 并补充新的
+
+        Args:
+            entry: 要销毁的 Sandbox
+            checking: entry 是 checkout 中正在检查的 Sandbox；检查计数与补充在同一把锁内更新，
+                      等待中的 checkout 不会看到池暂时为空
+        """
+        with self._cond:
+            self.stats["retired"] += 1
+            if checking:
+                self._checking -= 1
+            missing = self._reserve_locked()
+            self._cond.notify_all()
+        self._start_provisions(missing)
+        self._destroy(entry)
+
+    def _destroy(self, entry: _PooledSandbox) -> None:
+        try:
+            entry.sandbox.kill()
+        except Exception as e:
+            logger.warning(f"关闭 Sandbox 失败: {e}")
+
+    def _refill(self) -> None:
+        """在后台补充 Sandbox，直到池中（含借出、检查中和预热中）达到目标数量"""
+        with self._cond:
+            missing = self._reserve_locked()
+        self._start_provisions(missing)
+
+    def _reserve_locked(self) -> int:
+        """计算需要补充的数量并计入 _pending（调用方持有锁）"""
+        if self._closed:
+            return 0
+        missing = self.size - len(self._idle) - len(self._leased) - self._checking - self._pending
+        missing = max(missing, 0)
+        self._pending += missing
+        return missing
+
+    def _start_provisions(self, count: int) -> None:
+        for _ in range(count):
+            threading.Thread(target=self._provision, daemon=True).start()
+
+    def _provision(self) -> None:
+        """创建并预热一个 Sandbox，失败时按退避间隔重试"""
+        entry = None
+        delay = self.retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            sandbox = None
+            try:
+                sandbox = self.factory()
+                if self.warmup is not None:
+                    self.warmup(sandbox)
+                entry = _PooledSandbox(sandbox)
+                break
+            except Exception as e:
+                logger.error(f"预热 Sandbox 失败（第 {attempt}/{self.max_attempts} 次）: {e}")
+                with self._cond:
+                    self._last_error = e
+                # 创建成功但预热失败的 Sandbox 不会进入池中，需要立即销毁
+                if sandbox is not None:
+                    self._destroy(_PooledSandbox(sandbox))
+            if attempt == self.max_attempts:
+                break
+            with self._cond:
+                if self._closed or self._cond.wait_for(lambda: self._closed, timeout=delay):
+                    break
+            delay *= 2
+
+        with self._cond:
+            self._pending -= 1
+            closed = self._closed
+            if entry is not None:
+                self.stats["created"] += 1
+                if not closed:
+                    self._idle.append(entry)
+            else:
+                self.stats["failed"] += 1
+            self._cond.notify_all()
+
+        if entry is not None and closed:
+            self._destroy(entry)
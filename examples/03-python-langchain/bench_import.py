@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+入口模块导入耗时基准测试
+
+用 `python -X importtime` 在新进程中导入入口模块，输出进程总耗时、入口模块的累计导入
+耗时，以及最慢的若干个顶层依赖。指定 --baseline 时，从 git 中取出该版本的代码做同样
+的测量，用于对比延迟导入前后的差异：
+
+    python bench_import.py                                  # 03 的 run.py
+    python bench_import.py --baseline HEAD~1
+    python bench_import.py --dir ../../autogen-python --module scalebxo_autogen.main --baseline HEAD~1
+
+改造前 run.py 在导入时就加载 langchain_aws、boto3 和 Scalebox SDK；autogen 的 main.py
+在导入时创建 Sandbox（网络请求）并读取 OAI_CONFIG_LIST。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """解析 -X importtime 输出，返回 (模块, 自身微秒, 累计微秒, 缩进层级) 列表"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def direct_imports(entries: List[Tuple[str, int, int, int]], module: str) -> List[Tuple[int, str]]:
+    """
+    入口模块直接导入的依赖及其累计微秒
+
+    importtime 先输出子模块再输出父模块：入口模块那一行之前、上一个顶层条目之后，
+    层级为 1 的条目就是它的直接依赖。入口模块导入失败时没有这一行，取最后一段。
+    """
+    end = next((i for i, (name, _, _, d) in enumerate(entries) if name == module and d == 0), len(entries))
+    start = max((i + 1 for i, (_, _, _, d) in enumerate(entries[:end]) if d == 0), default=0)
+    return [(c, name) for name, _, c, d in entries[start:end] if d == 1]
+
+
+def measure(directory: str, module: str, repeat: int) -> Dict:
+    """在 directory 中导入 module，取最快一次的结果"""
+    best: Optional[Dict] = None
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [directory, os.environ.get("PYTHONPATH")])))
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=directory, env=env, capture_output=True, text=True,
+        )
+        seconds = time.perf_counter() - start
+        entries = parse_importtime(proc.stderr)
+        result = {
+            "seconds": seconds,
+            "ok": proc.returncode == 0,
+            "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else "",
+            "module_us": next((c for name, _, c, d in entries if name == module and d == 0), 0),
+            "top": sorted(direct_imports(entries, module), reverse=True),
+        }
+        if best is None or seconds < best["seconds"]:
+            best = result
+    return best
+
+
+def report(label: str, result: Dict, top: int) -> None:
+    status = "" if result["ok"] else f"（导入失败: {result['error']}）"
+    print(f"{label}: 进程 {result['seconds'] * 1000:.0f}ms，{result['module_us'] / 1000:.0f}ms 导入入口模块{status}")
+    for cumulative, name in result["top"][:top]:
+        print(f"    {cumulative / 1000:>8.1f}ms  {name}")
+
+
+def checkout(rev: str, directory: str, target: str) -> str:
+    """用 git archive 把 rev 版本中 directory 所在的顶层目录解压到 target，返回对应目录"""
+    root = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], cwd=directory, capture_output=True, text=True, check=True
+    ).stdout.strip()
+    relative = os.path.relpath(directory, root)
+    top_level = relative.split(os.sep)[0]
+    archive = os.path.join(target, "tree.tar")
+    subprocess.run(["git", "archive", "-o", archive, rev, top_level], cwd=root, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, relative)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="入口模块导入耗时基准测试")
+    parser.add_argument("--dir", default=HERE, help="入口模块所在目录（默认 03-python-langchain）")
+    parser.add_argument("--module", default="run", help="入口模块名")
+    parser.add_argument("--baseline", help="对比的 git 版本，例如 HEAD~1")
+    parser.add_argument("--repeat", type=int, default=5, help="每项取最快的一次")
+    parser.add_argument("--top", type=int, default=8, help="列出最慢的顶层依赖数量")
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.dir)
+    current = measure(directory, args.module, args.repeat)
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as target:
+            baseline = measure(checkout(args.baseline, directory, target), args.module, args.repeat)
+        report(f"{args.baseline}", baseline, args.top)
+        print()
+    report("当前", current, args.top)
+
+    if args.baseline and baseline["ok"] and current["ok"]:
+        print(f"\n进程启动耗时: {baseline['seconds'] * 1000:.0f}ms -> {current['seconds'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+run_code 的执行方式
+
+原来每次 run_code 都把代码写到固定的 /tmp/analysis_script.py 再启动新的 python 进程：
+每次调用都要重新导入 pandas / matplotlib（数秒），调用之间无法保留变量，两个调用
+同时写同一个路径还会互相覆盖。
+
+CodeExecutor 默认使用 SDK 代码解释器的 run_code（见 00-python-basic-prepare），
+代码在 Sandbox 中同一个 Python 内核里执行：导入的模块和加载的 DataFrame 在调用之间保留。
+Sandbox 不支持 run_code 或内核无法启动时回退为脚本模式，每次调用使用唯一的脚本路径。
+
+warmup() 在内核中预先导入常用库，可以在后台执行，与第一次 LLM 调用重叠；它同时确认内核
+可用，预热失败时改用脚本模式。已经发送到内核的代码出错（包括超时）时直接报告给调用方，
+不会在脚本模式中再执行一遍，避免副作用重复发生。
+"""
+
+import logging
+import shlex
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+EXECUTION_MODES = ("auto", "kernel", "script")
+
+DEFAULT_TIMEOUT = 60
+
+# SDK 不支持 run_code 或其参数时抛出的异常：代码没有发送到内核，可以改用脚本模式执行
+KERNEL_UNSUPPORTED_ERRORS = (AttributeError, NotImplementedError, TypeError)
+
+# 回退为脚本模式后，第一次执行的输出前附加的说明（系统提示可能已经告诉模型变量会保留）
+FALLBACK_NOTICE = "注意：Python 内核不可用，run_code 已改为每次在新进程中执行，之前定义的变量不再保留。"
+
+# 预热时在内核中执行的代码：导入常用库，图表使用非交互后端
+DEFAULT_WARMUP_CODE = """
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+"""
+
+
+def _join_output(lines: Any) -> str:
+    """Execution.logs.stdout / stderr 可能是字符串列表或字符串"""
+    if not lines:
+        return ""
+    return lines if isinstance(lines, str) else "".join(lines)
+
+
+class CodeExecutor:
+    """
+    在 Sandbox 中执行 Python 代码
+
+    用法：
+        executor = CodeExecutor(sandbox)
+        executor.start_warmup()
+        output = executor.run("df = pd.read_csv('/tmp/grades.csv')")
+        output = executor.run("print(df.describe())")     # 内核模式下 df 仍然存在
+    """
+
+    def __init__(
+        self,
+        sandbox: Any,
+        mode: str = "auto",
+        timeout: int = DEFAULT_TIMEOUT,
+        warmup_code: Optional[str] = DEFAULT_WARMUP_CODE,
+    ):
+        """
+        Args:
+            sandbox: Sandbox 实例（代码解释器版本才支持内核模式）
+            mode: auto（优先内核，不支持或无法启动时回退脚本）/ kernel / script
+            timeout: 单次执行超时（秒）
+            warmup_code: warmup() 默认执行的代码，None 表示不预热
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"不支持的执行方式: {mode}，可选: {', '.join(EXECUTION_MODES)}")
+        if mode == "kernel" and not hasattr(sandbox, "run_code"):
+            raise ValueError("当前 Sandbox 不支持 run_code，无法使用内核模式")
+        self.sandbox = sandbox
+        self.mode = mode
+        self.timeout = timeout
+        self.warmup_code = warmup_code
+        self._use_kernel = mode != "script" and hasattr(sandbox, "run_code")
+        # 同一个内核同时只执行一段代码
+        self._lock = threading.Lock()
+        self._warmup_executor: Optional[ThreadPoolExecutor] = None
+        self._warmup_future: Optional[Future] = None
+        self._fallback_notice = False
+
+    @property
+    def stateful(self) -> bool:
+        """调用之间是否保留变量"""
+        return self._use_kernel
+
+    def run(self, code: str) -> str:
+        """
+        执行一段 Python 代码
+
+        Args:
+            code: Python 代码字符串
+
+        Returns:
+            与原来的工具输出格式一致："执行结果:" + 输出 + "退出码: <退出码>"
+        """
+        if self._warmup_future is not None:
+            # 等后台预热完成，之后的代码可以直接使用预热导入的模块
+            self._warmup_future.result()
+        output = self._execute(code)
+        if self._fallback_notice:
+            self._fallback_notice = False
+            output = f"{FALLBACK_NOTICE}\n{output}"
+        return output
+
+    def warmup(self, code: Optional[str] = None) -> None:
+        """在内核中执行预热代码（脚本模式下每次都是新进程，预热没有意义），内核无法启动时回退"""
+        code = code or self.warmup_code
+        if not code or not self._use_kernel:
+            return
+        logger.info("🔥 预热 Python 内核...")
+        with self._lock:
+            try:
+                output = self._run_in_kernel(code)
+            except Exception as e:
+                if self.mode == "kernel":
+                    raise
+                # 预热代码只导入模块，内核启动失败时直接改用脚本模式，不需要重新执行
+                self._fall_back(e)
+                return
+        if output.endswith("退出码: 0"):
+            logger.info("✅ 内核预热完成")
+        else:
+            logger.warning(f"⚠️ 内核预热失败: {output}")
+
+    def start_warmup(self, code: Optional[str] = None) -> Future:
+        """在后台线程中预热，之后的 run() 会等预热完成再执行"""
+        if self._warmup_executor is None:
+            self._warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kernel-warmup")
+        self._warmup_future = self._warmup_executor.submit(self._safe_warmup, code)
+        return self._warmup_future
+
+    def close(self) -> None:
+        if self._warmup_executor is not None:
+            self._warmup_executor.shutdown(wait=False)
+
+    # ==================== 内部实现 ====================
+
+    def _safe_warmup(self, code: Optional[str]) -> None:
+        # 预热失败不影响之后的执行
+        try:
+            self.warmup(code)
+        except Exception as e:
+            logger.warning(f"⚠️ 内核预热失败: {e}")
+
+    def _execute(self, code: str) -> str:
+        with self._lock:
+            if self._use_kernel:
+                try:
+                    return self._run_in_kernel(code)
+                except KERNEL_UNSUPPORTED_ERRORS as e:
+                    # SDK 不支持内核调用，代码没有执行，可以改用脚本模式执行同一段代码；
+                    # 其他异常（超时、网络错误）时代码可能已经在内核中执行，直接抛给调用方
+                    if self.mode == "kernel":
+                        raise
+                    self._fall_back(e)
+            return self._run_script(code)
+
+    def _fall_back(self, error: Exception) -> None:
+        logger.warning(f"⚠️ 内核不可用，回退为脚本模式（不再保留变量）: {error}")
+        self._use_kernel = False
+        self._fallback_notice = True
+
+    def _run_in_kernel(self, code: str) -> str:
+        logger.info("执行 Python 代码（内核模式）...")
+        execution = self.sandbox.run_code(code, language="python", timeout=self.timeout)
+
+        parts = [_join_output(execution.logs.stdout)]
+        # 最后一个表达式的值（例如 df.head()）以文本结果返回
+        parts += [r.text for r in getattr(execution, "results", None) or [] if getattr(r, "text", None)]
+        parts.append(_join_output(execution.logs.stderr))
+
+        error = getattr(execution, "error", None)
+        if error is not None:
+            parts.append(getattr(error, "traceback", None) or f"{error.name}: {error.value}")
+        exit_code = getattr(execution, "return_code", None) or 0
+        if error is not None and exit_code == 0:
+            exit_code = 1
+
+        output = "\n".join(part.rstrip("\n") for part in parts if part)
+        logger.info(f"代码执行完成，退出码: {exit_code}")
+        return f"执行结果:\n{output}\n\n退出码: {exit_code}"
+
+    def _run_script(self, code: str) -> str:
+        # 每次调用使用唯一路径，执行后删除
+        script_path = f"/tmp/run_code_{uuid.uuid4().hex}.py"
+        self.sandbox.files.write(script_path, code)
+
+        logger.info("执行 Python 代码（脚本模式）...")
+        quoted = shlex.quote(script_path)
+        result = self.sandbox.commands.run(
+            f"python {quoted}; status=$?; rm -f {quoted}; exit $status",
+            timeout=self.timeout,
+        )
+
+        output = result.stdout if result.stdout else result.stderr
+        logger.info(f"代码执行完成，退出码: {result.exit_code}")
+        return f"执行结果:\n{output}\n\n退出码: {result.exit_code}"
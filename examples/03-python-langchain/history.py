@@ -0,0 +1,182 @@
+"""
+对话历史管理
+
+智能体循环原来把每条 AI 消息和完整的工具输出（read_file 的整个文件、run_code 的
+全部 stdout）永久追加到 messages，提示词和 LLM 延迟随迭代次数不断增长。
+
+ConversationHistory 在发送给模型前压缩历史：
+- 固定保留系统消息和任务消息
+- 工具输出超过上限时保留开头和结尾，较早轮次的工具输出进一步压缩
+- 只保留最近若干轮工具调用（一轮 = 一条 AIMessage 及其 ToolMessage，成对保留），
+  超出 token 预算时继续丢弃最早的轮次
+- 每轮记录估算的上下文 token 数，以及模型返回的实际输入 token 数
+"""
+
+import logging
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+# 单条工具输出保留的字符数
+DEFAULT_MAX_TOOL_CHARS = 4000
+
+# 较早轮次（最近 recent_turns 轮之外）的工具输出保留的字符数
+DEFAULT_OLD_TOOL_CHARS = 600
+
+# 保留完整工具输出的最近轮数
+DEFAULT_RECENT_TURNS = 2
+
+# 最多保留的工具调用轮数
+DEFAULT_KEEP_TURNS = 8
+
+# 上下文 token 预算（估算值）
+DEFAULT_TOKEN_BUDGET = 24000
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：CJK 字符约 1 个 token，其他字符约 4 个一个 token"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """单条消息的估算 token 数（包括工具调用参数）"""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tokens = estimate_tokens(content) + 4
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(str(tool_call.get("args", ""))) + 8
+    return tokens
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """超过 limit 个字符时保留开头和结尾，中间用省略标记代替"""
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    return f"{text[:head]}\n...[已省略 {len(text) - limit} 个字符]...\n{text[-tail:]}"
+
+
+class ConversationHistory:
+    """
+    智能体的对话历史
+
+    用法：
+        history = ConversationHistory([SystemMessage(...), HumanMessage(task)])
+        response = llm_with_tools.invoke(history.messages())
+        history.append(response)
+        history.extend(tool_messages)
+    """
+
+    def __init__(
+        self,
+        pinned: Sequence[BaseMessage],
+        max_tool_chars: int = DEFAULT_MAX_TOOL_CHARS,
+        old_tool_chars: int = DEFAULT_OLD_TOOL_CHARS,
+        recent_turns: int = DEFAULT_RECENT_TURNS,
+        keep_turns: int = DEFAULT_KEEP_TURNS,
+        token_budget: Optional[int] = DEFAULT_TOKEN_BUDGET,
+    ):
+        """
+        Args:
+            pinned: 始终保留的消息，通常是系统消息和任务消息
+            max_tool_chars: 单条工具输出保留的字符数
+            old_tool_chars: 较早轮次的工具输出保留的字符数
+            recent_turns: 保留 max_tool_chars 长度工具输出的最近轮数
+            keep_turns: 最多保留的工具调用轮数
+            token_budget: 上下文 token 预算，None 表示不限制
+        """
+        self.pinned = list(pinned)
+        self.max_tool_chars = max_tool_chars
+        self.old_tool_chars = old_tool_chars
+        self.recent_turns = recent_turns
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.turns: List[List[BaseMessage]] = []
+        self.truncated_chars = 0
+        self.last_dropped_turns = 0
+        self.last_token_estimate = 0
+
+    def append(self, message: BaseMessage) -> None:
+        """追加一条消息：AIMessage 开始新的一轮，ToolMessage 归入当前轮"""
+        if isinstance(message, ToolMessage):
+            content = str(message.content)
+            if len(content) > self.max_tool_chars:
+                self.truncated_chars += len(content) - self.max_tool_chars
+                message = ToolMessage(
+                    content=truncate_text(content, self.max_tool_chars), tool_call_id=message.tool_call_id
+                )
+            if self.turns:
+                self.turns[-1].append(message)
+                return
+        self.turns.append([message])
+
+    def extend(self, messages: Sequence[BaseMessage]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def messages(self) -> List[BaseMessage]:
+        """
+        发送给模型的消息列表
+
+        Returns:
+            固定消息 + 压缩后的最近若干轮；丢弃了较早的轮次时在任务消息末尾注明
+        """
+        turns = self.turns[-self.keep_turns:] if self.keep_turns else list(self.turns)
+        turns = [
+            self._compact_turn(turn) if i < len(turns) - self.recent_turns else turn
+            for i, turn in enumerate(turns)
+        ]
+
+        pinned_tokens = sum(message_tokens(m) for m in self.pinned)
+        turn_tokens = [sum(message_tokens(m) for m in turn) for turn in turns]
+        if self.token_budget is not None:
+            # 超出预算时从最早的轮次开始丢弃，至少保留最近一轮
+            while len(turns) > 1 and pinned_tokens + sum(turn_tokens) > self.token_budget:
+                turns.pop(0)
+                turn_tokens.pop(0)
+
+        self.last_dropped_turns = len(self.turns) - len(turns)
+        self.last_token_estimate = pinned_tokens + sum(turn_tokens)
+        pinned = self._pinned_with_note(self.last_dropped_turns)
+        return pinned + [message for turn in turns for message in turn]
+
+    def log_context(self) -> None:
+        """输出最近一次 messages() 的上下文规模"""
+        logger.info(
+            f"📏 上下文: 约 {self.last_token_estimate} tokens，保留 {len(self.turns) - self.last_dropped_turns}"
+            f"/{len(self.turns)} 轮，累计截断工具输出 {self.truncated_chars} 字符"
+        )
+
+    @staticmethod
+    def log_usage(response: AIMessage) -> None:
+        """输出模型返回的实际 token 用量（模型提供 usage_metadata 时）"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            logger.info(f"📊 token 用量: 输入 {usage.get('input_tokens')}，输出 {usage.get('output_tokens')}")
+
+    # ==================== 内部实现 ====================
+
+    def _compact_turn(self, turn: List[BaseMessage]) -> List[BaseMessage]:
+        return [
+            ToolMessage(content=truncate_text(str(m.content), self.old_tool_chars), tool_call_id=m.tool_call_id)
+            if isinstance(m, ToolMessage) else m
+            for m in turn
+        ]
+
+    def _pinned_with_note(self, dropped: int) -> List[BaseMessage]:
+        if not dropped:
+            return list(self.pinned)
+        pinned = list(self.pinned)
+        for i in range(len(pinned) - 1, -1, -1):
+            if isinstance(pinned[i], HumanMessage):
+                pinned[i] = HumanMessage(
+                    content=f"{pinned[i].content}\n\n（为控制上下文长度，已省略较早的 {dropped} 轮工具调用记录，"
+                            f"需要时可重新读取文件或列出目录确认当前状态。）"
+                )
+                break
+        return pinned
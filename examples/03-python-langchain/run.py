@@ -8,15 +8,16 @@ LangChain + ChatBedrock + Scalebox 智能体示例
 
 from dotenv import load_dotenv
 import os
+import sys
 import logging
-from typing import Dict, Any, Optional, Callable
-from scalebox import Sandbox
+from functools import lru_cache
+from typing import Dict, Any, Optional, Callable, List
 
-# LangChain 导入
-from langchain_aws import ChatBedrock
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, ToolMessage
-from langchain_core.tools import tool
-from pydantic import BaseModel, Field
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from code_execution import CodeExecutor
+
+# Scalebox SDK、boto3 和 LangChain（langchain_aws、langchain_core）导入较慢，
+# 在第一次使用时才导入：导入本模块（例如测试或只查看帮助）时不加载这些依赖
 
 # 加载环境变量
 load_dotenv()
@@ -34,12 +35,23 @@ logger = logging.getLogger(__name__)
 class ScaleboxTools:
     """封装 Scalebox 工具"""
 
-    def __init__(self):
-        """初始化 Sandbox 实例"""
+    def __init__(self, execution_mode: str = "auto"):
+        """
+        初始化 Sandbox 实例
+
+        Args:
+            execution_mode: run_code 的执行方式，auto / kernel / script（见 code_execution.py）
+        """
+        from scalebox.code_interpreter import Sandbox
+
         logger.info("创建 Scalebox Sandbox...")
         self.sandbox = Sandbox.create()
         logger.info(f"✅ Sandbox 创建成功，ID: {self.sandbox.sandbox_id}")
 
+        # run_code 默认在持久的 Python 内核中执行；后台预热常用库，与第一次 LLM 调用重叠
+        self.executor = CodeExecutor(self.sandbox, mode=execution_mode)
+        self.executor.start_warmup()
+
         # 安装常用依赖
         # logger.info("安装 Python 依赖...")
         # result = self.sandbox.commands.run(
@@ -82,22 +94,7 @@ class ScaleboxTools:
             代码执行输出
         """
         try:
-            # 将代码写入临时文件
-            script_path = "/tmp/analysis_script.py"
-            self.sandbox.files.write(script_path, code)
-
-            # 执行代码
-            logger.info("执行 Python 代码...")
-            result = self.sandbox.commands.run(
-                f"python {script_path}",
-                timeout=60
-            )
-
-            output = result.stdout if result.stdout else result.stderr
-            logger.info(f"代码执行完成，退出码: {result.exit_code}")
-
-            return f"执行结果:\n{output}\n\n退出码: {result.exit_code}"
-
+            return self.executor.run(code)
         except Exception as e:
             error_msg = f"代码执行失败: {str(e)}"
             logger.error(error_msg)
@@ -144,13 +141,15 @@ class ScaleboxTools:
     def cleanup(self):
         """清理资源"""
         logger.info("清理 Sandbox 资源...")
+        self.executor.close()
         # Sandbox 会在程序退出时自动清理
 
 
-# ========== LangChain 工具定义（使用 @tool 装饰器）==========
+# ========== LangChain 工具定义（get_tools() 中用 tool() 包装）==========
 
-# 全局 Scalebox 实例（供工具函数使用）
+# 全局 Scalebox 实例和代码执行器（供工具函数使用）
 _sandbox_instance = None
+_code_executor = None
 
 def get_sandbox():
     """获取全局 Sandbox 实例"""
@@ -160,7 +159,13 @@ def get_sandbox():
     return _sandbox_instance
 
 
-@tool
+def get_code_executor() -> CodeExecutor:
+    """获取全局代码执行器"""
+    if _code_executor is None:
+        raise RuntimeError("代码执行器未初始化")
+    return _code_executor
+
+
 def write_file(path: str, content: str) -> str:
     """将内容写入沙盒文件系统
 
@@ -179,7 +184,6 @@ def write_file(path: str, content: str) -> str:
         return error_msg
 
 
-@tool
 def run_code(code: str) -> str:
     """在沙盒中执行 Python 代码进行数据分析
 
@@ -187,24 +191,13 @@ def run_code(code: str) -> str:
         code: Python 代码字符串，可使用 pandas, matplotlib, numpy
     """
     try:
-        sandbox = get_sandbox()
-        script_path = "/tmp/analysis_script.py"
-        sandbox.files.write(script_path, code)
-
-        logger.info("执行 Python 代码...")
-        result = sandbox.commands.run(f"python {script_path}", timeout=60)
-
-        output = result.stdout if result.stdout else result.stderr
-        logger.info(f"代码执行完成，退出码: {result.exit_code}")
-
-        return f"执行结果:\n{output}\n\n退出码: {result.exit_code}"
+        return get_code_executor().run(code)
     except Exception as e:
         error_msg = f"代码执行失败: {str(e)}"
         logger.error(error_msg)
         return error_msg
 
 
-@tool
 def read_file(path: str) -> str:
     """从沙盒读取文件内容
 
@@ -222,7 +215,6 @@ def read_file(path: str) -> str:
         return error_msg
 
 
-@tool
 def list_files(directory: str = "/tmp") -> str:
     """列出沙盒目录中的文件
 
@@ -240,14 +232,35 @@ def list_files(directory: str = "/tmp") -> str:
         return error_msg
 
 
+@lru_cache(maxsize=None)
+def get_tools() -> List[Any]:
+    """
+    将上面的函数包装为 LangChain 工具（与 @tool 装饰器等价）
+
+    第一次调用时才导入 langchain_core.tools，结果缓存复用
+    """
+    from langchain_core.tools import tool
+
+    return [tool(write_file), tool(run_code), tool(read_file), tool(list_files)]
+
+
+# 工具访问的路径 (读取, 写入)，用于确定同一轮中工具调用的执行顺序；
+# run_code 可能读写任意文件，不声明路径，按屏障处理
+TOOL_RESOURCES = {
+    "write_file": lambda args: ((), (args.get("path"),)),
+    "read_file": lambda args: ((args.get("path"),), ()),
+    "list_files": lambda args: ((args.get("directory", "/tmp"),), ()),
+}
+
+
 def run_langchain_agent(scalebox_tools: ScaleboxTools, user_task: str, max_iterations: int = 10):
     """
     使用 LangChain 的经典方式运行智能体
 
     核心概念：
-    1. 使用 @tool 装饰器定义工具
+    1. 使用 tool() 将函数包装为工具（get_tools）
     2. 使用 bind_tools() 将工具绑定到 LLM
-    3. 手动管理对话历史（messages list）
+    3. 手动管理对话历史（ConversationHistory 压缩后的 messages list）
     4. 循环处理：LLM 响应 → 工具调用 → 结果反馈 → 下一轮
 
     Args:
@@ -258,9 +271,17 @@ def run_langchain_agent(scalebox_tools: ScaleboxTools, user_task: str, max_itera
     Returns:
         最终结果
     """
+    from langchain_aws import ChatBedrock
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from common.bedrock_runtime import get_bedrock_runtime_client
+    from history import ConversationHistory
+    from tool_dispatch import ToolDispatcher
+
     # 设置全局 sandbox 实例
-    global _sandbox_instance
+    global _sandbox_instance, _code_executor
     _sandbox_instance = scalebox_tools.sandbox
+    _code_executor = scalebox_tools.executor
 
     # 1️⃣ 创建 LLM 实例
     region = os.getenv('AWS_REGION', 'us-east-1')
@@ -269,6 +290,7 @@ def run_langchain_agent(scalebox_tools: ScaleboxTools, user_task: str, max_itera
     logger.info(f"配置 ChatBedrock: region={region}, model={model_id}")
 
     llm = ChatBedrock(
+        client=get_bedrock_runtime_client(region),
         model_id=model_id,
         region_name=region,
         model_kwargs={
@@ -278,14 +300,22 @@ def run_langchain_agent(scalebox_tools: ScaleboxTools, user_task: str, max_itera
     )
 
     # 2️⃣ 定义工具列表
-    tools = [write_file, run_code, read_file, list_files]
+    tools = get_tools()
+    dispatcher = ToolDispatcher(tools, resources=TOOL_RESOURCES)
 
     # 3️⃣ 将工具绑定到 LLM（这是 LangChain 的核心机制）
     llm_with_tools = llm.bind_tools(tools)
     logger.info(f"✅ 已绑定 {len(tools)} 个工具到 LLM")
 
-    # 4️⃣ 初始化对话历史
-    messages = [
+    # 内核模式下告诉模型可以复用之前 run_code 中定义的变量。预热仍在后台进行时按内核模式提示，
+    # 预热失败回退为脚本模式时，第一次 run_code 的输出会附加说明（FALLBACK_NOTICE）纠正这一点
+    state_hint = (
+        "\nrun_code 在同一个 Python 内核中执行，之前定义的变量、导入的模块和加载的 DataFrame 会保留，不需要重复读取文件"
+        if scalebox_tools.executor.stateful else ""
+    )
+
+    # 4️⃣ 初始化对话历史（系统消息和任务消息固定保留，工具调用轮次按窗口和 token 预算压缩）
+    history = ConversationHistory([
         SystemMessage(content="""你是一个专业的数据分析助手，可以使用 Scalebox 沙盒环境执行 Python 代码。
 
 可用工具：
@@ -300,79 +330,51 @@ def run_langchain_agent(scalebox_tools: ScaleboxTools, user_task: str, max_itera
 3. 使用 list_files 确认文件生成
 4. 总结分析结果给用户
 
-注意：生成的图表保存到 /tmp/ 目录，Python 代码中可以使用 pandas, matplotlib, numpy"""),
+注意：生成的图表保存到 /tmp/ 目录，Python 代码中可以使用 pandas, matplotlib, numpy""" + state_hint),
         HumanMessage(content=user_task)
-    ]
-
-    # 5️⃣ 智能体循环（LangChain 实现方式）
-    for i in range(max_iterations):
-        logger.info(f"\n{'='*60}")
-        logger.info(f"🔄 Iteration {i+1}/{max_iterations}")
-        logger.info(f"{'='*60}")
-
-        # 调用 LLM（带工具绑定）
-        logger.info("📤 调用 LLM...")
-        response = llm_with_tools.invoke(messages)
-
-        # 将 AI 响应加入对话历史
-        messages.append(response)
-
-        logger.info(f"📥 收到响应: {type(response).__name__}")
-
-        # 检查是否有工具调用
-        if hasattr(response, 'tool_calls') and response.tool_calls:
-            logger.info(f"🔧 检测到 {len(response.tool_calls)} 个工具调用")
-
-            # 处理每个工具调用
-            for tool_call in response.tool_calls:
-                tool_name = tool_call['name']
-                tool_args = tool_call['args']
-                tool_call_id = tool_call['id']
-
-                logger.info(f"\n  🛠️  工具: {tool_name}")
-                logger.info(f"  📋 参数: {tool_args}")
-
-                # 执行工具（LangChain 会自动路由到对应的 @tool 函数）
-                tool_func = None
-                for t in tools:
-                    if t.name == tool_name:
-                        tool_func = t
-                        break
-
-                if tool_func:
-                    try:
-                        # 调用工具函数
-                        result = tool_func.invoke(tool_args)
-                        logger.info(f"  ✅ 结果: {result[:150]}..." if len(str(result)) > 150 else f"  ✅ 结果: {result}")
-
-                        # 将工具结果加入对话历史（这是关键！）
-                        messages.append(ToolMessage(
-                            content=str(result),
-                            tool_call_id=tool_call_id
-                        ))
-                    except Exception as e:
-                        error_msg = f"工具执行错误: {str(e)}"
-                        logger.error(f"  ❌ {error_msg}")
-                        messages.append(ToolMessage(
-                            content=error_msg,
-                            tool_call_id=tool_call_id
-                        ))
-                else:
-                    logger.error(f"  ❌ 未找到工具: {tool_name}")
-
-            # 继续下一轮循环，让 LLM 看到工具结果
-            continue
-
-        else:
-            # 没有工具调用，任务完成
-            logger.info("✅ 没有工具调用，任务完成")
-
-            # 提取最终文本
-            final_text = response.content if hasattr(response, 'content') else str(response)
-            return final_text
-
-    logger.warning(f"⚠️ 达到最大迭代次数 {max_iterations}")
-    return "任务未完成（达到最大迭代次数）"
+    ])
+
+    try:
+        # 5️⃣ 智能体循环（LangChain 实现方式）
+        for i in range(max_iterations):
+            logger.info(f"\n{'='*60}")
+            logger.info(f"🔄 Iteration {i+1}/{max_iterations}")
+            logger.info(f"{'='*60}")
+
+            # 调用 LLM（带工具绑定）
+            logger.info("📤 调用 LLM...")
+            messages = history.messages()
+            history.log_context()
+            response = llm_with_tools.invoke(messages)
+
+            # 将 AI 响应加入对话历史
+            history.append(response)
+
+            logger.info(f"📥 收到响应: {type(response).__name__}")
+            history.log_usage(response)
+
+            # 检查是否有工具调用
+            if hasattr(response, 'tool_calls') and response.tool_calls:
+                logger.info(f"🔧 检测到 {len(response.tool_calls)} 个工具调用")
+
+                # 并发执行互不依赖的调用，结果按原始顺序加入对话历史（这是关键！）
+                history.extend(dispatcher.dispatch(response.tool_calls))
+
+                # 继续下一轮循环，让 LLM 看到工具结果
+                continue
+
+            else:
+                # 没有工具调用，任务完成
+                logger.info("✅ 没有工具调用，任务完成")
+
+                # 提取最终文本
+                final_text = response.content if hasattr(response, 'content') else str(response)
+                return final_text
+
+        logger.warning(f"⚠️ 达到最大迭代次数 {max_iterations}")
+        return "任务未完成（达到最大迭代次数）"
+    finally:
+        dispatcher.close()
 
 
 def main():
@@ -0,0 +1,230 @@
+"""
+并发工具调用
+
+模型在一轮响应中返回多个 tool_calls 时，原来的循环逐个执行，并且每次都线性扫描
+tools 列表查找工具。这里按名称预先建立索引，用线程池并发执行互不依赖的调用，
+每个调用有独立的超时，结果按原始顺序生成 ToolMessage。
+
+顺序约束：每个工具声明它读写的路径（resources），同一轮中后面的调用如果与前面
+的调用访问了重叠的路径且其中之一是写入，就等前面的调用完成后再执行，例如
+write_file /tmp/a.csv 之后的 read_file /tmp/a.csv。没有声明路径的工具（例如 run_code，
+可能读写任意文件）作为屏障，与它前后的所有调用都串行。
+
+超时的调用不会被中断，它的线程和 Sandbox 命令仍在运行。在它结束之前，与它冲突的
+调用（包括之后几轮中的调用）不会执行，直接返回"依赖的调用超时"的错误。
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import ToolMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 120
+
+# 表示"任意路径"，用于屏障类工具
+ANY_PATH = "*"
+
+# 工具参数 -> (读取的路径, 写入的路径)
+ResourceFn = Callable[[Dict[str, Any]], Tuple[Iterable[str], Iterable[str]]]
+
+
+@dataclass
+class ToolCallResult:
+    """单个工具调用的执行结果"""
+    tool_call_id: str
+    name: str
+    content: str
+    seconds: float
+    ok: bool
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    """相同路径、通配符，或一方是另一方所在的目录"""
+    if a == ANY_PATH or b == ANY_PATH or a == b:
+        return True
+    a, b = a.rstrip("/"), b.rstrip("/")
+    return a == b or a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def _conflicts(first: Tuple[Set[str], Set[str]], second: Tuple[Set[str], Set[str]]) -> bool:
+    """两个调用是否必须按顺序执行：至少一方写入，且访问的路径重叠"""
+    reads_a, writes_a = first
+    reads_b, writes_b = second
+    return any(
+        _paths_overlap(x, y)
+        for xs, ys in ((writes_a, reads_b | writes_b), (writes_b, reads_a))
+        for x in xs
+        for y in ys
+    )
+
+
+class ToolDispatcher:
+    """
+    并发执行一轮中的工具调用
+
+    用法：
+        dispatcher = ToolDispatcher(tools, resources={"read_file": lambda a: ([a["path"]], [])})
+        messages.extend(dispatcher.dispatch(response.tool_calls))
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[Any],
+        resources: Optional[Dict[str, ResourceFn]] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Args:
+            tools: LangChain 工具列表（@tool 装饰的函数）
+            resources: 工具名 -> 根据参数返回 (读取路径, 写入路径) 的函数；未声明的工具作为屏障
+            max_workers: 同时执行的工具调用数
+            timeout: 单个调用的默认超时（秒），从开始执行时计时
+            timeouts: 按工具名覆盖超时
+        """
+        self.tools_by_name = {t.name: t for t in tools}
+        self.resources = resources or {}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-call")
+        # 已超时但仍在运行的调用：(future, 读写路径, 工具名)
+        self._stragglers: List[Tuple[Future, Tuple[Set[str], Set[str]], str]] = []
+
+    def close(self) -> None:
+        """关闭线程池（不等待已超时的调用）"""
+        self._executor.shutdown(wait=False)
+
+    def access(self, tool_call: Dict) -> Tuple[Set[str], Set[str]]:
+        """返回调用读写的路径集合，未声明的工具视为读写任意路径"""
+        resource_fn = self.resources.get(tool_call["name"])
+        if resource_fn is None:
+            return {ANY_PATH}, {ANY_PATH}
+        try:
+            reads, writes = resource_fn(tool_call.get("args") or {})
+        except Exception:
+            return {ANY_PATH}, {ANY_PATH}
+        return {p for p in reads if p}, {p for p in writes if p}
+
+    def dependencies(self, tool_calls: Sequence[Dict]) -> List[Set[int]]:
+        """每个调用必须等待的前序调用下标"""
+        accesses = [self.access(call) for call in tool_calls]
+        return [
+            {j for j in range(i) if _conflicts(accesses[j], accesses[i])}
+            for i in range(len(tool_calls))
+        ]
+
+    def dispatch(self, tool_calls: Sequence[Dict]) -> List[ToolMessage]:
+        """
+        执行一轮中的全部工具调用
+
+        Args:
+            tool_calls: AIMessage.tool_calls
+
+        Returns:
+            与 tool_calls 顺序一致的 ToolMessage 列表（失败、超时和未知工具也有对应消息）
+        """
+        results = self.run(tool_calls)
+        return [ToolMessage(content=r.content, tool_call_id=r.tool_call_id) for r in results]
+
+    def run(self, tool_calls: Sequence[Dict]) -> List[ToolCallResult]:
+        """执行工具调用并返回带耗时的结果，顺序与 tool_calls 一致"""
+        deps = self.dependencies(tool_calls)
+        accesses = [self.access(call) for call in tool_calls]
+        results: List[Optional[ToolCallResult]] = [None] * len(tool_calls)
+        running: Dict[Future, Tuple[int, float]] = {}
+        pending = list(range(len(tool_calls)))
+
+        while pending or running:
+            # 提交依赖已完成的调用（按原始顺序）
+            for i in list(pending):
+                if all(results[j] is not None for j in deps[i]):
+                    pending.remove(i)
+                    call = tool_calls[i]
+                    self._log_call(call)
+                    blocker = self._blocking_straggler(accesses[i])
+                    if blocker is not None:
+                        results[i] = ToolCallResult(
+                            call["id"], call["name"], f"未执行：依赖的工具调用 {blocker} 已超时且仍在运行", 0.0, False
+                        )
+                        self._log_result(results[i])
+                        continue
+                    running[self._executor.submit(self._invoke, call)] = (i, time.perf_counter())
+
+            if not running:
+                continue
+
+            now = time.perf_counter()
+            next_deadline = min(start + self._timeout_for(tool_calls[i]) for i, start in running.values())
+            done, _ = wait(list(running), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                i, _ = running.pop(future)
+                results[i] = future.result()
+                self._log_result(results[i])
+
+            # 超时的调用直接记为失败，后台线程继续运行但不再等待；与它冲突的调用在它结束前不执行
+            now = time.perf_counter()
+            for future, (i, start) in list(running.items()):
+                call = tool_calls[i]
+                if now - start >= self._timeout_for(call):
+                    running.pop(future)
+                    self._stragglers.append((future, accesses[i], call["name"]))
+                    results[i] = ToolCallResult(
+                        call["id"], call["name"], f"工具执行超时（{self._timeout_for(call):g} 秒）",
+                        now - start, False,
+                    )
+                    self._log_result(results[i])
+
+        return results
+
+    # ==================== 内部实现 ====================
+
+    def _blocking_straggler(self, access: Tuple[Set[str], Set[str]]) -> Optional[str]:
+        """与 access 冲突且仍在运行的超时调用的工具名"""
+        self._stragglers = [s for s in self._stragglers if not s[0].done()]
+        for _, straggler_access, name in self._stragglers:
+            if _conflicts(straggler_access, access):
+                return name
+        return None
+
+    def _timeout_for(self, tool_call: Dict) -> float:
+        return self.timeouts.get(tool_call["name"], self.timeout)
+
+    def _invoke(self, tool_call: Dict) -> ToolCallResult:
+        start = time.perf_counter()
+        tool_func = self.tools_by_name.get(tool_call["name"])
+        if tool_func is None:
+            return ToolCallResult(
+                tool_call["id"], tool_call["name"], f"未找到工具: {tool_call['name']}", 0.0, False
+            )
+        try:
+            result = tool_func.invoke(tool_call["args"])
+            return ToolCallResult(
+                tool_call["id"], tool_call["name"], str(result), time.perf_counter() - start, True
+            )
+        except Exception as e:
+            return ToolCallResult(
+                tool_call["id"], tool_call["name"], f"工具执行错误: {str(e)}", time.perf_counter() - start, False
+            )
+
+    @staticmethod
+    def _log_call(tool_call: Dict) -> None:
+        logger.info(f"\n  🛠️  工具: {tool_call['name']}")
+        logger.info(f"  📋 参数: {tool_call['args']}")
+
+    @staticmethod
+    def _log_result(result: ToolCallResult) -> None:
+        preview = result.content[:150] + "..." if len(result.content) > 150 else result.content
+        if result.ok:
+            logger.info(f"  ✅ {result.name} 结果（{result.seconds:.2f}s）: {preview}")
+        else:
+            logger.error(f"  ❌ {result.name}（{result.seconds:.2f}s）: {preview}")
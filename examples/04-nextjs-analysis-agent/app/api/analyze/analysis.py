@@ -1,207 +1,653 @@
+"""
+成绩数据分析脚本（在 Sandbox 中运行）
+
+用法：
+    python analysis.py <csv_file> [--embed-charts] [--chart-format png|webp|svg] [--dpi 100] [--parallel-charts]
+                                        [--chunksize 100000] [--format auto|csv|parquet|arrow]
+
+默认将图表保存到 /tmp/chart_*.png 并在结果中返回路径；使用 --embed-charts 时
+图表只渲染到内存，base64 编码后随 JSON 结果一起返回（chart_images），不再写文件。
+
+图表使用面向对象的 Figure API 绘制，不依赖 pyplot 的全局状态；使用 --parallel-charts
+时各图表在进程池中并发渲染，输出顺序与顺序渲染一致。每张图表的耗时记录在 chart_timings 中。
+
+使用 --chunksize 时按块读取 CSV，只维护可合并的汇总量，内存占用不随文件大小增长，
+输出的 JSON 结构与一次性读取相同。
+
+数据文件也可以是主机转换后上传的 Parquet 或 Arrow IPC 文件（按扩展名或 --format 判断），
+省去 Sandbox 中的 CSV 解析；Arrow IPC 文件通过内存映射读取。
+"""
+import argparse
+import base64
+import heapq
+import io
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from math import pi
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib
-import json
-import sys
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
 
 # 设置中文字体（使用 matplotlib 内置字体）
 matplotlib.rcParams['font.sans-serif'] = ['DejaVu Sans']
 matplotlib.rcParams['axes.unicode_minus'] = False
 
-# 读取 CSV 文件
-csv_file = sys.argv[1]
-df = pd.read_csv(csv_file, encoding='utf-8')
 
-# 基本统计信息
-results = {
-    "basic_info": {
-        "total_students": len(df),
-        "subjects": [],
-        "statistics": {}
-    },
-    "rankings": {},
-    "charts": []
-}
-
-# 识别科目列（排除学号、姓名等非成绩列）
-exclude_cols = ['学号', '姓名', '学生ID', '班级', 'ID', 'Name', 'Student_ID']
-subject_cols = [col for col in df.columns if col not in exclude_cols and df[col].dtype in ['int64', 'float64']]
-
-results["basic_info"]["subjects"] = subject_cols
-
-# 计算总分和平均分
-if len(subject_cols) > 0:
-    df['总分'] = df[subject_cols].sum(axis=1)
-    df['平均分'] = df[subject_cols].mean(axis=1)
-    
+# 排除在成绩统计之外的列（学号、姓名等）
+EXCLUDE_COLS = ['学号', '姓名', '学生ID', '班级', 'ID', 'Name', 'Student_ID']
+PASS_SCORE = 60
+TOP_K = 3
+
+
+# ==================== 数据读取 ====================
+# 支持 CSV 以及主机转换后上传的 Parquet / Arrow IPC（后两者需要 pyarrow）
+
+DATA_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+
+def detect_format(path):
+    """根据扩展名判断数据格式，未知扩展名按 CSV 处理"""
+    return DATA_FORMATS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+
+def read_table(path, data_format):
+    """一次性读取整个数据文件为 DataFrame；Arrow IPC 通过内存映射读取"""
+    if data_format == 'parquet':
+        return pd.read_parquet(path)
+    if data_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    return pd.read_csv(path, encoding='utf-8')
+
+
+def iter_table_chunks(path, data_format, chunksize):
+    """按最多 chunksize 行的分块逐个产出 DataFrame"""
+    if data_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif data_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+    else:
+        yield from pd.read_csv(path, encoding='utf-8', chunksize=chunksize)
+
+
+def pass_count(series):
+    """及格人数（NaN 不计入）"""
+    return int((series >= PASS_SCORE).sum())
+
+
+def top_k_positions(values, k=TOP_K):
+    """
+    返回最大的 k 个值的行位置，按分数降序、同分按行号升序
+
+    使用 argpartition 部分排序，复杂度 O(n)；结果与 DataFrame.nlargest(k, keep='first')
+    一致，NaN 不参与排名。
+    """
+    values = np.asarray(values, dtype=float)
+    filled = np.where(np.isnan(values), -np.inf, values)
+    valid = np.count_nonzero(~np.isnan(values))
+    k = min(k, valid)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+
+    # 第 k 大的值作为阈值：严格大于阈值的全部入选，等于阈值的按行号补足
+    threshold = filled[np.argpartition(-filled, k - 1)[k - 1]]
+    above = np.flatnonzero(filled > threshold)
+    ties = np.flatnonzero(filled == threshold)[:k - len(above)]
+    positions = np.concatenate([above, ties])
+    return positions[np.lexsort((positions, -filled[positions]))]
+
+
+def row_totals(matrix):
+    """按行计算总分和平均分，缺考 NaN 不计入（与 pandas 的 skipna 一致）"""
+    valid = ~np.isnan(matrix)
+    if valid.all():
+        totals = matrix.sum(axis=1)
+        counts = matrix.shape[1]
+    else:
+        totals = np.where(valid, matrix, 0.0).sum(axis=1)
+        counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = totals / counts
+    return totals, averages
+
+
+def detect_columns(df):
+    """识别科目列（排除学号、姓名等非成绩列）和姓名列"""
+    subject_cols = [col for col in df.columns if col not in EXCLUDE_COLS and df[col].dtype in ['int64', 'float64']]
+    name_col = '姓名' if '姓名' in df.columns else ('Name' if 'Name' in df.columns else df.columns[1])
+    return subject_cols, name_col
+
+
+def write_statistics(results, subject_cols, table, total_students):
+    """
+    将聚合统计表写入 results["basic_info"]["statistics"]
+
+    Args:
+        table: 以列名为索引，包含 mean / max / min / std / pass_count 的 DataFrame
+        total_students: 学生总数（及格率的分母，包含缺考）
+    """
+    statistics = results["basic_info"]["statistics"]
+
     # 各科目统计
     for subject in subject_cols:
-        results["basic_info"]["statistics"][subject] = {
-            "平均分": round(float(df[subject].mean()), 2),
-            "最高分": float(df[subject].max()),
-            "最低分": float(df[subject].min()),
-            "标准差": round(float(df[subject].std()), 2),
-            "及格率": round(float((df[subject] >= 60).sum() / len(df) * 100), 2)
+        row = table.loc[subject]
+        statistics[subject] = {
+            "平均分": round(float(row['mean']), 2),
+            "最高分": float(row['max']),
+            "最低分": float(row['min']),
+            "标准差": round(float(row['std']), 2),
+            "及格率": round(float(row['pass_count'] / total_students * 100), 2)
         }
-    
+
     # 总分和平均分统计
-    results["basic_info"]["statistics"]["总分"] = {
-        "平均分": round(float(df['总分'].mean()), 2),
-        "最高分": float(df['总分'].max()),
-        "最低分": float(df['总分'].min()),
-        "标准差": round(float(df['总分'].std()), 2)
+    row = table.loc['总分']
+    statistics["总分"] = {
+        "平均分": round(float(row['mean']), 2),
+        "最高分": float(row['max']),
+        "最低分": float(row['min']),
+        "标准差": round(float(row['std']), 2)
     }
-    
-    results["basic_info"]["statistics"]["平均分"] = {
-        "班级平均": round(float(df['平均分'].mean()), 2),
-        "最高平均": round(float(df['平均分'].max()), 2),
-        "最低平均": round(float(df['平均分'].min()), 2)
+
+    row = table.loc['平均分']
+    statistics["平均分"] = {
+        "班级平均": round(float(row['mean']), 2),
+        "最高平均": round(float(row['max']), 2),
+        "最低平均": round(float(row['min']), 2)
     }
-    
-    # 排名信息
-    name_col = '姓名' if '姓名' in df.columns else ('Name' if 'Name' in df.columns else df.columns[1])
-    
+
+
+def write_rankings(results, subject_cols, top_by_subject, top_by_total, top_by_average):
+    """
+    将排名写入 results["rankings"]
+
+    Args:
+        top_by_subject: {科目: [(姓名, 分数), ...]}，按名次排列
+        top_by_total: [(姓名, 总分, {科目: 分数}), ...]
+        top_by_average: [(姓名, 平均分)]
+    """
+    rankings = results["rankings"]
+
     # 各科第一名
     for subject in subject_cols:
-        top_idx = df[subject].idxmax()
-        results["rankings"][f"{subject}_第一名"] = {
-            "姓名": str(df.loc[top_idx, name_col]),
-            "分数": float(df.loc[top_idx, subject])
-        }
-    
+        for name, score in top_by_subject[subject][:1]:
+            rankings[f"{subject}_第一名"] = {"姓名": name, "分数": score}
+
     # 总分第一名
-    top_idx = df['总分'].idxmax()
-    results["rankings"]["总分第一名"] = {
-        "姓名": str(df.loc[top_idx, name_col]),
-        "总分": float(df.loc[top_idx, '总分']),
-        "各科成绩": {subj: float(df.loc[top_idx, subj]) for subj in subject_cols}
-    }
-    
+    for name, total, scores in top_by_total[:1]:
+        rankings["总分第一名"] = {"姓名": name, "总分": total, "各科成绩": scores}
+
     # 平均分第一名
-    top_idx = df['平均分'].idxmax()
-    results["rankings"]["平均分第一名"] = {
-        "姓名": str(df.loc[top_idx, name_col]),
-        "平均分": round(float(df.loc[top_idx, '平均分']), 2)
-    }
-    
-    # 单科状元（所有科目都是第一的学生）
-    top_students = []
-    for subject in subject_cols:
-        max_score = df[subject].max()
-        top_students_subj = df[df[subject] == max_score][name_col].tolist()
-        
+    for name, average in top_by_average[:1]:
+        rankings["平均分第一名"] = {"姓名": name, "平均分": round(average, 2)}
+
     # 各科前三名
     for subject in subject_cols:
-        top3 = df.nlargest(3, subject)[[name_col, subject]]
-        results["rankings"][f"{subject}_前三名"] = [
-            {"姓名": str(row[name_col]), "分数": float(row[subject])}
-            for _, row in top3.iterrows()
+        rankings[f"{subject}_前三名"] = [
+            {"姓名": name, "分数": score} for name, score in top_by_subject[subject]
         ]
-    
+
     # 总分前三名
-    top3 = df.nlargest(3, '总分')[[name_col, '总分'] + subject_cols]
-    results["rankings"]["总分前三名"] = [
-        {
-            "姓名": str(row[name_col]),
-            "总分": float(row['总分']),
-            "各科": {subj: float(row[subj]) for subj in subject_cols}
-        }
-        for _, row in top3.iterrows()
+    rankings["总分前三名"] = [
+        {"姓名": name, "总分": total, "各科": scores} for name, total, scores in top_by_total
     ]
-    
-    # 生成图表
-    # 1. 各科平均分对比图
-    plt.figure(figsize=(12, 6))
-    avg_scores = [df[subj].mean() for subj in subject_cols]
-    plt.bar(subject_cols, avg_scores, color='skyblue', edgecolor='navy', alpha=0.7)
-    plt.axhline(y=60, color='r', linestyle='--', label='Passing Line (60)')
-    plt.xlabel('Subjects', fontsize=12)
-    plt.ylabel('Average Score', fontsize=12)
-    plt.title('Average Scores by Subject', fontsize=14, fontweight='bold')
-    plt.ylim(0, 100)
-    plt.legend()
-    plt.grid(axis='y', alpha=0.3)
-    chart1 = '/tmp/chart_avg_scores.png'
-    plt.savefig(chart1, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart1)
-    
-    # 2. 总分分布直方图
-    plt.figure(figsize=(10, 6))
-    plt.hist(df['总分'], bins=20, color='lightgreen', edgecolor='darkgreen', alpha=0.7)
-    plt.xlabel('Total Score', fontsize=12)
-    plt.ylabel('Number of Students', fontsize=12)
-    plt.title('Distribution of Total Scores', fontsize=14, fontweight='bold')
-    plt.grid(axis='y', alpha=0.3)
-    chart2 = '/tmp/chart_total_distribution.png'
-    plt.savefig(chart2, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart2)
-    
-    # 3. 各科成绩箱线图
-    plt.figure(figsize=(12, 6))
-    df[subject_cols].boxplot()
-    plt.ylabel('Score', fontsize=12)
-    plt.title('Score Distribution by Subject (Box Plot)', fontsize=14, fontweight='bold')
-    plt.xticks(rotation=45)
-    plt.grid(axis='y', alpha=0.3)
-    chart3 = '/tmp/chart_boxplot.png'
-    plt.savefig(chart3, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart3)
-    
-    # 4. 前十名学生雷达图（如果有多个科目）
-    if len(subject_cols) >= 3:
-        from math import pi
-        
-        top10 = df.nlargest(10, '总分')
-        fig, ax = plt.subplots(figsize=(10, 10), subplot_kw=dict(projection='polar'))
-        
-        angles = [n / float(len(subject_cols)) * 2 * pi for n in range(len(subject_cols))]
-        angles += angles[:1]
-        
-        ax.set_theta_offset(pi / 2)
-        ax.set_theta_direction(-1)
-        ax.set_xticks(angles[:-1])
-        ax.set_xticklabels(subject_cols)
-        
-        # 绘制前3名的雷达图
-        for i in range(min(3, len(top10))):
-            values = top10.iloc[i][subject_cols].values.tolist()
-            values += values[:1]
-            ax.plot(angles, values, 'o-', linewidth=2, label=f"{top10.iloc[i][name_col]}")
-            ax.fill(angles, values, alpha=0.15)
-        
-        ax.set_ylim(0, 100)
-        plt.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
-        plt.title('Top 3 Students - Subject Performance', fontsize=14, fontweight='bold', pad=20)
-        chart4 = '/tmp/chart_radar_top3.png'
-        plt.savefig(chart4, dpi=100, bbox_inches='tight')
-        plt.close()
-        results["charts"].append(chart4)
-    
-    # 5. 及格率对比图
-    plt.figure(figsize=(12, 6))
-    pass_rates = [(df[subj] >= 60).sum() / len(df) * 100 for subj in subject_cols]
-    bars = plt.bar(subject_cols, pass_rates, color='coral', edgecolor='darkred', alpha=0.7)
-    plt.axhline(y=80, color='g', linestyle='--', label='Target (80%)')
-    plt.xlabel('Subjects', fontsize=12)
-    plt.ylabel('Pass Rate (%)', fontsize=12)
-    plt.title('Pass Rate by Subject (>=60)', fontsize=14, fontweight='bold')
-    plt.ylim(0, 100)
-    plt.legend()
-    plt.grid(axis='y', alpha=0.3)
-    
+
+
+def compute_statistics(df, results):
+    """
+    计算统计与排名信息写入 results
+
+    所有列的聚合统计由一次 agg 完成，各列前 k 名使用 argpartition 部分排序，
+    不再逐行遍历 DataFrame。
+
+    Returns:
+        (科目列, 图表数据)，图表数据供 build_chart_specs 使用，没有科目列时为 None
+    """
+    subject_cols, name_col = detect_columns(df)
+    results["basic_info"]["subjects"] = subject_cols
+    if len(subject_cols) == 0:
+        return subject_cols, None
+
+    # 计算总分和平均分（在成绩矩阵上按行计算）
+    matrix = df[subject_cols].to_numpy(dtype=float, na_value=np.nan)
+    totals, averages = row_totals(matrix)
+    df['总分'] = totals
+    df['平均分'] = averages
+
+    # 一次 agg 计算全部列的聚合统计
+    table = df[subject_cols + ['总分', '平均分']].agg(['mean', 'max', 'min', 'std', pass_count]).T
+    write_statistics(results, subject_cols, table, len(df))
+
+    # 排名信息
+    names = df[name_col].iat  # 只按位置读取上榜学生的姓名，不物化整列
+    scores = {subject: matrix[:, j] for j, subject in enumerate(subject_cols)}
+
+    def subject_scores(i):
+        return {subj: float(scores[subj][i]) for subj in subject_cols}
+
+    top_by_subject = {
+        subject: [(str(names[i]), float(scores[subject][i])) for i in top_k_positions(scores[subject])]
+        for subject in subject_cols
+    }
+    top_by_total = [(str(names[i]), float(totals[i]), subject_scores(i)) for i in top_k_positions(totals)]
+    top_by_average = [(str(names[i]), float(averages[i])) for i in top_k_positions(averages, 1)]
+    write_rankings(results, subject_cols, top_by_subject, top_by_total, top_by_average)
+
+    return subject_cols, {
+        "table": table,
+        "total_students": len(df),
+        "top_by_total": top_by_total,
+        "distribution": {"totals": totals},
+        "boxplot": {"columns": [df[subj].dropna().to_numpy() for subj in subject_cols]},
+    }
+
+
+# ==================== 分块统计 ====================
+# 超过 Sandbox 内存的 CSV 按块读取，只保留可合并的汇总量，内存占用与文件大小无关
+
+# 直方图的初始桶宽（分）：整数分数时分位数与全量计算一致
+HISTOGRAM_BIN_WIDTH = 1.0
+# 直方图的最大桶数：取值范围超出时桶宽加倍并合并相邻桶，内存占用与取值范围无关
+HISTOGRAM_MAX_BINS = 4096
+
+
+class RunningStats:
+    """
+    单列的可合并统计：数量、总和、均值与 M2（Welford/Chan 合并）、最值、及格人数、有界直方图
+
+    平均分按 总和 / 数量 输出（与 pandas 相同，避免增量均值的舍入误差），标准差由 M2 计算。
+    直方图最多 HISTOGRAM_MAX_BINS 个桶：取值范围不超过该桶数时桶宽为 1 分，箱线图统计量与
+    全量计算一致；范围更大时桶宽逐次加倍，分位数精度随之降为一个桶宽。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.passed = 0
+        self.histogram = Counter()
+        self.bin_width = HISTOGRAM_BIN_WIDTH
+
+    def update(self, values):
+        """合并一个分块的数据（NaN 不计入）"""
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.passed += int(np.count_nonzero(values >= PASS_SCORE))
+        span = self.max - self.min
+        while np.isfinite(span) and span / self.bin_width >= HISTOGRAM_MAX_BINS:
+            self._coarsen()
+        bins, counts = np.unique(np.floor(values / self.bin_width), return_counts=True)
+        self.histogram.update(dict(zip(bins.tolist(), counts.tolist())))
+
+    def as_row(self):
+        """与全量模式 agg 结果相同的字段"""
+        empty = self.count == 0
+        return {
+            "mean": np.nan if empty else self.sum / self.count,
+            "max": np.nan if empty else self.max,
+            "min": np.nan if empty else self.min,
+            "std": (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else np.nan,
+            "pass_count": self.passed,
+        }
+
+    def _coarsen(self):
+        """桶宽加倍：floor(x / 2w) == floor(floor(x / w) / 2)，相邻两个桶合并为一个"""
+        merged = Counter()
+        for b, n in self.histogram.items():
+            merged[b // 2] += n
+        self.histogram = merged
+        self.bin_width *= 2
+
+    def histogram_arrays(self):
+        """返回 (桶左边界, 数量)，按分数升序"""
+        bins = sorted(self.histogram)
+        values = np.array(bins, dtype=float) * self.bin_width
+        counts = np.array([self.histogram[b] for b in bins], dtype=np.int64)
+        return values, counts
+
+    def box_stats(self):
+        """由直方图计算箱线图统计量（线性插值分位数、1.5 IQR 须线，与 matplotlib 一致）"""
+        values, counts = self.histogram_arrays()
+        cumulative = np.cumsum(counts)
+
+        def value_at(rank):
+            return values[np.searchsorted(cumulative, rank, side='right')]
+
+        def quantile(q):
+            position = q * (self.count - 1)
+            low, high = int(np.floor(position)), int(np.ceil(position))
+            return value_at(low) + (value_at(high) - value_at(low)) * (position - low)
+
+        q1, med, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+        iqr = q3 - q1
+        low_limit, high_limit = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        inside = values[(values >= low_limit) & (values <= high_limit)]
+        whislo = inside.min() if len(inside) and inside.min() <= q1 else q1
+        whishi = inside.max() if len(inside) and inside.max() >= q3 else q3
+        fliers = values[(values < whislo) | (values > whishi)]
+        return {"med": med, "q1": q1, "q3": q3, "whislo": whislo, "whishi": whishi, "fliers": fliers}
+
+
+class TopK:
+    """有界的前 k 名：小顶堆保存 (分数, -行号, 附加数据)，同分时行号小者优先"""
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.heap = []
+
+    def push(self, score, row, payload):
+        item = (score, -row, payload)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+
+    def items(self):
+        """按名次返回 [(分数, 附加数据), ...]"""
+        ranked = sorted(self.heap, key=lambda item: item[:2], reverse=True)
+        return [(score, payload) for score, _, payload in ranked]
+
+
+def compute_statistics_chunked(data_file, chunksize, results, data_format='csv'):
+    """
+    分块读取数据文件并计算与 compute_statistics 相同结构的统计结果
+
+    科目列和姓名列根据第一个分块识别。每个分块只把可合并的汇总量（数量、均值/M2、最值、
+    及格人数、前 k 名、有界直方图）并入全局状态，分块本身随即释放。
+
+    Args:
+        data_file: 数据文件路径
+        chunksize: 每个分块的行数
+        results: 结果字典
+        data_format: csv / parquet / arrow
+
+    Returns:
+        (科目列, 图表数据)，与 compute_statistics 相同
+    """
+    subject_cols = None
+    total_students = 0
+    stats = {}
+    top_by_subject = {}
+    top_by_total = TopK()
+    top_by_average = TopK(1)
+
+    for chunk in iter_table_chunks(data_file, data_format, chunksize):
+        offset = total_students
+        total_students += len(chunk)
+        if subject_cols is None:
+            subject_cols, name_col = detect_columns(chunk)
+            stats = {col: RunningStats() for col in subject_cols + ['总分', '平均分']}
+            top_by_subject = {subject: TopK() for subject in subject_cols}
+        if len(subject_cols) == 0:
+            continue
+
+        matrix = chunk[subject_cols].to_numpy(dtype=float, na_value=np.nan)
+        totals, averages = row_totals(matrix)
+        names = chunk[name_col].iat
+
+        for j, subject in enumerate(subject_cols):
+            column = matrix[:, j]
+            stats[subject].update(column)
+            for i in top_k_positions(column):
+                top_by_subject[subject].push(float(column[i]), offset + i, str(names[i]))
+
+        stats['总分'].update(totals)
+        stats['平均分'].update(averages)
+        for i in top_k_positions(totals):
+            scores = {subj: float(matrix[i, j]) for j, subj in enumerate(subject_cols)}
+            top_by_total.push(float(totals[i]), offset + i, (str(names[i]), scores))
+        for i in top_k_positions(averages, 1):
+            top_by_average.push(float(averages[i]), offset + i, str(names[i]))
+
+    subject_cols = subject_cols or []
+    results["basic_info"]["total_students"] = total_students
+    results["basic_info"]["subjects"] = subject_cols
+    if len(subject_cols) == 0:
+        return subject_cols, None
+
+    table = pd.DataFrame({col: running.as_row() for col, running in stats.items()}).T
+    write_statistics(results, subject_cols, table, total_students)
+
+    ranked_total = [(name, total, scores) for total, (name, scores) in top_by_total.items()]
+    write_rankings(
+        results,
+        subject_cols,
+        {subject: [(name, score) for score, name in top.items()] for subject, top in top_by_subject.items()},
+        ranked_total,
+        [(name, average) for average, name in top_by_average.items()],
+    )
+
+    total_values, total_counts = stats['总分'].histogram_arrays()
+    return subject_cols, {
+        "table": table,
+        "total_students": total_students,
+        "top_by_total": ranked_total,
+        "distribution": {"totals": total_values, "weights": total_counts},
+        "boxplot": {"stats": [stats[subj].box_stats() for subj in subject_cols]},
+    }
+
+
+# ==================== 图表 ====================
+# 每个绘图函数只接收普通的 Python 数据，便于在进程池中传递
+
+def draw_avg_scores(fig, subjects, avg_scores):
+    """各科平均分对比图"""
+    ax = fig.subplots()
+    ax.bar(subjects, avg_scores, color='skyblue', edgecolor='navy', alpha=0.7)
+    ax.axhline(y=60, color='r', linestyle='--', label='Passing Line (60)')
+    ax.set_xlabel('Subjects', fontsize=12)
+    ax.set_ylabel('Average Score', fontsize=12)
+    ax.set_title('Average Scores by Subject', fontsize=14, fontweight='bold')
+    ax.set_ylim(0, 100)
+    ax.legend()
+    ax.grid(axis='y', alpha=0.3)
+
+
+def draw_total_distribution(fig, totals, weights=None):
+    """总分分布直方图，分块模式下 totals 为直方图桶、weights 为各桶人数"""
+    ax = fig.subplots()
+    ax.hist(totals, bins=20, weights=weights, color='lightgreen', edgecolor='darkgreen', alpha=0.7)
+    ax.set_xlabel('Total Score', fontsize=12)
+    ax.set_ylabel('Number of Students', fontsize=12)
+    ax.set_title('Distribution of Total Scores', fontsize=14, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3)
+
+
+def draw_boxplot(fig, subjects, columns=None, stats=None):
+    """各科成绩箱线图，分块模式下直接使用预先计算的统计量 stats"""
+    ax = fig.subplots()
+    if stats is None:
+        ax.boxplot(columns)
+    else:
+        ax.bxp(stats)
+    ax.set_xticks(range(1, len(subjects) + 1))
+    ax.set_xticklabels(subjects, rotation=45)
+    ax.set_ylabel('Score', fontsize=12)
+    ax.set_title('Score Distribution by Subject (Box Plot)', fontsize=14, fontweight='bold')
+    ax.grid(alpha=0.3)
+
+
+def draw_radar_top3(fig, subjects, students):
+    """前三名学生雷达图，students 为 [(姓名, 各科成绩列表), ...]"""
+    ax = fig.subplots(subplot_kw=dict(projection='polar'))
+
+    angles = [n / float(len(subjects)) * 2 * pi for n in range(len(subjects))]
+    angles += angles[:1]
+
+    ax.set_theta_offset(pi / 2)
+    ax.set_theta_direction(-1)
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(subjects)
+
+    for name, values in students:
+        values = values + values[:1]
+        ax.plot(angles, values, 'o-', linewidth=2, label=name)
+        ax.fill(angles, values, alpha=0.15)
+
+    ax.set_ylim(0, 100)
+    ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
+    ax.set_title('Top 3 Students - Subject Performance', fontsize=14, fontweight='bold', pad=20)
+
+
+def draw_pass_rates(fig, subjects, pass_rates):
+    """及格率对比图"""
+    ax = fig.subplots()
+    bars = ax.bar(subjects, pass_rates, color='coral', edgecolor='darkred', alpha=0.7)
+    ax.axhline(y=80, color='g', linestyle='--', label='Target (80%)')
+    ax.set_xlabel('Subjects', fontsize=12)
+    ax.set_ylabel('Pass Rate (%)', fontsize=12)
+    ax.set_title('Pass Rate by Subject (>=60)', fontsize=14, fontweight='bold')
+    ax.set_ylim(0, 100)
+    ax.legend()
+    ax.grid(axis='y', alpha=0.3)
+
     # 在柱子上显示数值
     for bar, rate in zip(bars, pass_rates):
         height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2., height,
+        ax.text(bar.get_x() + bar.get_width()/2., height,
                 f'{rate:.1f}%', ha='center', va='bottom')
-    
-    chart5 = '/tmp/chart_pass_rates.png'
-    plt.savefig(chart5, dpi=100, bbox_inches='tight')
-    plt.close()
-    results["charts"].append(chart5)
-
-# 输出结果为 JSON
-print(json.dumps(results, ensure_ascii=False, indent=2))
\ No newline at end of file
+
+
+def build_chart_specs(subject_cols, chart_data):
+    """按输出顺序准备图表任务：(名称, 绘图函数, 画布尺寸, 参数)，chart_data 来自统计阶段"""
+    table = chart_data["table"]
+    total_students = chart_data["total_students"]
+    specs = [
+        ('chart_avg_scores', draw_avg_scores, (12, 6), {
+            "subjects": subject_cols,
+            "avg_scores": [float(table.loc[subj, 'mean']) for subj in subject_cols],
+        }),
+        ('chart_total_distribution', draw_total_distribution, (10, 6), chart_data["distribution"]),
+        ('chart_boxplot', draw_boxplot, (12, 6), {"subjects": subject_cols, **chart_data["boxplot"]}),
+    ]
+
+    # 前三名学生雷达图（如果有多个科目）
+    if len(subject_cols) >= 3:
+        specs.append(('chart_radar_top3', draw_radar_top3, (10, 10), {
+            "subjects": subject_cols,
+            "students": [
+                (name, [scores[subj] for subj in subject_cols])
+                for name, _, scores in chart_data["top_by_total"]
+            ],
+        }))
+
+    specs.append(('chart_pass_rates', draw_pass_rates, (12, 6), {
+        "subjects": subject_cols,
+        "pass_rates": [float(table.loc[subj, 'pass_count'] / total_students * 100) for subj in subject_cols],
+    }))
+    return specs
+
+
+def render_chart(spec, chart_format, dpi, embed):
+    """
+    渲染单张图表
+
+    Returns:
+        (文件名, base64 编码或 None, 耗时秒数)
+    """
+    name, draw, figsize, kwargs = spec
+    start = time.perf_counter()
+    fig = Figure(figsize=figsize)
+    draw(fig, **kwargs)
+
+    filename = f'/tmp/{name}.{chart_format}'
+    encoded = None
+    if embed:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=chart_format, dpi=dpi, bbox_inches='tight')
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+    else:
+        fig.savefig(filename, format=chart_format, dpi=dpi, bbox_inches='tight')
+    return filename, encoded, round(time.perf_counter() - start, 4)
+
+
+def render_charts(specs, chart_format, dpi, embed, parallel=False):
+    """顺序或在进程池中并发渲染全部图表，结果顺序与 specs 一致"""
+    if parallel and len(specs) > 1:
+        workers = min(len(specs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_chart, spec, chart_format, dpi, embed) for spec in specs]
+            return [future.result() for future in futures]
+    return [render_chart(spec, chart_format, dpi, embed) for spec in specs]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('csv_file', help='数据文件：CSV，或主机上传的 Parquet / Arrow IPC')
+    parser.add_argument('--format', default='auto', choices=['auto', 'csv', 'parquet', 'arrow'],
+                        help='数据格式，auto 表示按扩展名判断')
+    parser.add_argument('--embed-charts', action='store_true', help='在 JSON 结果中直接返回 base64 图表')
+    parser.add_argument('--chart-format', default='png', choices=['png', 'webp', 'svg'])
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--parallel-charts', action='store_true', help='在进程池中并发渲染图表')
+    parser.add_argument('--chunksize', type=int, default=0, help='分块读取 CSV 的行数，0 表示一次性读取')
+    args = parser.parse_args()
+
+    # 基本统计信息
+    results = {
+        "basic_info": {
+            "total_students": 0,
+            "subjects": [],
+            "statistics": {}
+        },
+        "rankings": {},
+        "charts": [],
+        "chart_format": args.chart_format,
+        "chart_timings": []
+    }
+    if args.embed_charts:
+        results["chart_images"] = []
+
+    data_format = detect_format(args.csv_file) if args.format == 'auto' else args.format
+    if args.chunksize > 0:
+        subject_cols, chart_data = compute_statistics_chunked(args.csv_file, args.chunksize, results, data_format)
+    else:
+        df = read_table(args.csv_file, data_format)
+        results["basic_info"]["total_students"] = len(df)
+        subject_cols, chart_data = compute_statistics(df, results)
+
+    # 生成图表
+    if len(subject_cols) > 0:
+        specs = build_chart_specs(subject_cols, chart_data)
+        rendered = render_charts(specs, args.chart_format, args.dpi, args.embed_charts, args.parallel_charts)
+        for (name, _, _, _), (filename, encoded, seconds) in zip(specs, rendered):
+            results["charts"].append(filename)
+            results["chart_timings"].append({"chart": name, "seconds": seconds})
+            if args.embed_charts:
+                results["chart_images"].append(encoded)
+
+    # 输出结果为 JSON
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+各 Python 示例共用的辅助模块
+
+示例脚本通过将 examples/ 目录加入 sys.path 来导入：
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from common.bedrock_runtime import get_bedrock_runtime_client
+"""
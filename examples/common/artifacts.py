@@ -0,0 +1,207 @@
+"""
+产物输出
+
+报告、CSV 等产物可以写到本地磁盘、Sandbox 或两者。ArtifactSink 对每个产物只写一次：
+写入时同步计算大小和 SHA-256，不需要再从 Sandbox 读回文件来确认写入结果，
+也不需要先写入 Sandbox 再下载到本地。
+
+用法：
+    sink = ArtifactSink("both", local_dir="./output", sandbox=sandbox)
+    info = sink.write("data.csv", csv_content)
+
+    with sink.open("report.html") as out:      # 逐段写出文本
+        for fragment in fragments:
+            out.write(fragment)
+    info = out.info
+"""
+
+import hashlib
+import io
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Any, List, Optional, Union
+
+
+logger = logging.getLogger(__name__)
+
+
+ARTIFACT_DESTINATIONS = ("local", "sandbox", "both")
+
+
+@dataclass
+class ArtifactInfo:
+    """已写入的产物：大小为 UTF-8 编码后的字节数"""
+    name: str
+    size: int
+    sha256: str
+    local_path: Optional[str] = None
+    sandbox_path: Optional[str] = None
+
+
+class ArtifactSink:
+    """将产物写到本地目录和 / 或 Sandbox，并记录每个产物的元数据"""
+
+    def __init__(
+        self,
+        destination: str = "both",
+        local_dir: str = "./output",
+        sandbox: Any = None,
+        sandbox_dir: str = "/tmp",
+    ):
+        """
+        Args:
+            destination: local / sandbox / both
+            local_dir: 本地输出目录
+            sandbox: Sandbox 实例，destination 包含 sandbox 时必须提供
+            sandbox_dir: Sandbox 中的输出目录
+        """
+        if destination not in ARTIFACT_DESTINATIONS:
+            raise ValueError(f"不支持的输出位置: {destination}，可选: {', '.join(ARTIFACT_DESTINATIONS)}")
+        if destination != "local" and sandbox is None:
+            raise ValueError(f"输出位置为 {destination} 时需要提供 Sandbox")
+        self.destination = destination
+        self.local_dir = local_dir
+        self.sandbox = sandbox
+        self.sandbox_dir = sandbox_dir.rstrip("/") or "/"
+        self.artifacts: List[ArtifactInfo] = []
+        if self.writes_local:
+            os.makedirs(local_dir, exist_ok=True)
+
+    @property
+    def writes_local(self) -> bool:
+        return self.destination in ("local", "both")
+
+    @property
+    def writes_sandbox(self) -> bool:
+        return self.destination in ("sandbox", "both")
+
+    def local_path(self, name: str) -> Optional[str]:
+        return os.path.join(self.local_dir, name) if self.writes_local else None
+
+    def sandbox_path(self, name: str) -> Optional[str]:
+        return f"{self.sandbox_dir}/{name}" if self.writes_sandbox else None
+
+    def write(self, name: str, data: Union[str, bytes]) -> ArtifactInfo:
+        """
+        写入一个完整的产物
+
+        Args:
+            name: 文件名（相对于 local_dir / sandbox_dir）
+            data: 文本（按 UTF-8 编码）或字节
+
+        Returns:
+            产物元数据
+        """
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        local_path = self.local_path(name)
+        if local_path:
+            with open(local_path, "wb") as f:
+                f.write(payload)
+        sandbox_path = self.sandbox_path(name)
+        if sandbox_path:
+            # 文本原样传给 SDK，与直接调用 files.write 的行为一致
+            self.sandbox.files.write(sandbox_path, data)
+        return self._record(ArtifactInfo(
+            name, len(payload), hashlib.sha256(payload).hexdigest(), local_path, sandbox_path
+        ))
+
+    def open(self, name: str) -> "ArtifactWriter":
+        """
+        以文本流的方式逐段写出产物，关闭时完成上传并记录元数据
+
+        写本地时片段直接写入同目录的临时文件，关闭时上传到 Sandbox 并替换为正式文件；
+        只写 Sandbox 时在内存中保留 UTF-8 编码后的内容，关闭时一次上传。
+        在 with 块中出现异常时放弃该产物：不上传、不记录，已有的同名本地文件保持不变。
+        """
+        return ArtifactWriter(self, name)
+
+    def _record(self, info: ArtifactInfo) -> ArtifactInfo:
+        self.artifacts.append(info)
+        locations = "，".join(
+            f"{label} {path}" for label, path in (("本地", info.local_path), ("Sandbox", info.sandbox_path)) if path
+        )
+        logger.info(f"✅ 已写入 {info.name}: {info.size:,} 字节，sha256 {info.sha256[:12]}（{locations}）")
+        return info
+
+
+class ArtifactWriter(io.TextIOBase):
+    """ArtifactSink.open 返回的文本流，关闭后 info 为产物元数据"""
+
+    def __init__(self, sink: ArtifactSink, name: str):
+        super().__init__()
+        self.sink = sink
+        self.name = name
+        self.info: Optional[ArtifactInfo] = None
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._local_path = sink.local_path(name)
+        self._file = None
+        self._temp_path = None
+        if self._local_path:
+            # 写到同目录的临时文件，成功关闭后再替换，失败时不会破坏已有的报告
+            directory, basename = os.path.split(self._local_path)
+            self._temp_path = os.path.join(directory, f".{basename}.{uuid.uuid4().hex[:8]}.tmp")
+            self._file = open(self._temp_path, "xb")
+        self._buffer = None if self._file else io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self._size += len(data)
+        (self._file or self._buffer).write(data)
+        return len(text)
+
+    def flush(self) -> None:
+        if self._file and not self._file.closed:
+            self._file.flush()
+
+    def close(self) -> None:
+        """完成写入：上传到 Sandbox、替换本地文件并记录元数据，失败时放弃该产物"""
+        if self.closed:
+            return
+        try:
+            sandbox_path = self.sink.sandbox_path(self.name)
+            if self._file:
+                self._file.close()
+                if sandbox_path:
+                    with open(self._temp_path, "rb") as f:
+                        self.sink.sandbox.files.write(sandbox_path, f.read())
+                os.replace(self._temp_path, self._local_path)
+                self._temp_path = None
+            elif sandbox_path:
+                self.sink.sandbox.files.write(sandbox_path, self._buffer.getvalue())
+            self.info = self.sink._record(ArtifactInfo(
+                self.name, self._size, self._digest.hexdigest(), self._local_path, sandbox_path
+            ))
+        finally:
+            self._discard()
+
+    def abort(self) -> None:
+        """放弃写入：不上传、不记录，删除临时文件"""
+        if self.closed:
+            return
+        logger.warning(f"⚠️ {self.name} 写入中断，已放弃")
+        self._discard()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _discard(self) -> None:
+        if self._file:
+            self._file.close()
+        if self._temp_path:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+            self._temp_path = None
+        self._buffer = None
+        super().close()
@@ -0,0 +1,388 @@
+"""
+Bedrock 响应缓存
+
+开发和回归测试时，同一个 prompt 会被反复发送给模型，每次都要花费数秒和 token。
+这里在 invoke_model / converse 前加一层缓存：缓存键由模型 ID、规范化后的请求体和
+采样参数组成，响应保存在 SQLite 中，进程重启后依然有效。
+
+- LRU + TTL 淘汰：条目超过有效期即失效，总数超过上限时删除最久未使用的条目
+- temperature > 0 的请求默认同样缓存（开发时通常希望结果可复现），
+  可通过 bypass_sampled=True 让这类请求直接调用模型
+- 流式接口（invoke_model_with_response_stream / converse_stream）不经过缓存
+
+用法：
+    install_response_cache(BedrockResponseCache.from_env())
+    client = get_cached_bedrock_runtime_client()
+    response = client.invoke_model(modelId=..., body=json.dumps(request_body))
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from common.bedrock_runtime import get_bedrock_runtime_client
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "scalebox-cookbook", "bedrock_responses.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+# 参与缓存键计算的 Converse 参数
+_CONVERSE_KEY_FIELDS = (
+    "messages",
+    "system",
+    "inferenceConfig",
+    "toolConfig",
+    "guardrailConfig",
+    "additionalModelRequestFields",
+    "additionalModelResponseFieldPaths",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model_id TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    body BLOB NOT NULL,
+    latency REAL NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+def _normalize(value: Any) -> Any:
+    """去掉字符串首尾空白，使仅在缩进或换行上不同的 prompt 命中同一条目"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_request_key(operation: str, model_id: str, request: Dict) -> str:
+    """
+    计算缓存键
+
+    请求体按键排序、去掉字符串首尾空白后序列化；采样参数（temperature、top_p、
+    max_tokens 或 inferenceConfig）都在请求体中，因此参数不同的请求不会共用条目。
+
+    Args:
+        operation: invoke_model / converse
+        model_id: Bedrock 模型 ID
+        request: invoke_model 的请求体（已解析的 JSON）或 converse 的参数
+
+    Returns:
+        十六进制 SHA-256 摘要
+    """
+    canonical = json.dumps(
+        {"operation": operation, "model_id": model_id, "request": _normalize(request)},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def request_temperature(request: Dict) -> Optional[float]:
+    """
+    读取请求的 temperature
+
+    兼容 OpenAI 风格（temperature）、Converse / Nova（inferenceConfig）和 Titan（textGenerationConfig）。
+
+    Returns:
+        temperature，请求中未指定时返回 None（使用模型默认值，通常大于 0）
+    """
+    for section in (request, request.get("inferenceConfig"), request.get("textGenerationConfig")):
+        if isinstance(section, dict) and section.get("temperature") is not None:
+            return float(section["temperature"])
+    return None
+
+
+class BedrockResponseCache:
+    """
+    基于 SQLite 的 Bedrock 响应缓存（LRU + TTL），可在多个线程间共享
+
+    stats 中的计数：
+        hits / misses: 命中与未命中次数
+        bypassed: 因 bypass_sampled 未查询缓存的请求数
+        expired / evictions: 因过期或超过条目上限删除的条目数
+        latency_saved_seconds: 命中时节省的模型调用耗时（原调用耗时减去查询耗时）
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        bypass_sampled: bool = False,
+    ):
+        """
+        Args:
+            path: SQLite 数据库文件路径，":memory:" 表示只在进程内缓存
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 最多保留的条目数
+            bypass_sampled: 为 True 时 temperature > 0（或未指定）的请求不使用缓存
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass_sampled = bypass_sampled
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "expired": 0,
+            "evictions": 0,
+            "latency_saved_seconds": 0.0,
+        }
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            # WAL 模式允许多个进程同时读写同一个缓存文件
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "BedrockResponseCache":
+        """
+        按环境变量创建缓存
+
+        BEDROCK_CACHE_PATH、BEDROCK_CACHE_TTL（秒）、BEDROCK_CACHE_MAX_ENTRIES、
+        BEDROCK_CACHE_BYPASS_SAMPLED（1 / true 时绕过 temperature > 0 的请求）
+        """
+        return cls(
+            path=os.getenv("BEDROCK_CACHE_PATH") or DEFAULT_CACHE_PATH,
+            ttl_seconds=float(os.getenv("BEDROCK_CACHE_TTL") or DEFAULT_TTL_SECONDS),
+            max_entries=int(os.getenv("BEDROCK_CACHE_MAX_ENTRIES") or DEFAULT_MAX_ENTRIES),
+            bypass_sampled=os.getenv("BEDROCK_CACHE_BYPASS_SAMPLED", "").lower() in ("1", "true", "yes"),
+        )
+
+    def should_bypass(self, request: Dict) -> bool:
+        """判断请求是否绕过缓存"""
+        if not self.bypass_sampled:
+            return False
+        temperature = request_temperature(request)
+        return temperature is None or temperature > 0
+
+    def record_bypass(self) -> None:
+        """记录一次绕过缓存的请求（客户端在多个线程间共享，计数需要加锁）"""
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def get(self, key: str) -> Optional[Tuple[Dict, bytes]]:
+        """
+        查询缓存
+
+        Returns:
+            命中时返回 (元数据, 响应体字节)，未命中或已过期返回 None
+        """
+        start = time.perf_counter()
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT metadata, body, latency, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[3] > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.stats["expired"] += 1
+                    row = None
+                if row is None:
+                    self.stats["misses"] += 1
+                    return None
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                logger.warning(f"读取 Bedrock 响应缓存失败: {e}")
+                self.stats["misses"] += 1
+                return None
+
+            metadata, body, latency, _ = row
+            self.stats["hits"] += 1
+            self.stats["latency_saved_seconds"] += max(0.0, latency - (time.perf_counter() - start))
+            return json.loads(metadata), bytes(body)
+
+    def put(self, key: str, model_id: str, metadata: Dict, body: bytes, latency: float) -> None:
+        """
+        写入缓存，并淘汰过期和超出上限的条目
+
+        Args:
+            key: make_request_key 计算的缓存键
+            model_id: Bedrock 模型 ID
+            metadata: 重建响应所需的元数据，例如 contentType
+            body: 响应体字节
+            latency: 本次模型调用耗时（秒），命中时用于统计节省的时间
+        """
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, model_id, json.dumps(metadata), sqlite3.Binary(body), latency, now, now),
+                )
+                self._evict(now)
+            except sqlite3.Error as e:
+                logger.warning(f"写入 Bedrock 响应缓存失败: {e}")
+
+    def clear(self) -> None:
+        """删除全部条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.stats["expired"] += max(expired, 0)
+
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            evicted = self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,),
+            ).rowcount
+            self.stats["evictions"] += max(evicted, 0)
+
+    def summary(self) -> str:
+        """用于日志输出的统计摘要"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (
+            f"命中 {self.stats['hits']}，未命中 {self.stats['misses']}，绕过 {self.stats['bypassed']}，"
+            f"命中率 {hit_rate:.0%}，节省 {self.stats['latency_saved_seconds']:.2f}s"
+        )
+
+    def __repr__(self) -> str:
+        return f"BedrockResponseCache(path={self.path!r}, stats={self.stats})"
+
+
+class CachedBedrockClient:
+    """
+    带响应缓存的 bedrock-runtime 客户端包装
+
+    invoke_model / converse 的参数和返回值与 boto3 客户端一致（invoke_model 的 body
+    是可 read() 的对象），其他方法直接转发给原客户端。
+    """
+
+    def __init__(self, client: Any, cache: BedrockResponseCache):
+        self._client = client
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def invoke_model(self, **kwargs) -> Dict:
+        body = kwargs.get("body", b"")
+        try:
+            request = json.loads(body)
+        except (TypeError, ValueError):
+            request = None
+        if not isinstance(request, dict):
+            return self._client.invoke_model(**kwargs)
+
+        model_id = kwargs["modelId"]
+        if self.cache.should_bypass(request):
+            self.cache.record_bypass()
+            return self._client.invoke_model(**kwargs)
+
+        key = make_request_key("invoke_model", model_id, {"body": request, "accept": kwargs.get("accept")})
+        cached = self.cache.get(key)
+        if cached is not None:
+            metadata, payload = cached
+            logger.info(f"♻️  命中 Bedrock 响应缓存: {model_id}")
+            return {"body": io.BytesIO(payload), "contentType": metadata.get("contentType"), "cached": True}
+
+        start = time.perf_counter()
+        response = self._client.invoke_model(**kwargs)
+        payload = response["body"].read()
+        latency = time.perf_counter() - start
+
+        self.cache.put(key, model_id, {"contentType": response.get("contentType")}, payload, latency)
+        response = dict(response)
+        response["body"] = io.BytesIO(payload)
+        return response
+
+    def converse(self, **kwargs) -> Dict:
+        model_id = kwargs["modelId"]
+        request = {field: kwargs[field] for field in _CONVERSE_KEY_FIELDS if field in kwargs}
+        if self.cache.should_bypass(request):
+            self.cache.record_bypass()
+            return self._client.converse(**kwargs)
+
+        key = make_request_key("converse", model_id, request)
+        cached = self.cache.get(key)
+        if cached is not None:
+            _, payload = cached
+            logger.info(f"♻️  命中 Bedrock 响应缓存: {model_id}")
+            response = json.loads(payload)
+            response["cached"] = True
+            return response
+
+        start = time.perf_counter()
+        response = self._client.converse(**kwargs)
+        latency = time.perf_counter() - start
+
+        stored = {k: v for k, v in response.items() if k != "ResponseMetadata"}
+        try:
+            payload = json.dumps(stored, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            # 包含图片等二进制内容块的响应不缓存
+            return response
+        self.cache.put(key, model_id, {}, payload, latency)
+        return response
+
+
+_active_cache: Optional[BedrockResponseCache] = None
+
+
+def install_response_cache(cache: Optional[BedrockResponseCache]) -> None:
+    """设置进程级的响应缓存，传入 None 关闭缓存"""
+    global _active_cache
+    _active_cache = cache
+    if cache is not None:
+        logger.info(f"已启用 Bedrock 响应缓存: {cache.path}")
+
+
+def get_response_cache() -> Optional[BedrockResponseCache]:
+    """当前启用的响应缓存，未启用时返回 None"""
+    return _active_cache
+
+
+def get_cached_bedrock_runtime_client(region: Optional[str] = None):
+    """
+    获取共享的 bedrock-runtime 客户端，启用了响应缓存时包装为 CachedBedrockClient
+
+    Args:
+        region: AWS Region，默认读取 AWS_REGION 环境变量
+
+    Returns:
+        boto3 bedrock-runtime 客户端或 CachedBedrockClient
+    """
+    client = get_bedrock_runtime_client(region)
+    if _active_cache is None:
+        return client
+    return CachedBedrockClient(client, _active_cache)
@@ -0,0 +1,160 @@
+"""
+共享的 Bedrock Runtime 客户端
+
+boto3 客户端本身是线程安全的，创建它却很昂贵：需要解析凭证、加载服务模型和
+endpoint 规则，并且每个新客户端都有自己的连接池，第一次请求要重新完成 TLS 握手。
+
+这里按 (region, 凭证, 连接池大小) 缓存进程级别的客户端，所有示例共用；
+另外提供 InvokeModel / Converse 两种流式调用的文本迭代器。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_REGION = "eu-north-1"
+
+# 单个客户端允许的最大并发连接数（botocore 默认为 10）
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+
+# 大段文本生成可能超过 botocore 默认的 60 秒读超时
+DEFAULT_READ_TIMEOUT = 300
+
+_clients: Dict[Tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def _credentials_fingerprint(bedrock_token: Optional[str]) -> str:
+    """凭证指纹，用作缓存键的一部分，避免在内存中以明文作为键保存密钥"""
+    parts = [
+        os.getenv("AWS_ACCESS_KEY_ID", ""),
+        os.getenv("AWS_SECRET_ACCESS_KEY", ""),
+        os.getenv("AWS_PROFILE", ""),
+        bedrock_token or os.getenv("AWS_SESSION_TOKEN", ""),
+    ]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def get_bedrock_runtime_client(
+    region: Optional[str] = None,
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+    read_timeout: int = DEFAULT_READ_TIMEOUT,
+):
+    """
+    获取共享的 bedrock-runtime 客户端，同一配置在进程内只创建一次
+
+    Args:
+        region: AWS Region，默认读取 AWS_REGION 环境变量
+        max_pool_connections: 连接池大小，应不小于并发调用数
+        read_timeout: 读超时（秒）
+
+    Returns:
+        boto3 bedrock-runtime 客户端
+    """
+    region = region or os.getenv("AWS_REGION", DEFAULT_REGION)
+    bedrock_token = os.getenv("AWS_BEDROCK_TOKEN")
+    key = (region, _credentials_fingerprint(bedrock_token), max_pool_connections, read_timeout)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+
+        # 配置认证：Bedrock Token 作为 Session Token 使用，仅在创建客户端时设置一次
+        if bedrock_token and os.environ.get("AWS_SESSION_TOKEN") != bedrock_token:
+            os.environ["AWS_SESSION_TOKEN"] = bedrock_token
+            logger.info("使用 BedRock Token 认证")
+
+        config = Config(
+            max_pool_connections=max_pool_connections,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            retries={"max_attempts": 3, "mode": "standard"},
+        )
+        # 每个缓存项使用独立的 Session，boto3 默认 Session 创建客户端时不是线程安全的
+        client = boto3.session.Session().client("bedrock-runtime", region_name=region, config=config)
+        _clients[key] = client
+        logger.info(f"连接到 AWS Region: {region}（共享客户端，连接池 {max_pool_connections}）")
+        return client
+
+
+def clear_bedrock_clients() -> None:
+    """清空客户端缓存（例如轮换凭证之后）"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def iter_invoke_model_stream(client, model_id: str, request_body: Dict) -> Iterator[str]:
+    """
+    使用 invoke_model_with_response_stream 流式调用模型，逐段产出文本
+
+    兼容 OpenAI 风格的分块（choices[].delta.content，例如 DeepSeek）以及 choices[].text。
+
+    Args:
+        client: bedrock-runtime 客户端
+        model_id: Bedrock 模型 ID
+        request_body: 与 invoke_model 相同的请求体
+
+    Yields:
+        模型生成的文本片段
+    """
+    response = client.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=json.dumps(request_body),
+        contentType="application/json",
+        accept="application/json",
+    )
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        payload = json.loads(chunk["bytes"])
+        for choice in payload.get("choices", []):
+            text = (choice.get("delta") or {}).get("content") or choice.get("text")
+            if text:
+                yield text
+
+
+def iter_converse_stream(
+    client,
+    model_id: str,
+    messages: List[Dict],
+    inference_config: Optional[Dict] = None,
+) -> Iterator[str]:
+    """
+    使用 Converse Stream API 流式调用模型，逐段产出文本
+
+    Args:
+        client: bedrock-runtime 客户端
+        model_id: Bedrock 模型 ID
+        messages: Converse 格式的消息，例如 [{"role": "user", "content": [{"text": "..."}]}]
+        inference_config: 例如 {"maxTokens": 2048, "temperature": 0.7, "topP": 0.9}
+
+    Yields:
+        模型生成的文本片段
+    """
+    response = client.converse_stream(
+        modelId=model_id,
+        messages=messages,
+        inferenceConfig=inference_config or {},
+    )
+    for event in response["stream"]:
+        text = event.get("contentBlockDelta", {}).get("delta", {}).get("text")
+        if text:
+            yield text
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Bedrock Runtime 客户端复用微基准测试
+
+对比两种调用方式的单次开销：
+  - 每次调用都 boto3.client('bedrock-runtime')（示例原来的写法）
+  - 使用 common.bedrock_runtime 中缓存的共享客户端
+
+请求在 botocore 的 before-send 阶段被拦截并返回固定响应，因此测得的是
+凭证解析、服务模型/endpoint 加载、序列化和签名的开销，不包含网络时间。
+真实环境中共享客户端还会复用 HTTPS 连接，省掉每次的 TLS 握手。
+
+    python bench_bedrock_client.py --calls 200
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.bedrock_runtime import clear_bedrock_clients, get_bedrock_runtime_client
+
+
+RESPONSE_BODY = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+
+
+class _RawResponse(io.BytesIO):
+    """满足 AWSResponse / StreamingBody 读取 body 的最小接口"""
+
+    def stream(self, **kwargs):
+        yield self.getvalue()
+
+
+def _stub_send(request, **kwargs):
+    """替代真实网络发送，直接返回成功响应"""
+    return AWSResponse(
+        request.url, 200, {"Content-Type": "application/json"}, _RawResponse(RESPONSE_BODY)
+    )
+
+
+def _stub(client):
+    client.meta.events.register("before-send.bedrock-runtime.InvokeModel", _stub_send)
+    return client
+
+
+def _invoke(client) -> str:
+    response = client.invoke_model(
+        modelId="deepseek.v3-v1:0",
+        body=json.dumps({"messages": [{"role": "user", "content": "hi"}], "max_tokens": 16}),
+        contentType="application/json",
+        accept="application/json",
+    )
+    return json.loads(response["body"].read())["choices"][0]["message"]["content"]
+
+
+def per_call_client(region: str) -> float:
+    start = time.perf_counter()
+    _invoke(_stub(boto3.client("bedrock-runtime", region_name=region)))
+    return time.perf_counter() - start
+
+
+def shared_client(region: str) -> float:
+    start = time.perf_counter()
+    _invoke(get_bedrock_runtime_client(region))
+    return time.perf_counter() - start
+
+
+def report(label: str, samples) -> None:
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<14} mean={statistics.mean(samples) * 1000:7.2f} ms   "
+          f"p50={statistics.median(samples) * 1000:7.2f} ms   p99={p99 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bedrock 客户端复用微基准测试（stub endpoint）")
+    parser.add_argument("--calls", type=int, default=200, help="调用次数")
+    parser.add_argument("--region", default="eu-north-1")
+    args = parser.parse_args()
+
+    # 使用假凭证，请求不会离开本机
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+    clear_bedrock_clients()
+    _stub(get_bedrock_runtime_client(args.region))
+
+    per_call = [per_call_client(args.region) for _ in range(args.calls)]
+    shared = [shared_client(args.region) for _ in range(args.calls)]
+
+    print(f"调用次数: {args.calls}（stub endpoint，不含网络与 TLS 握手）\n")
+    report("每次新建客户端", per_call)
+    report("共享客户端", shared)
+    saved = statistics.mean(per_call) - statistics.mean(shared)
+    print(f"\n每次调用节省: {saved * 1000:.2f} ms "
+          f"({statistics.mean(per_call) / statistics.mean(shared):.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+列式上传格式
+
+默认以 CSV 文本写入 Sandbox，再在 Sandbox 中用 pd.read_csv 解析；对于宽表数值数据，
+解析往往是分析阶段最耗时的部分，文本体积也比压缩的列式编码大数倍。
+
+这里在主机上把 CSV 转换为 Parquet 或 Arrow IPC 文件后再上传二进制数据，
+Sandbox 中直接读取（Arrow IPC 可通过内存映射读取）。需要主机和 Sandbox 都安装 pyarrow。
+"""
+
+import io
+import logging
+from typing import Any, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# 上传格式 -> 文件扩展名
+UPLOAD_FORMATS = {
+    "csv": "csv",
+    "parquet": "parquet",
+    "arrow": "arrow",
+}
+
+# 压缩编码；Arrow IPC 传入 None 时不压缩，Sandbox 中可零拷贝内存映射
+DEFAULT_COMPRESSION = "zstd"
+
+# 每个 row group / record batch 的行数，分块分析时按批读取
+DEFAULT_BATCH_ROWS = 65536
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Parquet / Arrow 上传需要 pyarrow，请先执行: pip install pyarrow") from e
+
+
+def encode_csv(
+    csv_content: str,
+    upload_format: str,
+    compression: Optional[str] = DEFAULT_COMPRESSION,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> bytes:
+    """
+    将 CSV 文本编码为指定的上传格式
+
+    Args:
+        csv_content: CSV 文本（第一行为表头）
+        upload_format: csv / parquet / arrow
+        compression: Parquet / Arrow 的压缩编码，例如 zstd、lz4
+        batch_rows: 每个 row group / record batch 的行数
+
+    Returns:
+        要上传的文件内容
+    """
+    if upload_format not in UPLOAD_FORMATS:
+        raise ValueError(f"不支持的上传格式: {upload_format}，可选: {', '.join(UPLOAD_FORMATS)}")
+    if upload_format == "csv":
+        return csv_content.encode("utf-8")
+
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    table = pa_csv.read_csv(io.BytesIO(csv_content.encode("utf-8")))
+    sink = io.BytesIO()
+    if upload_format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, sink, compression=compression or "none", row_group_size=batch_rows)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=batch_rows)
+    return sink.getvalue()
+
+
+def upload_table(
+    sandbox: Any,
+    csv_content: str,
+    path_stem: str,
+    upload_format: str = "csv",
+    compression: Optional[str] = DEFAULT_COMPRESSION,
+) -> Tuple[str, int]:
+    """
+    按指定格式将 CSV 数据上传到 Sandbox
+
+    Args:
+        sandbox: Sandbox 实例
+        csv_content: CSV 文本
+        path_stem: 不含扩展名的目标路径，例如 /tmp/exam_scores
+        upload_format: csv / parquet / arrow
+        compression: Parquet / Arrow 的压缩编码
+
+    Returns:
+        (Sandbox 中的文件路径, 上传的字节数)
+    """
+    data = encode_csv(csv_content, upload_format, compression)
+    file_path = f"{path_stem}.{UPLOAD_FORMATS[upload_format]}"
+    if upload_format == "csv":
+        sandbox.files.write(file_path, csv_content)
+    else:
+        sandbox.files.write(file_path, data)
+    logger.info(f"已上传 {upload_format} 数据: {file_path}（{len(data)} 字节，CSV 文本 {len(csv_content.encode('utf-8'))} 字节）")
+    return file_path, len(data)
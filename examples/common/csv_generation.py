@@ -0,0 +1,217 @@
+"""
+CSV 数据生成服务
+
+01 和 02 示例都通过 Bedrock 生成 CSV 测试数据，这里统一 prompt 模板、请求参数和
+代码块标记清理，并提供同步与 asyncio 两种接口：
+
+- 请求合并：并发发起的相同请求（同一模型、同一 prompt）只调用一次模型，共享结果
+- 并发上限：按模型 ID 限制同时进行的模型调用数，同步和异步调用方共用同一个上限
+
+用法：
+    service = get_csv_generation_service()
+    csv_content = service.generate("生成 10 条用户数据，包含 ID、姓名、年龄")
+    csv_content = await service.agenerate("生成 10 条用户数据，包含 ID、姓名、年龄")
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from common.bedrock_cache import get_cached_bedrock_runtime_client
+from common.bedrock_runtime import get_bedrock_runtime_client
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MODEL_ID = "deepseek.v3-v1:0"
+
+# 单个模型同时进行的调用数上限
+DEFAULT_MAX_CONCURRENCY = 8
+
+# 生成 CSV 的采样参数（DeepSeek 请求格式）
+DEFAULT_MAX_TOKENS = 4096
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TOP_P = 0.9
+
+CSV_PROMPT_TEMPLATE = """你是一个数据生成助手。请严格按照以下要求生成数据：
+
+1. 输出格式：必须是纯CSV格式（逗号分隔值）
+2. 第一行：必须是列名（表头）
+3. 数据要求：真实、合理、多样化
+4. 不要包含任何解释性文字，只输出CSV内容
+5. 不要使用markdown代码块标记（如```csv）
+
+任务：{task}
+
+请直接输出CSV数据："""
+
+
+def build_csv_prompt(task: str) -> str:
+    """将数据生成任务包装为严格要求 CSV 输出的 prompt"""
+    return CSV_PROMPT_TEMPLATE.format(task=task)
+
+
+def strip_code_fences(text: str) -> str:
+    """清理模型输出中可能存在的 markdown 代码块标记"""
+    return text.replace('```csv', '').replace('```', '').strip()
+
+
+class CsvGenerationService:
+    """
+    基于 Bedrock 的 CSV 生成服务，可在多个线程和事件循环间共享
+
+    stats 中的计数：
+        requests: generate / agenerate 收到的请求数
+        model_calls: 实际发起的模型调用数
+        coalesced: 与进行中的相同请求合并的请求数
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        temperature: float = DEFAULT_TEMPERATURE,
+        top_p: float = DEFAULT_TOP_P,
+    ):
+        """
+        Args:
+            max_concurrency: 每个模型 ID 同时进行的调用数上限
+            max_tokens: 单次生成的最大 token 数
+            temperature: 采样温度
+            top_p: nucleus 采样参数
+        """
+        self.max_concurrency = max_concurrency
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.stats = {"requests": 0, "model_calls": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: Dict[Tuple, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def generate(self, prompt: str, model_id: str = DEFAULT_MODEL_ID, use_cache: bool = True) -> str:
+        """
+        生成 CSV 数据
+
+        Args:
+            prompt: 数据生成任务描述，会被包装为严格要求 CSV 输出的 prompt
+            model_id: Bedrock 模型 ID
+            use_cache: 启用了 Bedrock 响应缓存时是否使用缓存（重试时应为 False，避免拿到同一份无效结果）
+
+        Returns:
+            去掉代码块标记的 CSV 文本
+        """
+        key = (model_id, prompt, use_cache)
+        with self._lock:
+            self.stats["requests"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            logger.info(f"合并到进行中的相同请求: {model_id}")
+            return future.result()
+
+        try:
+            with self._limit(model_id):
+                result = self._invoke(prompt, model_id, use_cache)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    async def agenerate(self, prompt: str, model_id: str = DEFAULT_MODEL_ID, use_cache: bool = True) -> str:
+        """
+        generate 的 asyncio 版本：模型调用在服务自己的线程池中执行，不阻塞事件循环
+
+        Args:
+            prompt: 数据生成任务描述
+            model_id: Bedrock 模型 ID
+            use_cache: 是否使用 Bedrock 响应缓存
+
+        Returns:
+            去掉代码块标记的 CSV 文本
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(self.generate, prompt, model_id, use_cache)
+        )
+
+    def close(self) -> None:
+        """关闭 agenerate 使用的线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    # ==================== 内部实现 ====================
+
+    def _limit(self, model_id: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._limits.get(model_id)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_concurrency)
+                self._limits[model_id] = semaphore
+            return semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # 合并的请求也会占用线程等待结果，线程数留出余量
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency * 4, thread_name_prefix="csv-generation"
+                )
+            return self._executor
+
+    def _invoke(self, prompt: str, model_id: str, use_cache: bool) -> str:
+        # 共享的 Bedrock Runtime 客户端（进程内复用连接池和凭证，启用时经过响应缓存）
+        client = get_cached_bedrock_runtime_client() if use_cache else get_bedrock_runtime_client()
+        request_body = {
+            "messages": [{"role": "user", "content": build_csv_prompt(prompt)}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+
+        logger.info(f"调用 Bedrock 模型: {model_id}")
+        with self._lock:
+            self.stats["model_calls"] += 1
+        response = client.invoke_model(
+            modelId=model_id,
+            body=json.dumps(request_body),
+            contentType='application/json',
+            accept='application/json'
+        )
+        response_body = json.loads(response['body'].read())
+        logger.info("成功收到 Bedrock 响应")
+        return strip_code_fences(response_body['choices'][0]['message']['content'])
+
+    def __repr__(self) -> str:
+        return f"CsvGenerationService(max_concurrency={self.max_concurrency}, stats={self.stats})"
+
+
+_service: Optional[CsvGenerationService] = None
+_service_lock = threading.Lock()
+
+
+def get_csv_generation_service() -> CsvGenerationService:
+    """获取进程内共享的 CSV 生成服务，所有调用方共用请求合并和并发上限"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CsvGenerationService()
+        return _service
@@ -0,0 +1,188 @@
+"""
+数据集检查
+
+保存数据后原来要分别执行 `wc -l`、`du -h`、`head -n 6` 等命令，每条命令都是一次
+Sandbox 往返（几十到几百毫秒）。这里用一次 `python3 -c` 执行读取文件一遍，以 JSON
+返回行数、字节数、表头、预览行和各列的基本画像。
+
+检查脚本只依赖标准库；Parquet / Arrow 文件在 Sandbox 安装了 pyarrow 时读取元数据和
+统计信息，否则只返回文件大小。
+"""
+
+import csv
+import io
+import json
+import logging
+import shlex
+from typing import Any, Dict
+
+
+logger = logging.getLogger(__name__)
+
+
+# CSV 列画像的行数上限：逐值解析数字较慢，超过上限的行只计数，不影响行数统计
+DEFAULT_PROFILE_ROWS = 50_000
+
+
+# 在 Sandbox 中执行：python3 -c SCRIPT <路径> <预览行数> <画像行数>，输出一个 JSON 对象
+_INSPECT_SCRIPT = """
+import csv, json, os, sys
+
+DISTINCT_LIMIT = 10000
+path, preview_rows, profile_rows = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+info = {"path": path, "size_bytes": os.path.getsize(path), "lines": None, "rows": None,
+        "profiled_rows": 0, "header": [], "preview": [], "columns": []}
+
+def parse_number(value):
+    try:
+        return int(value), "int"
+    except ValueError:
+        try:
+            return float(value), "float"
+        except ValueError:
+            return None, "str"
+
+def inspect_csv():
+    counter = {"lines": 0}
+    def lines(f):
+        for line in f:
+            counter["lines"] += 1
+            yield line
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(lines(f))
+        header = next(reader, [])
+        profiles = [{"name": name, "type": "int", "non_null": 0, "missing": 0, "distinct": set(),
+                     "min": None, "max": None, "sum": 0.0, "numeric": 0} for name in header]
+        rows = 0
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            if len(info["preview"]) < preview_rows:
+                info["preview"].append(row)
+            if rows > profile_rows:
+                continue
+            for profile, value in zip(profiles, row):
+                value = value.strip()
+                if not value:
+                    profile["missing"] += 1
+                    continue
+                profile["non_null"] += 1
+                if len(profile["distinct"]) < DISTINCT_LIMIT:
+                    profile["distinct"].add(value)
+                if profile["type"] == "str":
+                    continue
+                number, kind = parse_number(value)
+                if kind == "str":
+                    profile["type"] = "str"
+                    continue
+                if kind == "float":
+                    profile["type"] = "float"
+                profile["numeric"] += 1
+                profile["sum"] += number
+                profile["min"] = number if profile["min"] is None else min(profile["min"], number)
+                profile["max"] = number if profile["max"] is None else max(profile["max"], number)
+            for profile in profiles[len(row):]:
+                profile["missing"] += 1
+    info.update(lines=counter["lines"], rows=rows, profiled_rows=min(rows, profile_rows), header=header)
+    for profile in profiles:
+        column = {"name": profile["name"], "type": profile["type"] if profile["non_null"] else "empty",
+                  "non_null": profile["non_null"], "missing": profile["missing"],
+                  "distinct": len(profile["distinct"]),
+                  "distinct_capped": len(profile["distinct"]) >= DISTINCT_LIMIT}
+        if profile["type"] != "str" and profile["numeric"]:
+            column.update(min=profile["min"], max=profile["max"], mean=round(profile["sum"] / profile["numeric"], 4))
+        info["columns"].append(column)
+
+def inspect_columnar():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        return
+    if path.endswith(".parquet"):
+        table = pq.read_table(path)
+    else:
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    info.update(rows=table.num_rows, profiled_rows=table.num_rows, header=table.column_names)
+    info["preview"] = [[str(v) for v in row.values()] for row in table.slice(0, preview_rows).to_pylist()]
+    for name, column in zip(table.column_names, table.columns):
+        profile = {"name": name, "type": str(column.type), "non_null": len(column) - column.null_count,
+                   "missing": column.null_count}
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            bounds = pc.min_max(column).as_py()
+            mean = pc.mean(column).as_py()
+            profile.update(min=bounds["min"], max=bounds["max"], mean=None if mean is None else round(mean, 4))
+        info["columns"].append(profile)
+
+if path.endswith((".parquet", ".arrow", ".feather")):
+    inspect_columnar()
+else:
+    inspect_csv()
+print(json.dumps(info, ensure_ascii=False))
+"""
+
+
+def inspect_dataset(
+    sandbox: Any,
+    path: str,
+    preview_rows: int = 5,
+    profile_rows: int = DEFAULT_PROFILE_ROWS,
+    timeout: int = 120,
+) -> Dict:
+    """
+    一次 Sandbox 往返检查数据集文件
+
+    Args:
+        sandbox: Sandbox 实例
+        path: Sandbox 中的数据文件路径（CSV，或 .parquet / .arrow / .feather）
+        preview_rows: 返回的预览行数（不含表头）
+        profile_rows: CSV 只对前若干行做列画像，之后的行只计数
+        timeout: 命令超时时间（秒）
+
+    Returns:
+        字典，包含 path、size_bytes、lines（CSV 物理行数，含表头）、rows（数据行数）、
+        profiled_rows（参与列画像的行数）、header、preview（预览行）以及 columns
+        （每列的 name、type、non_null、missing，数值列另有 min、max、mean；CSV 另有 distinct）。
+        列式文件在 Sandbox 中没有 pyarrow 时只有 size_bytes，lines / rows 为 None
+    """
+    command = (
+        "python3 -c " + shlex.quote(_INSPECT_SCRIPT)
+        + f" {shlex.quote(path)} {int(preview_rows)} {int(profile_rows)}"
+    )
+    result = sandbox.commands.run(command, timeout=timeout)
+    if result.exit_code != 0:
+        raise RuntimeError(f"检查数据集失败: {result.stderr}")
+    return json.loads(result.stdout)
+
+
+def format_size(size_bytes: int) -> str:
+    """以 du -h 的风格格式化字节数，例如 4.2K、1.5M"""
+    size = float(size_bytes)
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}G"
+
+
+def format_preview(info: Dict) -> str:
+    """将表头和预览行格式化为 CSV 文本，用于日志输出"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if info.get("header"):
+        writer.writerow(info["header"])
+    writer.writerows(info.get("preview", []))
+    return buffer.getvalue().rstrip("\n")
+
+
+def format_column_profile(column: Dict) -> str:
+    """单列画像的一行摘要"""
+    text = f"{column['name']}（{column['type']}）: 非空 {column['non_null']}，缺失 {column['missing']}"
+    if "distinct" in column:
+        text += f"，不同值 {column['distinct']}{'+' if column.get('distinct_capped') else ''}"
+    if column.get("min") is not None:
+        text += f"，范围 {column['min']} ~ {column['max']}，均值 {column['mean']}"
+    return text